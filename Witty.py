@@ -1,4 +1,4 @@
-import sublime, sublime_plugin, re, json, imp, sys
+import sublime, sublime_plugin, re, json, imp, sys, os
 
 # For development purposes
 settings = sublime.load_settings("Preferences.sublime-settings")
@@ -28,14 +28,15 @@ if settings.get('env') == 'dev':
 		newmodule = __import__(key)
 
 from Witty.library.WittyProject import WittyProject
-from Witty.library.WittyProject import Intel
+from Witty.library.WittyIntel import Intel
 from Witty.library.WittyParser import WittyParser
 from Witty.library.WittyFile import WittyFile
 from Witty.library.WittyScope import WittyScope
 from Witty.library.WittyScope import WittyRoot
 from Witty.library.WittyStatement import WittyStatement
 from Witty.library.WittyVariable import WittyVariable
-from Witty.library.Docblock import Docblock
+from Witty.library.Docblock import Docblock, docblockMemo
+from Witty.library.WittyProfiler import profiler
 import Witty.library.functions as wf
 
 # Witty only completions?
@@ -45,6 +46,25 @@ wittyOnly = settings.get('wittyonly')
 wf.debugLevel = settings.get('wittylevel') or 0
 wf.doDebug = doDebug
 
+# The maximum size of the parse cache, in megabytes
+if settings.get('wittycachesize'):
+	wf.cacheSize = settings.get('wittycachesize') * 1024 * 1024
+
+# Parse function bodies only when a completion needs them?
+if settings.get('wittylazybodies') is not None:
+	wf.lazyBodies = settings.get('wittylazybodies')
+
+# Parse files in other processes, on other cores?
+if settings.get('wittyparseworkers'):
+	wf.parseWorkers = settings.get('wittyparseworkers')
+
+# The python interpreter to run them with, as Sublime's own can't start them
+if settings.get('wittyparsepython'):
+	wf.parsePython = settings.get('wittyparsepython')
+
+# Count what the parser spends its time on?
+profiler.enable(bool(settings.get('wittyprofile')))
+
 # Debug wrappers
 def warn(message, showStack = True): wf.warn(message, showStack, 3)
 def info(message, showStack = True): wf.info(message, showStack, 3)
@@ -142,4 +162,46 @@ class WittyReindexProjectCommand(sublime_plugin.ApplicationCommand):
 		#	self._parser_thread.stop()
 		self._parser_thread = WittyParser(self, False, open_folder_arr, 30)
 		
-		self._parser_thread.start()
\ No newline at end of file
+		self._parser_thread.start()
+
+## Turn parse profiling on or off
+class WittyToggleProfilingCommand(sublime_plugin.ApplicationCommand):
+
+	def run(self):
+		profiler.enable(not profiler.enabled)
+
+		if profiler.enabled:
+			sublime.status_message('Witty parse profiling enabled')
+		else:
+			sublime.status_message('Witty parse profiling disabled')
+
+## Show the parse profile in a new view & dump it as JSON
+class WittyShowProfileCommand(sublime_plugin.WindowCommand):
+
+	def run(self):
+
+		path = os.path.join(sublime.cache_path(), 'Witty', 'profile.json')
+
+		try:
+			os.makedirs(os.path.dirname(path), exist_ok = True)
+			profiler.dump(path)
+			dumped = 'JSON: ' + path
+		except OSError:
+			dumped = 'Unable to write ' + path
+
+		if not profiler.enabled:
+			dumped += '\nProfiling is disabled, run "Toggle Parse Profiling" and reindex first'
+
+		view = self.window.new_file()
+		view.set_name('Witty Parse Profile')
+		view.set_scratch(True)
+		memos = '\n'.join(memo.getReport() for memo in [wf.tokenizeMemo, wf.normalizeMemo, docblockMemo])
+
+		view.run_command('append', {'characters': profiler.getReport() + '\n\n' + memos + '\n\n' + profiler.getMemoryReport() + '\n\n' + dumped + '\n'})
+
+## Clear the parse profile
+class WittyResetProfileCommand(sublime_plugin.ApplicationCommand):
+
+	def run(self):
+		profiler.reset()
+		sublime.status_message('Witty parse profile cleared')
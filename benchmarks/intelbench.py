@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+#
+# Benchmark building the intel of projects of growing size,
+# outside of Sublime Text:
+#
+#   python3 benchmarks/intelbench.py [--quick] [--json FILE]
+#
+# Every project has the given amount of files, each with a few
+# @typename classes. For every size it times a complete postParse,
+# the postParse of one changed file, looking up a type & looking up
+# every definition of a name, through the symbol index or by scanning.
+# The scaling exponent is the slope of log(time) against log(variables).
+#
+import os, sys, time, json, types, argparse, tempfile
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Make the package importable under the name Sublime gives it
+if not 'Witty' in sys.modules:
+	package = types.ModuleType('Witty')
+	package.__path__ = [root]
+	sys.modules['Witty'] = package
+
+from Witty.library.WittyIntel import Intel
+from Witty.library.WittyFile import WittyFile
+from parserbench import makeFile, measure, getExponent
+
+#
+# The part of a WittyProject that WittyFile & Intel use
+#
+class BenchProject:
+
+	def __init__(self):
+		self.cache = None
+		self.intelNode = Intel(self, 'nodejs')
+		self.intelBrowser = Intel(self, 'browser')
+
+	def getFileLanguage(self, fileName):
+		return 'nodejs'
+
+	def setFileLanguage(self, fileName, language):
+		pass
+
+## Create the text of a file with a few classes
+#  @param   index     The index of the file
+def makeClassFile(index):
+
+	pieces = []
+
+	for i in range(3):
+		pieces.append('''/**
+ * Class %(i)d of file %(index)d
+ *
+ * @typename Unit%(index)dx%(i)d
+ */
+var Unit%(index)dx%(i)d = function Unit%(index)dx%(i)d(name) {
+	this.name = name;
+	this.index = %(i)d;
+};
+
+Unit%(index)dx%(i)d.prototype.getName = function getName() {
+	var result = this.name;
+	return result;
+};
+
+var unit%(index)dx%(i)d = new Unit%(index)dx%(i)d('unit');
+shared.unit%(index)dx%(i)d = unit%(index)dx%(i)d;
+''' % {'index': index, 'i': i})
+
+	return ''.join(pieces) + makeFile(2)
+
+## Create & parse a project of the given amount of files
+#  @param   directory The directory to write the files to
+#  @param   count     The amount of files
+def makeProject(directory, count):
+
+	project = BenchProject()
+	intel = project.intelNode
+
+	for index in range(count):
+		fileName = os.path.join(directory, 'file%d.js' % index)
+
+		sourceFile = open(fileName, 'w')
+
+		try:
+			sourceFile.write(makeClassFile(index))
+		finally:
+			sourceFile.close()
+
+		intel.files[fileName] = WittyFile(project, fileName)
+
+	return intel
+
+## Find every definition of a name without the symbol index
+#  @param   intel     The Intel
+#  @param   name      The name of the variable
+def scanSymbols(intel, name):
+
+	result = []
+
+	for scope in intel.scopes.values():
+		for variable in scope.variablesById.values():
+			if variable.name == name:
+				result.append(variable)
+
+	return result
+
+## Run the benchmarks & print the results
+#  @param   quick     Use smaller sizes & shorter rounds
+def run(quick):
+
+	minTime = 0.02 if quick else 0.1
+
+	if quick:
+		sizes = [10, 20, 40]
+	else:
+		sizes = [25, 50, 100, 200]
+
+	results = []
+	points = {'full': [], 'one file': [], 'type lookup': [], 'symbol lookup': [], 'symbol scan': []}
+
+	print('%6s %10s %8s %12s %12s %14s %16s %14s' % ('files', 'variables', 'types', 'full ms', 'one file ms', 'type lookup us', 'symbol lookup us', 'symbol scan us'))
+
+	for size in sizes:
+
+		directory = tempfile.mkdtemp()
+		intel = makeProject(directory, size)
+
+		full = measure(lambda: intel.postParse(), minTime)
+
+		# Rebuild the file in the middle, as if it was saved
+		fileName = list(intel.files)[size // 2]
+		oneFile = measure(lambda: intel.postParse(None, [fileName]), minTime)
+
+		typeNames = list(intel.types)
+		lookup = measure(lambda: [intel.getType(name) for name in typeNames], minTime) / len(typeNames)
+
+		# Every definition of a name, with the index or by looking through all the scopes
+		names = ['unit%dx0' % index for index in range(0, size, max(size // 10, 1))]
+		symbolLookup = measure(lambda: [intel.getSymbols(name) for name in names], minTime) / len(names)
+		symbolScan = measure(lambda: [scanSymbols(intel, name) for name in names], minTime) / len(names)
+
+		variables = len(intel.variables)
+
+		print('%6d %10d %8d %12.3f %12.3f %14.3f %16.3f %14.3f' % (size, variables, len(typeNames), full * 1000, oneFile * 1000, lookup * 1000000, symbolLookup * 1000000, symbolScan * 1000000))
+
+		points['full'].append((variables, full))
+		points['one file'].append((variables, oneFile))
+		points['type lookup'].append((variables, lookup))
+		points['symbol lookup'].append((variables, symbolLookup))
+		points['symbol scan'].append((variables, symbolScan))
+
+		results.append({
+			'files': size,
+			'variables': variables,
+			'types': len(typeNames),
+			'full': full,
+			'oneFile': oneFile,
+			'typeLookup': lookup,
+			'symbolLookup': symbolLookup,
+			'symbolScan': symbolScan
+		})
+
+		for name in os.listdir(directory):
+			os.remove(os.path.join(directory, name))
+
+		os.rmdir(directory)
+
+	for (name, series) in points.items():
+		exponent = getExponent(series)
+
+		if exponent is not None:
+			print('%-12s scaling exponent %.2f' % (name, exponent))
+			results.append({'series': name, 'exponent': exponent})
+
+	return results
+
+if __name__ == '__main__':
+
+	argumentParser = argparse.ArgumentParser(description = 'Benchmark building the intel of a project')
+	argumentParser.add_argument('--quick', action = 'store_true', help = 'Use smaller projects')
+	argumentParser.add_argument('--json', help = 'Also write the results to this file')
+	arguments = argumentParser.parse_args()
+
+	results = run(arguments.quick)
+
+	if arguments.json:
+		jsonFile = open(arguments.json, 'w')
+
+		try:
+			json.dump(results, jsonFile, indent = 1)
+		finally:
+			jsonFile.close()
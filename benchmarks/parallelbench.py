@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+#
+# Benchmark parsing a project in worker processes,
+# outside of Sublime Text:
+#
+#   python3 benchmarks/parallelbench.py [--quick] [--files N] [--workers 1,2,4,8] [--json FILE]
+#
+# The project is parsed once in this process (0 workers), like the
+# parser thread does without a pool, and then with every amount of
+# workers. The workers are started before the timing begins.
+# For every run it times the parse (until every WittyFile exists),
+# the part of it spent creating the WittyFiles from the worker results
+# in this process & the postParse that builds the intel.
+#
+import os, sys, time, json, types, argparse, tempfile
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Make the package importable under the name Sublime gives it
+# (the workers run this too, before they get any work)
+if not 'Witty' in sys.modules:
+	package = types.ModuleType('Witty')
+	package.__path__ = [root]
+	sys.modules['Witty'] = package
+
+import Witty.library.functions as wf
+from Witty.library.WittyFile import WittyFile
+from Witty.library.WittyWorker import createPool, submitFile
+from intelbench import BenchProject, makeClassFile
+
+## Write the files of a project
+#  @param   directory The directory to write the files to
+#  @param   count     The amount of files
+#  @return  The list of file names
+def writeProject(directory, count):
+
+	fileNames = []
+
+	for index in range(count):
+		fileName = os.path.join(directory, 'file%d.js' % index)
+
+		sourceFile = open(fileName, 'w')
+
+		try:
+			sourceFile.write(makeClassFile(index))
+		finally:
+			sourceFile.close()
+
+		fileNames.append(fileName)
+
+	return fileNames
+
+## Parse the files & build the intel
+#  @param   fileNames The files to parse
+#  @param   pool      The ProcessPoolExecutor, or None to parse in this process
+#  @return  A dict with the parse, assembly & postParse seconds
+def parseProject(fileNames, pool):
+
+	project = BenchProject()
+	intel = project.intelNode
+	assembly = 0.0
+
+	start = time.perf_counter()
+
+	if pool is None:
+		for fileName in fileNames:
+			intel.files[fileName] = WittyFile(project, fileName)
+	else:
+		futures = [submitFile(pool, project, fileName) for fileName in fileNames]
+
+		for (fileName, future) in zip(fileNames, futures):
+			result = future.result()
+
+			assemblyStart = time.perf_counter()
+			intel.files[fileName] = WittyFile(project, fileName, result = result)
+			assembly += time.perf_counter() - assemblyStart
+
+	parsed = time.perf_counter()
+
+	intel.postParse()
+
+	return {
+		'parse': parsed - start,
+		'assembly': assembly,
+		'postParse': time.perf_counter() - parsed
+	}
+
+## Run the benchmarks & print the results
+#  @param   count     The amount of files
+#  @param   workers   The amounts of workers to try
+#  @param   rounds    The amount of times to parse, the fastest counts
+def run(count, workers, rounds):
+
+	directory = tempfile.mkdtemp()
+	fileNames = writeProject(directory, count)
+	results = []
+
+	print('%d files, %d CPUs, lazy bodies: %s' % (count, os.cpu_count() or 1, wf.lazyBodies))
+	print('%8s %10s %12s %12s %10s %8s' % ('workers', 'parse ms', 'assembly ms', 'postParse ms', 'total ms', 'speedup'))
+
+	sequential = None
+
+	for workerCount in [0] + workers:
+
+		pool = None
+
+		if workerCount:
+			pool = createPool(workerCount)
+
+			# Start every worker & let it import everything
+			for future in [submitFile(pool, BenchProject(), fileName) for fileName in fileNames[:workerCount * 2]]:
+				future.result()
+
+		try:
+			best = min((parseProject(fileNames, pool) for attempt in range(rounds)), key = lambda times: times['parse'] + times['postParse'])
+		finally:
+			if pool is not None:
+				pool.shutdown()
+
+		total = best['parse'] + best['postParse']
+
+		if sequential is None:
+			sequential = total
+
+		print('%8d %10.1f %12.1f %12.1f %10.1f %7.2fx' % (workerCount, best['parse'] * 1000, best['assembly'] * 1000, best['postParse'] * 1000, total * 1000, sequential / total))
+
+		best['workers'] = workerCount
+		best['speedup'] = sequential / total
+		results.append(best)
+
+	for fileName in fileNames:
+		os.remove(fileName)
+
+	os.rmdir(directory)
+
+	return results
+
+if __name__ == '__main__':
+
+	argumentParser = argparse.ArgumentParser(description = 'Benchmark parsing a project in worker processes')
+	argumentParser.add_argument('--quick', action = 'store_true', help = 'Use a smaller project & fewer rounds')
+	argumentParser.add_argument('--files', type = int, help = 'The amount of files')
+	argumentParser.add_argument('--workers', default = '1,2,4,8', help = 'The amounts of workers, separated by commas')
+	argumentParser.add_argument('--full', action = 'store_true', help = 'Parse function bodies right away')
+	argumentParser.add_argument('--json', help = 'Also write the results to this file')
+	arguments = argumentParser.parse_args()
+
+	wf.lazyBodies = not arguments.full
+
+	count = arguments.files or (16 if arguments.quick else 64)
+	workers = [int(workerCount) for workerCount in arguments.workers.split(',') if workerCount]
+
+	results = run(count, workers, 1 if arguments.quick else 3)
+
+	if arguments.json:
+		jsonFile = open(arguments.json, 'w')
+
+		try:
+			json.dump(results, jsonFile, indent = 1)
+		finally:
+			jsonFile.close()
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+#
+# Micro-benchmarks for the parser functions in library/functions.py.
+# They run outside of Sublime Text:
+#
+#   python3 benchmarks/parserbench.py [--quick] [--json FILE] [function ...]
+#
+# Every function is timed on examples/example.js and on synthetic
+# inputs of growing size or nesting depth. Throughput is reported in
+# chars/sec (and statements/sec where the input has statements).
+# The scaling exponent is the slope of log(time) against log(chars):
+# about 1 is linear, about 2 is quadratic.
+#
+import os, sys, time, math, json, types, argparse
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Make the package importable under the name Sublime gives it
+if not 'Witty' in sys.modules:
+	package = types.ModuleType('Witty')
+	package.__path__ = [root]
+	sys.modules['Witty'] = package
+
+import Witty.library.functions as wf
+from Witty.library.WittyLexer import WittyLexer
+from Witty.library.Docblock import Docblock
+
+## Create a file of the given amount of units,
+#  every unit has a docblock, a function with some statements
+#  in it and a top level expression
+#  @param   units     The amount of units
+def makeFile(units):
+
+	pieces = []
+
+	for i in range(units):
+		pieces.append('''/**
+ * Unit %(i)d
+ *
+ * @param   {String}   name
+ * @param   {Object}   options
+ */
+function unit%(i)d(name, options) {
+	var result = {name: name, index: %(i)d, list: [1, 2, 3]};
+
+	if (options.enabled) {
+		result.value = options.value || 'default';
+	} else {
+		result.value = null;
+	}
+
+	for (var j = 0; j < 10; j++) {
+		result.list.push(j * %(i)d);
+	}
+
+	this.unit%(i)d = result;
+
+	return result;
+}
+
+var value%(i)d = unit%(i)d('unit', {enabled: true, value: "%(i)d"});
+''' % {'i': i})
+
+	return ''.join(pieces)
+
+## Create a file with functions nested to the given depth
+#  @param   depth     The nesting depth
+def makeNested(depth):
+
+	text = ''
+
+	for i in range(depth):
+		text += '\t' * i + 'function level%d(a) {\n' % i
+		text += '\t' * (i + 1) + 'var v%d = a + %d;\n' % (i, i)
+
+	for i in range(depth - 1, -1, -1):
+		text += '\t' * (i + 1) + 'return v%d;\n' % i
+		text += '\t' * i + '}\n'
+
+	return text
+
+## Create one expression of the given amount of terms
+#  @param   terms     The amount of terms
+def makeExpression(terms):
+
+	parts = []
+
+	for i in range(terms):
+		parts.append('obj%d.prop[%d] + call%d(arg, "str%d") * {key%d: 1}.key%d' % (i, i, i, i, i, i))
+
+	return 'total = ' + ' + '.join(parts) + ';'
+
+## Create one expression spread over the given amount of lines,
+#  every line ends with an operator or the next one starts with one
+#  @param   lines     The amount of lines
+def makeMultiline(lines):
+
+	parts = []
+
+	for i in range(lines):
+		if i % 2:
+			parts.append('\n\t+ obj%d.prop - // comment %d' % (i, i))
+		else:
+			parts.append('\n\tcall%d(arg) *' % i)
+
+	return 'total =' + ''.join(parts) + ' 1;'
+
+## Create a block with brackets nested to the given depth
+#  @param   depth     The nesting depth
+def makeBrackets(depth):
+	return '{ a(b); ' * depth + 'c;' + ' }' * depth
+
+## Create a docblock with the given amount of tags
+#  @param   tags      The amount of tags
+def makeDocblock(tags):
+
+	text = '/**\n * The description\n * of this function\n *\n'
+
+	for i in range(tags):
+		text += ' * @param   {String|Number}   param%d   The %dth parameter\n' % (i, i)
+
+	return text + ' * @return  {Object}\n */'
+
+## Count the statements, including the ones in blocks
+#  @param   statements    The StatementNodes
+def countStatements(statements):
+
+	count = 0
+
+	for statement in statements:
+		count += 1
+
+		for block in statement.getBlocks():
+			count += countStatements(block.parsed)
+
+	return count
+
+## Get the expression statements of a text, including nested ones
+#  @param   statements    The StatementNodes
+#  @param   result        The list to add them to
+def getExpressions(statements, result):
+
+	for statement in statements:
+
+		if statement.openType == 'expression':
+			result.append(statement)
+
+		for block in statement.getBlocks():
+			getExpressions(block.parsed, result)
+
+	return result
+
+## Parse a docblock completely (Docblock only parses when it's used)
+#  @param   text      The docblock text
+def parseDocblock(text):
+
+	docblock = Docblock(text)
+
+	return (docblock.description, docblock.properties)
+
+## Get the docblocks of a text
+#  @param   text      The text
+def getDocblocks(text):
+
+	lexer = WittyLexer(text)
+
+	return [text[start:end] for (kind, start, end, line) in lexer.tokens if kind == 'docblock']
+
+#
+# The inputs of every benchmark.
+# Each input builder gets a size & returns (description, chars, statements, call)
+#
+
+## splitStatements on a complete text (tokenizing included)
+def splitInput(text, description):
+	statements = countStatements(wf.splitStatements(text, 1))
+	return (description, len(text), statements, lambda: wf.splitStatements(text, 1))
+
+## extractExpression at the beginning of the given expressions
+def expressionInput(text, startIds, description):
+
+	lexer = WittyLexer(text)
+	chars = len(text)
+
+	def call():
+		for startId in startIds:
+			wf.extractExpression(text, 1, 1, 0, startId, False, False, True, lexer)
+
+	return (description, chars, len(startIds), call)
+
+## A function that is called on a list of texts
+def textsInput(function, texts, description, statements = None):
+
+	def call():
+		for text in texts:
+			function(text)
+
+	return (description, sum(len(text) for text in texts), statements, call)
+
+## Get the expression texts & their start ids in example.js
+def getExampleExpressions(text):
+
+	expressions = getExpressions(wf.splitStatements(text, 1), [])
+
+	return ([statement.result.getText(text) for statement in expressions], [statement.beginId for statement in expressions])
+
+## Get the example file
+def getExample():
+
+	exampleFile = open(os.path.join(root, 'examples', 'example.js'))
+
+	try:
+		return exampleFile.read()
+	finally:
+		exampleFile.close()
+
+## Get the benchmarks, as (function name, [(series name, builder, sizes)])
+#  @param   quick     Use smaller sizes
+def getBenchmarks(quick):
+
+	example = getExample()
+	(exampleTexts, exampleIds) = getExampleExpressions(example)
+	exampleDocblocks = getDocblocks(example)
+
+	if quick:
+		units = [8, 16, 32]
+		depths = [4, 8, 16]
+		terms = [8, 16, 32]
+	else:
+		units = [25, 50, 100, 200]
+		depths = [8, 16, 32, 64]
+		terms = [25, 50, 100, 200]
+
+	expressionText = lambda size: ('expr x%d' % size, [makeExpression(size)])
+
+	return [
+		('splitStatements', [
+			('example.js', lambda size: splitInput(example, 'example.js'), [None]),
+			('flat', lambda size: splitInput(makeFile(size), '%d units' % size), units),
+			('nested', lambda size: splitInput(makeNested(size), 'depth %d' % size), depths),
+		]),
+		('extractExpression', [
+			('example.js', lambda size: expressionInput(example, exampleIds, 'example.js'), [None]),
+			('terms', lambda size: expressionInput(makeExpression(size), [0], '%d terms' % size), terms),
+			('lines', lambda size: expressionInput(makeMultiline(size * 4), [0], '%d lines' % (size * 4)), terms),
+		]),
+		('tokenizeExpression', [
+			('example.js', lambda size: textsInput(wf.tokenizeExpression, exampleTexts, 'example.js', len(exampleTexts)), [None]),
+			('terms', lambda size: textsInput(wf.tokenizeExpression, [makeExpression(size)], '%d terms' % size, 1), terms),
+		]),
+		('normalizeExpression', [
+			('example.js', lambda size: textsInput(wf.normalizeExpression, exampleTexts, 'example.js', len(exampleTexts)), [None]),
+			('terms', lambda size: textsInput(wf.normalizeExpression, [makeExpression(size)], '%d terms' % size, 1), terms),
+		]),
+		('extractBetween', [
+			('example.js', lambda size: textsInput(lambda text: wf.extractBetween(text, '{', '}', text.find('{')), [example], 'example.js'), [None]),
+			('flat', lambda size: textsInput(lambda text: wf.extractBetween(text, '{', '}'), ['{' + makeFile(size) + '}'], '%d units' % size), units),
+			('nested', lambda size: textsInput(lambda text: wf.extractBetween(text, '{', '}'), [makeBrackets(size * 8)], 'depth %d' % (size * 8)), depths),
+		]),
+		('_hasChars', [
+			('example.js', lambda size: textsInput(lambda text: wf._hasChars(text, ['function', 'var'], 0), exampleTexts, 'example.js'), [None]),
+			('whitespace', lambda size: textsInput(lambda text: wf._hasChars(text, 'word', 0), [' \t\n' * size * 100 + 'word'], '%d chars' % (size * 300)), units),
+		]),
+		('Docblock', [
+			('example.js', lambda size: textsInput(parseDocblock, exampleDocblocks, 'example.js'), [None]),
+			('tags', lambda size: textsInput(parseDocblock, [makeDocblock(size)], '%d tags' % size), terms),
+		]),
+	]
+
+## Time a call: the best average of 3 rounds of at least minTime seconds
+#  @param   call      The function to call
+#  @param   minTime   The minimum duration of a round
+def measure(call, minTime):
+
+	best = None
+
+	for attempt in range(3):
+
+		count = 0
+		start = time.perf_counter()
+
+		while True:
+			call()
+			count += 1
+			elapsed = time.perf_counter() - start
+
+			if elapsed >= minTime:
+				break
+
+		perCall = elapsed / count
+
+		if best is None or perCall < best:
+			best = perCall
+
+	return best
+
+## Get the slope of log(time) against log(chars)
+#  @param   points    A list of (chars, seconds) tuples
+def getExponent(points):
+
+	if len(points) < 2:
+		return None
+
+	xs = [math.log(chars) for (chars, seconds) in points]
+	ys = [math.log(seconds) for (chars, seconds) in points]
+
+	meanX = sum(xs) / len(xs)
+	meanY = sum(ys) / len(ys)
+
+	numerator = sum((x - meanX) * (y - meanY) for (x, y) in zip(xs, ys))
+	denominator = sum((x - meanX) ** 2 for x in xs)
+
+	if not denominator:
+		return None
+
+	return numerator / denominator
+
+## Run the benchmarks & print the results
+#  @param   names     Only run these functions (all when empty)
+#  @param   quick     Use smaller sizes & shorter rounds
+def run(names, quick):
+
+	minTime = 0.02 if quick else 0.1
+	results = []
+
+	print('%-20s %-12s %-12s %10s %12s %14s %12s' % ('function', 'series', 'input', 'chars', 'ms/call', 'chars/sec', 'stmts/sec'))
+
+	for (function, series) in getBenchmarks(quick):
+
+		if names and not function in names:
+			continue
+
+		for (seriesName, build, sizes) in series:
+
+			points = []
+
+			for size in sizes:
+				(description, chars, statements, call) = build(size)
+				seconds = measure(call, minTime)
+				points.append((chars, seconds))
+
+				statementRate = ''
+
+				if statements:
+					statementRate = '%.0f' % (statements / seconds)
+
+				print('%-20s %-12s %-12s %10d %12.3f %14.0f %12s' % (function, seriesName, description, chars, seconds * 1000, chars / seconds, statementRate))
+
+				results.append({
+					'function': function,
+					'series': seriesName,
+					'input': description,
+					'chars': chars,
+					'statements': statements,
+					'seconds': seconds
+				})
+
+			exponent = getExponent(points)
+
+			if exponent is not None:
+				print('%-20s %-12s scaling exponent %.2f' % (function, seriesName, exponent))
+
+				results.append({
+					'function': function,
+					'series': seriesName,
+					'exponent': exponent
+				})
+
+	return results
+
+if __name__ == '__main__':
+
+	argumentParser = argparse.ArgumentParser(description = 'Benchmark the parser functions')
+	argumentParser.add_argument('functions', nargs = '*', help = 'Only run these functions')
+	argumentParser.add_argument('--quick', action = 'store_true', help = 'Use smaller inputs')
+	argumentParser.add_argument('--json', help = 'Also write the results to this file')
+	arguments = argumentParser.parse_args()
+
+	results = run(arguments.functions, arguments.quick)
+
+	if arguments.json:
+		jsonFile = open(arguments.json, 'w')
+
+		try:
+			json.dump(results, jsonFile, indent = 1)
+		finally:
+			jsonFile.close()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+#
+# Parse JavaScript files with the parse profiler enabled,
+# print the totals per statement type & dump them as JSON:
+#
+#   python3 benchmarks/profileparse.py [--json FILE] file.js [file.js ...]
+#
+import os, sys, types, argparse
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Make the package importable under the name Sublime gives it
+if not 'Witty' in sys.modules:
+	package = types.ModuleType('Witty')
+	package.__path__ = [root]
+	sys.modules['Witty'] = package
+
+import Witty.library.functions as wf
+from Witty.library.WittyProfiler import profiler
+
+if __name__ == '__main__':
+
+	argumentParser = argparse.ArgumentParser(description = 'Profile the parser per statement type')
+	argumentParser.add_argument('files', nargs = '+', help = 'The files to parse')
+	argumentParser.add_argument('--json', help = 'Write the counters to this file')
+	arguments = argumentParser.parse_args()
+
+	profiler.enable()
+
+	for fileName in arguments.files:
+
+		sourceFile = open(fileName)
+
+		try:
+			text = sourceFile.read()
+		finally:
+			sourceFile.close()
+
+		profiler.setFile(fileName)
+		wf.splitStatements(text, 1)
+		profiler.setFile(None)
+
+	print(profiler.getReport())
+
+	if arguments.json:
+		profiler.dump(arguments.json)
@@ -1,5 +1,6 @@
 import re
 import Witty.library.functions as wf
+from Witty.library.WittyMemo import WittyMemo
 
 # Debug wrappers
 def warn(message, showStack = True): wf.warn(message, showStack, 3)
@@ -12,19 +13,52 @@ reDescription = re.compile('\/\*(.*?)[@|\/]', re.M|re.S)
 # Docblock properties
 reAt = re.compile('^.*?@(\w+)?[ \t]*(.*)', re.M)
 
+# The stars at the beginning of description lines
+reStars = re.compile('^\s?\*\s?', re.M|re.S)
+
+# Whitespace to collapse
+reSpaces = re.compile('\s+')
+
+# Curly braces around a type
+reCurly = re.compile('[\{\}]')
+
 #
 # The DocBlock class
 #
+# The description & properties are only parsed when they're first used.
+# Use getDocblock() instead of the constructor, it shares one instance
+# per docblock text, so they must not be changed.
+#
 class Docblock:
 
+	__slots__ = ('original', '_description', '_properties')
+
 	def __init__(self, text):
 		
 		if not text:
 			text = ''
 
 		self.original = text
-		self.description = self.parseDescription()
-		self.properties = self.parseProperties()
+		self._description = None
+		self._properties = None
+
+	# The description, parsed on first access
+	@property
+	def description(self):
+
+		if self._description is None:
+			self._description = self.parseDescription()
+
+		return self._description
+
+	# The properties by name, parsed on first access
+	@property
+	def properties(self):
+
+		if self._properties is None:
+			self._properties = self.parseProperties()
+
+		return self._properties
 
 	# Get the description inside the given docblock text
 	def parseDescription(self):
@@ -34,7 +68,7 @@ class Docblock:
 		if description:
 			description = description.group(1)
 			# Remove the leading stars
-			return re.sub('^\s?\*\s?', '', description, 0, re.M|re.S)
+			return reStars.sub('', description)
 		else:
 			return False
 
@@ -66,9 +100,7 @@ class Docblock:
 		result = self.getAttribute('type')
 
 		if result:
-			result = re.sub('{', '', result)
-			result = re.sub('}', '', result)
-			result = result.strip()
+			result = reCurly.sub('', result).strip()
 			
 		return result
 
@@ -79,7 +111,7 @@ class Docblock:
 			text = text[0]
 
 		# Remove all double whitespaces
-		text = re.sub('\s+', ' ', text)
+		text = reSpaces.sub(' ', text)
 
 		return text
 
@@ -92,7 +124,7 @@ class Docblock:
 		typeName = ''
 
 		# Remove all double whitespaces
-		text = re.sub('\s+', ' ', text)
+		text = reSpaces.sub(' ', text)
 
 		# Get the type
 		temp = text.split(' ', 1)
@@ -104,7 +136,7 @@ class Docblock:
 			return False
 
 		typeName = temp[0]
-		result['type'] = re.sub('[\{\}]', '', typeName)
+		result['type'] = reCurly.sub('', typeName)
 
 		# Get the name
 		temp = name.split(' ', 1)
@@ -155,9 +187,7 @@ class Docblock:
 			if ret:
 				ret = ret.strip()
 				pieces = ret.split(' ', 1)
-				type = re.sub('{', '', pieces[0])
-				type = re.sub('}', '', type)
-				type = type.strip()
+				type = reCurly.sub('', pieces[0]).strip()
 
 				description = pieces[1]
 
@@ -178,4 +208,25 @@ class Docblock:
 	# Get the @param properties
 	def getParams(self):
 		return self.__getTypes('param')
-		
\ No newline at end of file
+
+# The docblock without any text
+emptyDocblock = Docblock('')
+
+# The shared docblocks, by their text
+docblockMemo = WittyMemo('Docblock', 4096)
+
+## Get the shared Docblock of a text
+#  @param   text     The docblock text (or an empty value)
+#  @return  The Docblock
+def getDocblock(text):
+
+	if not text:
+		return emptyDocblock
+
+	docblock = docblockMemo.get(text)
+
+	if docblock is None:
+		docblock = Docblock(text)
+		docblockMemo.set(text, docblock)
+
+	return docblock
@@ -0,0 +1,176 @@
+import os, pickle
+import Witty.library.functions as wf
+
+# Debug wrappers
+def warn(message, showStack = True): wf.warn(message, showStack, 3)
+def info(message, showStack = True): wf.info(message, showStack, 3)
+def pr(message, showStack = True): wf.pr(message, showStack, 3)
+
+# Change this whenever the parse results change,
+# so old cache entries aren't used anymore
+parserVersion = '6'
+
+#
+# WittyCache stores the parse results of files on disk,
+# keyed by a hash of their contents and the parser version.
+# Unchanged files can then be loaded without parsing them.
+# When the cache grows too large the least recently
+# used entries are removed.
+#
+class WittyCache:
+
+	## Constructor
+	#  @param   self        The object pointer
+	#  @param   directory   The directory to store the entries in
+	#  @param   maxSize     The maximum size of all entries, in bytes
+	def __init__(self, directory, maxSize):
+
+		self.directory = directory
+		self.maxSize = maxSize
+
+		# The size of all entries, counted on the first store
+		self.size = None
+
+		try:
+			os.makedirs(directory, exist_ok = True)
+		except OSError:
+			warn('Unable to create cache directory ' + directory)
+			self.directory = None
+
+	## Get the key of a text
+	#  @param   self        The object pointer
+	#  @param   text        The contents of the file
+	#  @param   lazyBodies  If function bodies are parsed lazily
+	def getKey(self, text, lazyBodies = False):
+		return wf.generateHash([parserVersion, 'lazy' if lazyBodies else 'full', text])
+
+	## Get the path of an entry
+	#  @param   self        The object pointer
+	#  @param   key         The key of the entry
+	def getPath(self, key):
+		return os.path.join(self.directory, key + '.pickle')
+
+	## Get a stored entry
+	#  @param   self        The object pointer
+	#  @param   key         The key of the entry
+	#  @return  The stored data, or None
+	def get(self, key):
+
+		if not self.directory:
+			return None
+
+		path = self.getPath(key)
+
+		try:
+			cacheFile = open(path, 'rb')
+
+			try:
+				data = pickle.load(cacheFile)
+			finally:
+				cacheFile.close()
+
+		except FileNotFoundError:
+			return None
+		except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+			warn('Unable to load cache entry ' + key)
+			return None
+
+		# Mark the entry as recently used
+		try:
+			os.utime(path)
+		except OSError:
+			pass
+
+		return data
+
+	## Store an entry
+	#  @param   self        The object pointer
+	#  @param   key         The key of the entry
+	#  @param   data        The data to store
+	def set(self, key, data):
+
+		if not self.directory:
+			return False
+
+		path = self.getPath(key)
+
+		# Write to a temporary file first, so other threads never load half an entry
+		tempPath = path + '.' + str(os.getpid()) + '.tmp'
+
+		try:
+			cacheFile = open(tempPath, 'wb')
+
+			try:
+				pickle.dump(data, cacheFile, pickle.HIGHEST_PROTOCOL)
+			finally:
+				cacheFile.close()
+
+			os.replace(tempPath, path)
+			entrySize = os.path.getsize(path)
+		except (OSError, pickle.PicklingError):
+			warn('Unable to store cache entry ' + key)
+			return False
+
+		if self.size is None:
+			self.size = self.getSize()
+		else:
+			self.size += entrySize
+
+		if self.size > self.maxSize:
+			self.evict()
+
+		return True
+
+	## Get the entries, least recently used first
+	#  @param   self        The object pointer
+	#  @return  A list of (time, size, path) tuples
+	def getEntries(self):
+
+		entries = []
+
+		for fileName in os.listdir(self.directory):
+
+			if not fileName.endswith('.pickle'):
+				continue
+
+			path = os.path.join(self.directory, fileName)
+
+			try:
+				stat = os.stat(path)
+			except OSError:
+				continue
+
+			entries.append((stat.st_mtime, stat.st_size, path))
+
+		entries.sort()
+
+		return entries
+
+	## Get the size of all the entries
+	#  @param   self        The object pointer
+	def getSize(self):
+		return sum(entry[1] for entry in self.getEntries())
+
+	## Remove the least recently used entries until
+	#  the cache is below 3/4 of its maximum size
+	#  @param   self        The object pointer
+	def evict(self):
+
+		entries = self.getEntries()
+		size = sum(entry[1] for entry in entries)
+		target = self.maxSize * 3 // 4
+
+		for (mtime, entrySize, path) in entries:
+
+			if size <= target:
+				break
+
+			try:
+				os.remove(path)
+				size -= entrySize
+			except OSError:
+				pass
+
+		info('Evicted cache entries, ' + str(size) + ' bytes left')
+
+		self.size = size
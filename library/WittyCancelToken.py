@@ -0,0 +1,32 @@
+#
+# Raised when a parse notices its cancel token was cancelled
+#
+class ParseCancelled(Exception):
+	pass
+
+#
+# A WittyCancelToken is handed to everything a parse runs.
+# Starting a new parse cancels the token of the running one,
+# which then stops at the next statement boundary it checks.
+# The generation number tells which parse is the newest,
+# so results of older ones can be thrown away.
+#
+class WittyCancelToken:
+
+	## Constructor
+	#  @param   self         The object pointer
+	#  @param   generation   The number of the parse this token belongs to
+	def __init__(self, generation = 0):
+		self.generation = generation
+		self.cancelled = False
+
+	## Cancel the parse
+	#  @param   self         The object pointer
+	def cancel(self):
+		self.cancelled = True
+
+	## Stop the parse if it was cancelled
+	#  @param   self         The object pointer
+	def check(self):
+		if self.cancelled:
+			raise ParseCancelled('Parse generation ' + str(self.generation) + ' was cancelled')
@@ -1,9 +1,13 @@
 import re
 import os
 import json
+from bisect import bisect_right
 import Witty.library.functions as wf
 from Witty.library.WittyStatement import WittyStatement
+from Witty.library.WittyLexer import WittyLexer, getLineStarts
+from Witty.library.WittyNode import Extraction
 from Witty.library.Docblock import Docblock
+from Witty.library.WittyProfiler import profiler, getRetainedSize
 
 # Debug wrappers
 def warn(message, showStack = True): wf.warn(message, showStack, 3)
@@ -12,7 +16,15 @@ def pr(message, showStack = True): wf.pr(message, showStack, 3)
 
 class WittyFile:
 
-	def __init__(self, project, fileName, core = False):
+	## Constructor
+	#  @param   self                The object pointer
+	#  @param   project             The WittyProject this file is in
+	#  @param   fileName            The path to the file
+	#  @param   core                If this is a core file, which isn't read
+	#  @param   previous            The WittyFile of the previous version, to reuse
+	#  @param   cancel              The WittyCancelToken of the parse
+	#  @param   result              The result of parsing the file in a worker process
+	def __init__(self, project, fileName, core = False, previous = None, cancel = None, result = None):
 
 		# The project we're modifying
 		self.project = project
@@ -21,59 +33,101 @@ class WittyFile:
 		self.fileName = fileName
 		self.name = fileName
 
-		# Set the working string to empty
-		self.working = ''
-
 		# Create the statements
-		self.splitStatements = []
 		self.statements = []
-
-		# Empty the blocks
-		self.docblocks = []
+		self.objStatements = []
 
 		# Create the scopes
 		self.scopes = []
 		self.scopeDocBlocks = {}
 
+		# The innermost scope id of every range of offsets, built when it's needed
+		self.scopeIndex = None
+
+		# The original file contents
+		self.original = ''
+
+		# The lexer of the original file, which also indexes the lines.
+		# It's dropped once the file has been post parsed
+		self.lexer = None
+
+		# The offset every line starts at, kept when the lexer is dropped
+		self.lineStarts = None
+
+		# The key of this file's parse results in the cache
+		self.cacheKey = None
+
+		# The WittyCancelToken of the parse, while it runs
+		self.cancel = cancel
+
+		# The first scope id & statement index of every top level statement
+		self.topScopes = []
+		self.topStatements = []
+
+		# Are function bodies only parsed when they're needed?
+		self.lazyBodies = wf.lazyBodies
+
+		# The lazy blocks that have been parsed since, with their skeleton statements
+		self.expansions = []
+
+		# The amount of scopes & statements before the first expansion
+		self.skeletonSize = None
+
+		# What a reparse reuses of the previous version, until it's committed
+		self.reuse = None
+
+		# Has a newer version taken over the statements of this file?
+		self.replaced = False
+
 		# First we add an empty scope because 0 == False and all
 		self.createNewScope('global', False)
 		self.createNewScope('root', 0)
 
-		self.root = {}
-
 		# See if the language is set already
 		self.language = project.getFileLanguage(fileName)
 
 		self.intel = None
 
-		# Open the original file
-		if not core:
-			fileHandle = open(fileName, 'rU')
+		if result is not None:
+			# The file has already been read & parsed
+			self.setResult(result)
+		elif not core:
+			# Open the original file
+			fileHandle = open(fileName, 'r')
 
 			# Read in the original file
 			self.original = fileHandle.read()
 
-			# The array
-			self.fileArray = self.original.split('\n')
-
 			# Close the file
 			fileHandle.close()
 
 			# Do we have to get the language of the file?
 			self.detectLanguage()
 
-			# Recursively split all the statements
-			splitStatements = wf.splitStatements(self.original, 1)
-			self.objStatements = self.parseStatements(splitStatements, 1)
+			if project.cache:
+				self.cacheKey = project.cache.getKey(self.original, self.lazyBodies)
+
+			# Count what the parser does for this file
+			profiler.setFile(fileName)
+
+			if self.loadCache():
+				# The file hasn't changed since it was cached
+				self.processStatements(self.objStatements)
+			elif self.canReparse(previous):
+				# Only parse what changed since the previous version,
+				# it's stored once the parse is committed
+				self.reparse(previous)
+			else:
+				self.parse()
+				self.storeCache()
+
+			profiler.setFile(None)
+
+			self.cancel = None
 
 			wf.log(self.scopes, self.language + 'scopes')
-			wf.log({fileName: splitStatements, 'scopes': self.scopes})
 			wf.log(self.objStatements, 'witty-' + self.language + '-objstatements')
 
-			# Recursively go through all the statements in this file
-			for stat in self.objStatements:
-				WittyStatement(self, stat)
-
 			for s in self.statements:
 				wf.log(s, 'witty-' + self.language + '-statements')
 
@@ -134,7 +188,7 @@ class WittyFile:
 		for root, dirs, files in os.walk(directory, topdown=True):
 			for fileName in files:
 				filePath = os.path.join(root, fileName)
-				tempFile = open(filePath, 'rU')
+				tempFile = open(filePath, 'r')
 				json_data = tempFile.read()
 				tempFile.close()
 
@@ -156,95 +210,616 @@ class WittyFile:
 				targetScope['variables'].update(data['variables'])
 
 
-	# Parsing statements begins here
+	## Parse & process top level statements, one at a time
+	#  @param   self                The object pointer
+	#  @param   workingStatements   The split statements (a list, or a generator)
+	#  @param   scopeId             The id of the scope they're in
+	#  @return  The last statement, or None
 	def parseStatements(self, workingStatements, scopeId = 1):
 
-		wf.log(workingStatements, 'wittystats')
-
-		statements = []
+		stat = None
 
 		for stat in workingStatements:
-			statements.append(self.parseStatement(stat, scopeId))
+			self.topScopes.append(len(self.scopes))
+			self.objStatements.append(self.parseStatement(stat, scopeId))
+			self.processStatement(stat)
+
+		wf.log({self.fileName: self.objStatements, 'scopes': self.scopes}, 'wittystats')
+
+		return stat
+
+	## Parse the complete file
+	#  @param   self                The object pointer
+	def parse(self):
+
+		# Tokenize the file & index its lines
+		self.lexer = self.getLexer()
+
+		# Recursively split all the statements,
+		# handling every top level statement as soon as it's split
+		self.parseStatements(wf.iterStatements(self.original, 1, 1, 0, 0, self.lexer, None, None, self.cancel), 1)
+
+	## Recursively go through the given top level statements
+	#  @param   self                The object pointer
+	#  @param   statements          The parsed top level statements
+	def processStatements(self, statements):
+
+		for stat in statements:
+			self.processStatement(stat)
+
+	## Create the WittyStatements of a parsed top level statement
+	#  @param   self                The object pointer
+	#  @param   stat                The parsed top level statement
+	def processStatement(self, stat):
+		self.topStatements.append(len(self.statements))
+		WittyStatement(self, stat)
+
+	## Load the parse results of this file from the cache
+	#  @param   self                The object pointer
+	#  @return  True if they were found
+	def loadCache(self):
+
+		if not self.cacheKey:
+			return False
+
+		data = self.project.cache.get(self.cacheKey)
+
+		if not data:
+			return False
+
+		self.setParseData(data)
+
+		return True
+
+	## Store the parse results of this file in the cache
+	#  @param   self                The object pointer
+	def storeCache(self):
+
+		if not self.cacheKey:
+			return False
+
+		return self.project.cache.set(self.cacheKey, self.getParseData())
+
+	## Get the parse results of this file, which can be pickled
+	#  @param   self                The object pointer
+	#  @return  A dict with the top level statements & scopes
+	def getParseData(self):
+
+		return {
+			'objStatements': self.objStatements,
+			'scopes': self.scopes,
+			'scopeDocBlocks': self.scopeDocBlocks,
+			'topScopes': self.topScopes
+		}
+
+	## Use the parse results of getParseData()
+	#  @param   self                The object pointer
+	#  @param   data                The dict with the top level statements & scopes
+	def setParseData(self, data):
+
+		self.objStatements = data['objStatements']
+		self.scopes = data['scopes']
+		self.scopeDocBlocks = data['scopeDocBlocks']
+		self.topScopes = data['topScopes']
+
+	## Get everything a worker process has to send back
+	#  for this file to be created again in the parser thread
+	#  @param   self                The object pointer
+	#  @return  A dict that can be pickled
+	def getResult(self):
+
+		return {
+			'original': self.original,
+			'language': self.language,
+			'cacheKey': self.cacheKey,
+			'data': self.getParseData()
+		}
+
+	## Use what a worker process sent back, instead of parsing the file
+	#  @param   self                The object pointer
+	#  @param   result              The dict of getResult()
+	def setResult(self, result):
+
+		self.original = result['original']
+		self.cacheKey = result['cacheKey']
+
+		# The worker detected the language if it wasn't set yet
+		if not self.language:
+			self.setLanguage(result['language'])
+
+		self.setParseData(result['data'])
+		self.processStatements(self.objStatements)
+
+		# Count what the worker's parser did for this file
+		if result.get('profile'):
+			profiler.addFile(self.fileName, result['profile'])
+
+		self.cancel = None
+
+	## See if the previous version of this file can be reused
+	#  @param   self                The object pointer
+	#  @param   previous            The WittyFile of the previous version
+	def canReparse(self, previous):
+
+		if not previous or not getattr(previous, 'original', None):
+			return False
+
+		# Its statements belong to a newer version already
+		if getattr(previous, 'replaced', False):
+			return False
+
+		# Files without the top level index can't be reused
+		if len(getattr(previous, 'topScopes', [])) != len(previous.objStatements):
+			return False
+
+		return True
+
+	## Parse the file by reusing the statements of the previous version
+	#  that come before and after the changed part of the text.
+	#  The previous version isn't changed: the reused statements are
+	#  only taken over by commitReparse(), once the parse is kept
+	#  @param   self                The object pointer
+	#  @param   previous            The WittyFile of the previous version
+	def reparse(self, previous):
+
+		old = previous.original
+		new = self.original
+		oldStatements = previous.objStatements
+		count = len(oldStatements)
+
+		(head, oldEnd, newEnd) = wf.getChangedRange(old, new)
+
+		# Tokenize the new file & index its lines
+		self.lexer = self.getLexer()
+
+		# Bodies that were parsed on demand come after the top level ones,
+		# they're left out & collapsed when the reparse is committed
+		if previous.skeletonSize is None:
+			(scopeCount, statementCount) = (len(previous.scopes), len(previous.statements))
+		else:
+			(scopeCount, statementCount) = previous.skeletonSize
+
+		delta = len(new) - len(old)
+		lineDelta = len(self.lexer.lineStarts) - old.count('\n') - 1
+
+		# Reuse the statements that end before the change,
+		# except the last one: the change could continue it
+		keep = 0
+
+		while keep < count and oldStatements[keep].endId < head:
+			keep += 1
+
+		keep = max(keep - 1, 0)
+
+		if keep:
+			startId = oldStatements[keep - 1].endId + 1
+		else:
+			startId = 0
+
+		if keep < count:
+			firstScope = previous.topScopes[keep]
+			firstStatement = previous.topStatements[keep]
+		else:
+			firstScope = scopeCount
+			firstStatement = statementCount
+
+		self.scopes = previous.scopes[:firstScope]
+		self.statements = previous.statements[:firstStatement]
+		self.topScopes = previous.topScopes[:keep]
+		self.topStatements = previous.topStatements[:keep]
+		self.objStatements = oldStatements[:keep]
+
+		for scopeId in range(firstScope):
+			self.scopeDocBlocks[scopeId] = previous.scopeDocBlocks[scopeId]
+
+		# Old statements that lie completely after the change can be synced to,
+		# by their end id in the new text
+		stopAt = {}
+
+		for index in range(keep, count):
+			if oldStatements[index].beginId >= oldEnd:
+				stopAt[oldStatements[index].endId + delta] = index
+
+		last = self.parseStatements(wf.iterStatements(new, 1, 1, startId, 0, self.lexer, None, stopAt, self.cancel), 1)
+
+		# If the last statement ended where an old one did, the rest is the same
+		if last is None or last.endId not in stopAt or stopAt[last.endId] + 1 >= count:
+			synced = count
+		else:
+			synced = stopAt[last.endId] + 1
+
+		self.reuse = {
+			'previous': previous,
+			'firstStatement': firstStatement,
+			'synced': synced,
+			'scopeCount': scopeCount,
+			'statementCount': statementCount,
+			'delta': delta,
+			'lineDelta': lineDelta
+		}
+
+	## Take over the statements a reparse reused from the previous version.
+	#  This changes the previous version, so it's only done once
+	#  the parse is sure to be kept (and holds the parse lock)
+	#  @param   self                The object pointer
+	def commitReparse(self):
+
+		reuse = self.reuse
+
+		if reuse is None:
+			return
+
+		self.reuse = None
+		previous = reuse['previous']
+
+		# A parse that was committed in the meantime took over
+		# the statements, they can't be reused anymore
+		if previous.replaced:
+			self.parseAgain()
+			self.storeCache()
+			return
+
+		previous.replaced = True
+
+		# Put the previous version's statements back in top level order
+		previous.collapse()
+
+		for statement in self.statements[:reuse['firstStatement']]:
+			statement.parentfile = self
+
+		synced = reuse['synced']
+		oldStatements = previous.objStatements
+		count = len(oldStatements)
+
+		if synced < count:
+			delta = reuse['delta']
+			lineDelta = reuse['lineDelta']
 
-		return statements
+			scopeStart = previous.topScopes[synced]
+			scopeDelta = len(self.scopes) - scopeStart
+			statementDelta = len(self.statements) - previous.topStatements[synced]
+
+			# Renumber & move the scopes of the reused statements
+			for scope in previous.scopes[scopeStart:reuse['scopeCount']]:
+				self.scopeDocBlocks[scope['id'] + scopeDelta] = previous.scopeDocBlocks[scope['id']]
+				scope['id'] += scopeDelta
+				scope['begin'] += delta
+				scope['end'] += delta
+
+				if scope['parent'] >= scopeStart:
+					scope['parent'] += scopeDelta
+
+				self.scopes.append(scope)
+
+			for index in range(synced, count):
+				self.topScopes.append(previous.topScopes[index] + scopeDelta)
+				self.topStatements.append(previous.topStatements[index] + statementDelta)
+
+			for statement in oldStatements[synced:]:
+				statement.shift(delta, lineDelta, scopeStart, scopeDelta)
+				self.objStatements.append(statement)
+
+			for statement in previous.statements[previous.topStatements[synced]:reuse['statementCount']]:
+				statement.shift(self, lineDelta, scopeStart, scopeDelta)
+				self.statements.append(statement)
+
+			self.scopeIndex = None
+
+		self.storeCache()
+
+	## Throw away what was parsed & parse the complete file
+	#  @param   self                The object pointer
+	def parseAgain(self):
+
+		self.statements = []
+		self.objStatements = []
+		self.scopes = []
+		self.scopeDocBlocks = {}
+		self.scopeIndex = None
+		self.topScopes = []
+		self.topStatements = []
+
+		self.createNewScope('global', False)
+		self.createNewScope('root', 0)
+
+		self.parse()
 
 	## Parse the statement
 	#  @param   self                The object pointer
-	#  @param   statement           A primitive statement object
+	#  @param   statement           A StatementNode, or the Extraction of a function expression
 	#  @param   scopeId             The id of the scope it's in (id in the file)
 	def parseStatement(self, statement, scopeId, docblock = False):
 
-		statement['scopeId'] = scopeId
-		statement['line'] = self.original.count('\n', 0, statement['beginId']) + 1
+		statement.scopeId = scopeId
+		statement.line = self.getLine(statement.beginId)
+
+		# Function expressions only have their block to parse
+		if isinstance(statement, Extraction):
+
+			if statement.block is not None:
+
+				if statement.block.lazy is not None:
+					statement.block.lazy.scopeId = scopeId
+					statement.block.lazy.docblock = docblock
 
-		if 'openType' in statement and statement['openType'] == 'statement':
+				for stat in statement.block.parsed:
+					self.parseStatement(stat, scopeId, docblock)
+
+			return statement
+
+		if statement.openType == 'statement':
 
 			# @todo: Here, we just pass the statement docblock to the expressions
-			try:
-				docblock = statement['docblock']
-			except KeyError:
-				statement['docblock'] = ''
+			if statement.docblock is None:
+				statement.docblock = ''
 				docblock = False
+			else:
+				docblock = statement.docblock
 
 			resultCount = 0
 
-			if not isinstance(statement['result'], list):
-				statement['result'] = [statement['result']]
+			if not isinstance(statement.result, list):
+				statement.result = [statement.result]
 
 			# Loop through all the results in this statement
-			for r in statement['result']:
+			for r in statement.result:
 
 				# Add the docblock tot he first result, if it doesn't have one already
-				if resultCount == 0 and docblock and not r['docblock']:
-					r['docblock'] = docblock
+				if resultCount == 0 and docblock and not r.docblock:
+					r.docblock = docblock
 
 				# If there is an expression in this result
-				if 'expression' in r:
-					self.parseStatement(r['expression'], scopeId, docblock)
+				if r.expression is not None:
+					self.parseStatement(r.expression, scopeId, docblock)
 
 				# Parse block content
-				if 'block' in r:
+				if r.block is not None:
 
-					if statement['openName'] == 'function':
+					if statement.openName == 'function':
 						# @todo: some blocks are created even when they're not a function!
-						newScope = self.createNewScope(statement['line'], scopeId, docblock)
-						statement['subscopeId'] = newScope
-						for stat in r['block']['parsed']:
+						newScope = self.createNewScope(statement.line, scopeId, docblock, r.block.beginId, r.block.endId)
+						statement.subscopeId = newScope
+
+						if r.block.lazy is not None:
+							r.block.lazy.scopeId = newScope
+
+						for stat in r.block.parsed:
 							self.parseStatement(stat, newScope)
 					else:
-						for stat in r['block']['parsed']:
+						for stat in r.block.parsed:
 							self.parseStatement(stat, scopeId, docblock)
 
 				resultCount += 1
 
 
-		elif 'openType' in statement and statement['openType'] == 'expression':
+		elif statement.openType == 'expression':
 			# It's an expression
 
-			for f in statement['functions']:
+			for f in statement.functions:
+
+				lineNr = self.getLine(f.beginId)
 
-				lineNr = self.original.count('\n', 0, f['beginId']) + 1
+				if f.block is not None:
+					(begin, end) = (f.block.beginId, f.block.endId)
+				else:
+					(begin, end) = (f.beginId, f.beginId)
 
 				# @todo: the statement docblock is currently the only docblock we store
 				# expressions can't have docblocks yet
-				self.parseStatement(f, self.createNewScope(lineNr, scopeId, docblock))
-		
-		# Recursively parse block contents
-		if 'block' in statement:
-			
-			for stat in statement['block']['parsed']:
-				self.parseStatement(stat, scopeId, docblock)
-		
+				self.parseStatement(f, self.createNewScope(lineNr, scopeId, docblock, begin, end))
+
 		return statement
 
+	## Parse the lazy function bodies the given offset is in
+	#  @param   self                The object pointer
+	#  @param   offset              The offset in the original file
+	#  @return  True if anything was parsed
+	def parseBodiesAt(self, offset):
+
+		scopeStart = len(self.scopes)
+		statementStart = len(self.statements)
+
+		block = self.findLazyBlock(offset, self.objStatements)
+
+		profiler.setFile(self.fileName)
+
+		# Nested bodies are still lazy after parsing the outer one
+		while block is not None:
+			self.parseBody(block)
+			block = self.findLazyBlock(offset, block.parsed)
+
+		profiler.setFile(None)
+
+		if len(self.scopes) == scopeStart and len(self.statements) == statementStart:
+			return False
+
+		if self.intel:
+			self.intel.registerExpansion(self, scopeStart, statementStart)
+
+		return True
+
+	## Find the innermost lazy block the given offset is in
+	#  @param   self                The object pointer
+	#  @param   offset              The offset in the original file
+	#  @param   statements          The statements to look in
+	def findLazyBlock(self, offset, statements):
+
+		for statement in statements:
+
+			if statement.beginId > offset:
+				break
+
+			if statement.endId < offset:
+				continue
+
+			for block in statement.getBlocks():
+
+				if block.beginId <= offset <= block.endId:
+
+					if block.lazy is not None:
+						return block
+
+					return self.findLazyBlock(offset, block.parsed)
+
+		return None
+
+	## Parse the complete body of a lazy block
+	#  @param   self                The object pointer
+	#  @param   block               The lazy Block
+	def parseBody(self, block):
+
+		if self.skeletonSize is None:
+			self.skeletonSize = (len(self.scopes), len(self.statements))
+
+		lazy = block.lazy
+		skeleton = block.parsed
+		parsed = wf.splitStatements(self.original, lazy.scopeLevel, 1, block.beginId, 0, self.getLexer(), block.endId)
+
+		# The skeleton statements have been parsed & processed already
+		skeletonIds = dict((stat.beginId, stat) for stat in skeleton)
+		newStatements = []
+
+		for index, stat in enumerate(parsed):
+			if stat.beginId in skeletonIds:
+				parsed[index] = skeletonIds[stat.beginId]
+			else:
+				newStatements.append(stat)
+
+		for stat in newStatements:
+			self.parseStatement(stat, lazy.scopeId, lazy.docblock)
+
+		for stat in newStatements:
+			WittyStatement(self, stat)
+
+		block.parsed = parsed
+		block.lazy = None
+
+		self.expansions.append((block, skeleton, lazy))
+
+	## Undo all the parsed lazy bodies,
+	#  so the scopes & statements are in top level order again
+	#  @param   self                The object pointer
+	def collapse(self):
+
+		if self.skeletonSize is None:
+			return
+
+		for (block, skeleton, lazy) in reversed(self.expansions):
+			block.parsed = skeleton
+			block.lazy = lazy
+
+		(scopeCount, statementCount) = self.skeletonSize
+
+		for scope in self.scopes[scopeCount:]:
+			del self.scopeDocBlocks[scope['id']]
+
+		del self.scopes[scopeCount:]
+		del self.statements[statementCount:]
+
+		self.scopeIndex = None
+
+		self.expansions = []
+		self.skeletonSize = None
+
+	## Drop everything that is only needed while parsing,
+	#  it's rebuilt from the original text when it's needed again
+	#  @param   self                The object pointer
+	def compact(self):
+
+		if self.lexer is None:
+			return
+
+		if profiler.enabled:
+			before = self.getRetainedSize()
+
+		# The line table is small & answers every line lookup
+		self.lineStarts = self.lexer.lineStarts
+		self.lexer = None
+
+		if profiler.enabled:
+			profiler.addMemory(self.fileName, before, self.getRetainedSize())
+
+	## Get the bytes this file retains, without the project & intel it belongs to
+	#  @param   self                The object pointer
+	def getRetainedSize(self):
+		return getRetainedSize(self, [id(self.project), id(self.intel), id(self.cancel)])
+
+	## Get the offset of a line & column
+	#  @param   self                The object pointer
+	#  @param   lineNr              The line number (starting at 1)
+	#  @param   column              The column (starting at 0)
+	def getOffset(self, lineNr, column = 0):
+
+		lineStarts = self.getLineStarts()
+		lineNr = min(max(lineNr, 1), len(lineStarts))
+
+		return min(lineStarts[lineNr - 1] + column, len(self.original))
+
+	## Get the line number of the given offset
+	#  @param   self                The object pointer
+	#  @param   offset              The offset in the original file
+	def getLine(self, offset):
+		return bisect_right(self.getLineStarts(), offset)
+
+	## Get the text of the given line number
+	#  @param   self                The object pointer
+	#  @param   linenr              The line number (starting at 1)
 	def getFileLine(self, linenr):
-		try:
-			return self.fileArray[linenr-1]
-		except IndexError:
+
+		if not self.original:
 			return False
 
+		lineStarts = self.getLineStarts()
+
+		if linenr < 1 or linenr > len(lineStarts):
+			return False
+
+		if linenr < len(lineStarts):
+			end = lineStarts[linenr] - 1
+		else:
+			end = len(self.original)
+
+		return self.original[lineStarts[linenr - 1]:end]
+
+	## Get the offset every line of the original file starts at,
+	#  without tokenizing the file again when the lexer was dropped
+	#  @param   self                The object pointer
+	def getLineStarts(self):
+
+		if self.lexer is not None:
+			return self.lexer.lineStarts
+
+		if self.lineStarts is None:
+			self.lineStarts = getLineStarts(self.original)
+
+		return self.lineStarts
+
+	## Get the lexer of the original file, tokenizing it when needed
+	#  @param   self                The object pointer
+	def getLexer(self):
+
+		if not self.lexer:
+			self.lexer = WittyLexer(self.original, self.cancel)
+			self.lexer.skeleton = self.lazyBodies
+
+		return self.lexer
+
+	## Get the id of the innermost scope the given offset is in
+	#  @param   self                The object pointer
+	#  @param   offset              The offset in the original file
+	def getScopeAt(self, offset):
+
+		if self.scopeIndex is None:
+			self.scopeIndex = wf.getScopeIndex(self.scopes)
+
+		(starts, scopeIds) = self.scopeIndex
+
+		return scopeIds[bisect_right(starts, offset) - 1]
+
 	# Create a new scope, return its ID
-	def createNewScope(self, name, parentScope, docBlock = ''):
+	#  @param   begin               The offset the scope begins at
+	#  @param   end                 The offset it ends at (inclusive), or None for the end of the file
+	def createNewScope(self, name, parentScope, docBlock = '', begin = 0, end = None):
 		newId = len(self.scopes)
 
 		if isinstance(name, int):
@@ -254,9 +829,10 @@ class WittyFile:
 			else:
 				name = 'ERROR'
 		
-		self.scopes.append({'id': newId, 'name': name, 'parent': parentScope, 'variables': {}, 'level': 0})
+		self.scopes.append({'id': newId, 'name': name, 'parent': parentScope, 'variables': {}, 'level': 0, 'begin': begin, 'end': end})
 
 		self.scopeDocBlocks[newId] = docBlock
+		self.scopeIndex = None
 
 		workingScope = self.scopes[newId]
 
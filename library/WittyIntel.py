@@ -0,0 +1,506 @@
+import re
+import Witty.library.functions as wf
+from Witty.library.WittyScope import WittyRoot
+from Witty.library.WittyVariable import WittyVariable
+
+# Debug wrappers
+def warn(message, showStack = True): wf.warn(message, showStack, 3)
+def info(message, showStack = True): wf.info(message, showStack, 3)
+def pr(message, showStack = True): wf.pr(message, showStack, 3)
+
+# The separators between the names of a @typename
+reTypeNames = re.compile(r'[\s,]+')
+
+#
+# The Intel holds the scopes & variables of all the files
+# of one language in a project, and the types they name
+#
+class Intel:
+
+	def __init__(self, project, language):
+
+		# The parent project
+		self.project = project
+
+		# Create the root scope
+		self.root = WittyRoot(self)
+
+		# Files
+		self.files = {}
+
+		# The language
+		self.language = language
+
+		self.reset()
+
+	## Reset all the class variables
+	def reset(self):
+
+		# The scopes by their id
+		self.scopes = {}
+
+		# The scopes by filename
+		self.scopesByFilename = {}
+
+		# The scopes of every file by filename & their id in the file
+		self.scopeMaps = {}
+
+		# All the variables by their id, no matter the scope
+		self.variables = {}
+
+		# The variables by the name of the file that created them
+		self.variablesByFilename = {}
+
+		# All the types by name » variable, and all the variables that give a name
+		self.types = {}
+		self.typeVariables = {}
+
+		# The symbol index: the entries of every variable
+		# registered in a scope, by name & variable id
+		self.symbols = {}
+
+		# Globals
+		self.globals = []
+
+		# The ids the next scope & variable get
+		self.scopeCount = 1
+		self.variableCount = 0
+
+		# The name of the file whose scopes & variables are being added
+		self.attaching = None
+
+		# The names of the files whose scopes & variables have been added
+		self.attached = set()
+
+		# What every file changed in the variables of other files, so it can be undone
+		self.patches = {}
+
+		# The files that used the variables of a file, by its name, and the other way around
+		self.dependents = {}
+		self.dependencies = {}
+
+		# Also reset root (it'll add itself to the scopes)
+		self.root.resetIntel()
+
+	# Called after every parse, so every save
+	#  @param   cancel      The WittyCancelToken of the parse
+	#  @param   fileNames   The names of the files that were parsed (or removed),
+	#                       or None to rebuild all the files
+	def postParse(self, cancel = None, fileNames = None):
+
+		if fileNames is None:
+			self.reset()
+			info('Witty data has been reset, processing data ...')
+		elif fileNames:
+			# The files that used their variables have to be added again too
+			self.detachFiles(self.getDependents(set(fileNames)))
+
+		added = []
+
+		# Add the new files (and the ones a cancelled post parse didn't get to)
+		# in the same order as a complete rebuild would
+		for filename, wittyFile in self.files.items():
+
+			if filename in self.attached:
+				continue
+
+			# Stop when a newer parse has started, it'll post parse again
+			if cancel is not None:
+				cancel.check()
+
+			pr('Processing ' + filename)
+
+			self.attachFile(filename, wittyFile)
+			added.append(wittyFile.name)
+
+			# The lexer isn't needed anymore until the file changes
+			wittyFile.compact()
+
+		# for name, file in self.files.items():
+		# 	wf.log('\n\nFILENAME: "' + name + '"', 'witty-final-variables')
+		# 	wf.log('>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>\n'*3, 'witty-final-variables')
+			
+		for name in added:
+			for scope in self.scopesByFilename.get(name, []):
+				wf.log('\n\n>>\nScope: ' + str(scope.name), 'witty-' + self.language + '-final-variables')
+				wf.log((('>>>'*20) + '\n')*2, 'witty-' + self.language + '-final-variables')
+				wf.log(scope.variables, 'witty-' + self.language + '-final-variables', True)
+
+
+
+	## Add the scopes & variables of a file
+	#  @param   self        The object pointer
+	#  @param   filename    The name of the file
+	#  @param   wittyFile   The WittyFile
+	def attachFile(self, filename, wittyFile):
+
+		# Everything that is created from now on belongs to this file
+		self.attaching = filename
+
+		# Prepare all the scopes
+		# Here, we assume the file itself is also a scope
+		# That's kind-of true for node.js, but false for javascript
+		fileScope = self.root.addChildScope(wittyFile)
+		fileScope.setName(filename)
+		fileScope.makeFileScope(True)
+
+		# Map the scopes inside this file by their id in the file
+		scopeMap = {1: fileScope}
+		self.scopeMaps[filename] = scopeMap
+
+		self.addFileScopes(scopeMap, wittyFile.scopes, wittyFile.statements)
+
+		for scope in wittyFile.scopes:
+			if scope['id'] == 0:
+				targetScope = self.root
+			else:
+				targetScope = scopeMap[scope['id']]
+
+			for name, varinfo in scope['variables'].items():
+				targetScope.addVariable(False, varinfo)
+
+			wf.log(scope, 'witty-' + self.language + '-simplescopes', True)
+
+		for i, scope in scopeMap.items():
+			wf.log(scope, 'witty-' + self.language + '-WTScopes')
+
+		self.attaching = None
+		self.attached.add(filename)
+
+	## Remove the scopes & variables of files,
+	#  and undo what they changed in the variables of other files
+	#  @param   self        The object pointer
+	#  @param   fileNames   A set of file names
+	def detachFiles(self, fileNames):
+
+		fileNames = fileNames & self.attached
+
+		if not fileNames:
+			return
+
+		self.attached -= fileNames
+
+		for fileName in fileNames:
+
+			# Undo the changes in reverse, so the oldest value comes back last
+			for (target, key, value) in reversed(self.patches.pop(fileName, [])):
+				if isinstance(target, dict):
+					if target.get(key) is value:
+						del target[key]
+				elif isinstance(target, list):
+					if value in target:
+						target.remove(value)
+				else:
+					setattr(target, key, value)
+
+			for dependency in self.dependencies.pop(fileName, []):
+				if dependency in self.dependents:
+					self.dependents[dependency].discard(fileName)
+
+			for scope in self.scopesByFilename.pop(fileName, []):
+				del self.scopes[scope.id]
+
+			self.scopeMaps.pop(fileName, None)
+
+			removed = self.variablesByFilename.pop(fileName, [])
+
+			for variable in removed:
+				del self.variables[variable.id]
+
+			self.unregisterTypes(removed)
+			self.unregisterSymbols(removed)
+
+			# Variables of other files only end up in the root scope
+			self.root.unregisterVariables(removed)
+
+	## Get the given files & all the files that used their variables
+	#  @param   self        The object pointer
+	#  @param   fileNames   A set of file names
+	#  @return  A new set of file names
+	def getDependents(self, fileNames):
+
+		result = set()
+		todo = list(fileNames)
+
+		while todo:
+			fileName = todo.pop()
+
+			if fileName in result:
+				continue
+
+			result.add(fileName)
+			todo.extend(self.dependents.get(fileName, []))
+
+		return result
+
+	## Remember that the file being added uses a variable of another file
+	#  @param   self        The object pointer
+	#  @param   variable    The WittyVariable it uses
+	def useVariable(self, variable):
+
+		owner = variable.fileName
+
+		if owner is None or owner == self.attaching or self.attaching is None:
+			return
+
+		self.dependents.setdefault(owner, set()).add(self.attaching)
+		self.dependencies.setdefault(self.attaching, set()).add(owner)
+
+	## Remember a change the file being added made in a variable,
+	#  so it can be undone when the file is removed.
+	#  Changes to its own variables are thrown away with them
+	#  @param   self        The object pointer
+	#  @param   variable    The WittyVariable that changed
+	#  @param   target      The dict or list that changed, or the variable
+	#  @param   key         The key that was set, the attribute that was set
+	#                       or None for an item appended to a list
+	#  @param   value       The value that was added, or the old attribute value
+	def recordPatch(self, variable, target, key, value):
+
+		if self.attaching is None:
+			return
+
+		if variable.fileName == self.attaching and not variable.shared:
+			return
+
+		self.patches.setdefault(self.attaching, []).append((target, key, value))
+
+	## Add the scopes & statements of a file to their parent scopes
+	#  @param   self        The object pointer
+	#  @param   scopeMap    The WittyScopes of the file by their id in the file
+	#  @param   scopes      The scopes to add
+	#  @param   statements  The WittyStatements to add
+	def addFileScopes(self, scopeMap, scopes, statements):
+
+		# Loop over every scope
+		for scope in scopes:
+
+			# Skip the first 2 scopes
+			if scope['id'] < 2:
+				continue
+
+			# Get this scope's parent scope
+			parentScope = scopeMap[scope['parent']]
+
+			newScope = parentScope.addChildScope()
+			newScope.setName(scope['name'])
+			newScope.setIdInFile(scope['id'])
+
+			scopeMap[scope['id']] = newScope
+
+		for statement in statements:
+			# Get the statement's scope
+			statementScope = scopeMap[statement.scopeId]
+			statementScope.addVariable(statement)
+
+	## Register the scopes & statements a file got after
+	#  its lazy function bodies were parsed
+	#  @param   self            The object pointer
+	#  @param   wittyFile       The WittyFile
+	#  @param   scopeStart      The id of the first new scope
+	#  @param   statementStart  The index of the first new statement
+	def registerExpansion(self, wittyFile, scopeStart, statementStart):
+
+		scopeMap = self.scopeMaps.get(wittyFile.name)
+
+		# The file hasn't been processed yet, postParse will add everything
+		if not scopeMap or scopeMap[1].parentFile is not wittyFile:
+			return False
+
+		self.attaching = wittyFile.name
+		self.addFileScopes(scopeMap, wittyFile.scopes[scopeStart:], wittyFile.statements[statementStart:])
+		self.attaching = None
+
+		return True
+
+	## Register the type names a variable's statement gives it,
+	#  with @typename in its docblock
+	#  @param   self        The object pointer
+	#  @param   variable    The WittyVariable
+	def registerType(self, variable):
+
+		if variable.typeNames:
+			self.unregisterTypes([variable])
+
+		if not variable.statement or not variable.statement.hasAttribute('typename'):
+			return
+
+		names = []
+
+		# Register it for every name given, or its own name
+		for text in variable.statement.docblock.properties['typename']:
+			names.extend(name for name in reTypeNames.split(text) if name)
+
+		if not names and variable.name:
+			names.append(variable.name)
+
+		variable.typeNames = names
+
+		for name in names:
+			typeVariables = self.typeVariables.setdefault(name, [])
+			typeVariables.append(variable)
+
+			# The variable that was created first is the type
+			if not name in self.types or variable.id < self.types[name].id:
+				self.types[name] = variable
+
+	## Forget the type names of the given variables
+	#  @param   self        The object pointer
+	#  @param   variables   The WittyVariables
+	def unregisterTypes(self, variables):
+
+		for variable in variables:
+
+			if not variable.typeNames:
+				continue
+
+			for name in variable.typeNames:
+				typeVariables = self.typeVariables[name]
+				typeVariables.remove(variable)
+
+				if self.types[name] is not variable:
+					continue
+
+				if typeVariables:
+					self.types[name] = min(typeVariables, key = lambda typeVariable: typeVariable.id)
+				else:
+					del self.types[name]
+					del self.typeVariables[name]
+
+			variable.typeNames = None
+
+	## Get the variable of a type
+	#  @param   self        The object pointer
+	#  @param   name        The name of the type
+	#  @return  The WittyVariable, or None
+	def getType(self, name):
+		return self.types.get(name)
+
+	## Add a variable that was registered in a scope to the symbol index
+	#  @param   self        The object pointer
+	#  @param   variable    The WittyVariable
+	#  @param   scope       The WittyScope it was registered in
+	def registerSymbol(self, variable, scope):
+
+		# Parameters & implied globals have no statement of their own
+		if variable.statement:
+			offset = variable.statement.statement.beginId
+		else:
+			offset = None
+
+		entries = self.symbols.setdefault(variable.name, {})
+
+		entries[variable.id] = {
+			'variable': variable,
+			'scope': scope,
+			'fileName': variable.fileName,
+			'offset': offset
+		}
+
+	## Remove the given variables from the symbol index
+	#  @param   self        The object pointer
+	#  @param   variables   The WittyVariables
+	def unregisterSymbols(self, variables):
+
+		for variable in variables:
+
+			entries = self.symbols.get(variable.name)
+
+			if entries is None or entries.pop(variable.id, None) is None:
+				continue
+
+			if not entries:
+				del self.symbols[variable.name]
+
+	## Get every definition of a name, in the order they were created
+	#  @param   self        The object pointer
+	#  @param   name        The name of the variable
+	#  @return  A list of symbol entry dicts, with the variable,
+	#           its scope, file name & declaration offset
+	def getSymbols(self, name):
+
+		entries = self.symbols.get(name)
+
+		if not entries:
+			return []
+
+		return [entries[variableId] for variableId in sorted(entries)]
+
+	## Get the variable that defined a name first, in any scope
+	#  @param   self        The object pointer
+	#  @param   name        The name of the variable
+	#  @return  The WittyVariable, or None
+	def getSymbol(self, name):
+
+		entries = self.symbols.get(name)
+
+		if not entries:
+			return None
+
+		return entries[min(entries)]['variable']
+
+	## Get the names of the files that define a name
+	#  @param   self        The object pointer
+	#  @param   name        The name of the variable
+	#  @return  A set of file names
+	def getDefiningFiles(self, name):
+		return set(entry['fileName'] for entry in self.symbols.get(name, {}).values() if entry['fileName'])
+
+	## Add a WittyVariable to the given scope without making a fuss
+	#  @param   self        The object pointer
+	#  @param   statement   A WittyStatement
+	#  @param   variable    The variable
+	#  
+	#  @returns newVar
+	def createEmptyVariable(self):
+
+		# Create the new variable
+		newVar = WittyVariable()
+
+		# Set the id
+		newVar.id = self.variableCount
+		self.variableCount += 1
+
+		# It belongs to the file that is being added
+		newVar.fileName = self.attaching
+
+		# Store it among ALL the variables
+		self.variables[newVar.id] = newVar
+
+		if not self.attaching in self.variablesByFilename:
+			self.variablesByFilename[self.attaching] = []
+
+		self.variablesByFilename[self.attaching].append(newVar)
+
+		return newVar
+
+	## Get the innermost scope an offset of a file is in
+	#  @param   self        The object pointer
+	#  @param   filename    The filename the scope should be in
+	#  @param   offset      The offset in the file
+	#  @return  The WittyScope, or None if the file hasn't been added
+	def getScopeAt(self, filename, offset):
+
+		scopeMap = self.scopeMaps.get(filename)
+
+		if not scopeMap:
+			return None
+
+		return scopeMap.get(scopeMap[1].parentFile.getScopeAt(offset))
+
+	## Register the scope
+	def registerScope(self, scope):
+
+		# Get the new id for this scope
+		scope.id = self.scopeCount
+		self.scopeCount += 1
+
+		# And now add this scope to the project
+		self.scopes[scope.id] = scope
+
+		# And add it to the scopes by filename
+		if not scope.parentFile.name in self.scopesByFilename:
+			self.scopesByFilename[scope.parentFile.name] = []
+
+		self.scopesByFilename[scope.parentFile.name].append(scope)
+
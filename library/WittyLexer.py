@@ -0,0 +1,324 @@
+import re
+from bisect import bisect_left, bisect_right
+
+# All the multi-character punctuators, longest first
+punctuators = [
+	'>>>=', '...', '===', '!==', '>>>', '<<=', '>>=',
+	'=>', '==', '!=', '<=', '>=', '&&', '||', '++', '--', '<<', '>>',
+	'+=', '-=', '*=', '/=', '%=', '&=', '|=', '^='
+]
+
+# What every offset in the mask can be
+CODE = 0
+STRING = 1
+COMMENT = 2
+
+# Opening brackets by their closing counterpart
+openers = {')': '(', '}': '{', ']': '['}
+
+stringBytes = bytes([STRING])
+commentBytes = bytes([COMMENT])
+
+# The tokens the mask marks: comments, docblocks & strings
+maskedTokens = r'''
+	  (?P<comment>//[^\n]*)
+	| (?P<docblock>/\*.*?(?:\*/|\Z))
+	| (?P<string>'(?:\\.|[^'\\\n])*'?|"(?:\\.|[^"\\\n])*"?|`(?:\\.|[^`\\])*`?)
+'''
+
+# Match one token (or a piece of whitespace) at a time
+reToken = re.compile(r'''
+	  (?P<newline>\s*\n[ \t\r\f\v]*)
+	| (?P<space>[ \t\r\f\v]+)
+	| (?P<name>(?:[^\W\d]|\$)(?:\w|\$)*)
+	| (?P<open>[(\[{])
+	| (?P<close>[)\]}])
+	| ''' + maskedTokens + r'''
+	| (?P<number>\d[\w.]*|\.\d\w*)
+	| (?P<punct>''' + '|'.join(re.escape(p) for p in punctuators) + r'''|.)
+''', re.S|re.X)
+
+# Match only the tokens the mask marks. No other token can contain
+# the chars they begin with, so they're found at the same offsets
+reMasked = re.compile(maskedTokens, re.S|re.X)
+
+#
+# The WittyLexer runs over a source text once,
+# and turns it into a flat list of tokens.
+# Every token is a (kind, start, end, line) tuple,
+# where kind is one of name, number, string, punct,
+# comment or docblock. Whitespace is not stored.
+#
+# It also keeps the offset every line starts at,
+# so line numbers can be looked up by bisecting,
+# and a mask that tells if an offset is CODE,
+# inside a STRING or inside a COMMENT.
+# Every bracket in the code is paired with its
+# closing bracket, so blocks can be skipped at once.
+#
+class WittyLexer:
+
+	## Constructor
+	#  @param   self     The object pointer
+	#  @param   source   The complete source text
+	#  @param   cancel   The WittyCancelToken, checked on every line
+	def __init__(self, source, cancel = None):
+
+		# The text we tokenized
+		self.source = source
+
+		# The resulting token list
+		self.tokens = []
+
+		# The start offset of every token, for bisecting
+		self.starts = []
+
+		# The start offset of every line
+		self.lineStarts = []
+
+		# One byte per offset: CODE, STRING or COMMENT
+		self.mask = bytearray(len(source))
+
+		# The offset of the closing bracket by the offset of its opener
+		self.pairs = {}
+
+		# Should the parser skip function bodies? (They're parsed when needed)
+		self.skeleton = False
+
+		# The index of every docblock token
+		self.docblockIndexes = []
+
+		# The docblock index by the offset of the code token after it
+		self.docblocks = {}
+
+		self.indexLines()
+		self.tokenize(cancel)
+
+	## Store the offset every line starts at
+	#  @param   self     The object pointer
+	def indexLines(self):
+		self.lineStarts = getLineStarts(self.source)
+
+	## Split the source up into tokens
+	#  @param   self     The object pointer
+	#  @param   cancel   The WittyCancelToken, checked on every line
+	def tokenize(self, cancel = None):
+
+		source = self.source
+		tokens = self.tokens
+		mask = self.mask
+		pairs = self.pairs
+		line = 1
+
+		# The offsets of the currently open brackets
+		stack = []
+
+		for match in reToken.finditer(source):
+
+			kind = match.lastgroup
+
+			if kind == 'space':
+				continue
+
+			start, end = match.span()
+
+			if kind == 'newline':
+				line += source.count('\n', start, end)
+
+				if cancel is not None:
+					cancel.check()
+
+				continue
+
+			if kind == 'open':
+				kind = 'punct'
+				stack.append(start)
+			elif kind == 'close':
+				kind = 'punct'
+
+				if stack:
+					opener = openers[source[start]]
+
+					if source[stack[-1]] == opener:
+						pairs[stack.pop()] = start
+					else:
+						self.closeBracket(stack, opener, start)
+
+			elif kind == 'string':
+				mask[start:end] = stringBytes * (end - start)
+			elif kind == 'comment' or kind == 'docblock':
+				mask[start:end] = commentBytes * (end - start)
+
+				if kind == 'docblock':
+					self.docblockIndexes.append(len(tokens))
+
+			tokens.append((kind, start, end, line))
+
+			# Multiline comments & strings can contain newlines
+			if kind == 'docblock' or kind == 'string':
+				line = self.getLine(end - 1)
+
+		self.starts = [token[1] for token in tokens]
+
+		self.indexDocblocks()
+
+	## Pair a closing bracket with the last matching open bracket
+	#  @param   self     The object pointer
+	#  @param   stack    The stack of open brackets
+	#  @param   opener   The opening char of this closer
+	#  @param   offset   The offset of the closer
+	def closeBracket(self, stack, opener, offset):
+
+		# Brackets that aren't closed don't get a pair
+		for index in range(len(stack) - 2, -1, -1):
+			if self.source[stack[index]] == opener:
+				self.pairs[stack[index]] = offset
+				del stack[index:]
+				return
+
+	## Get the offset of the closing bracket
+	#  @param   self     The object pointer
+	#  @param   offset   The offset of the opening bracket
+	#  @return  The offset of the closer, or -1 if it isn't closed
+	def getCloser(self, offset):
+		return self.pairs.get(offset, -1)
+
+	## Get the index of the first token starting at or after the offset
+	#  @param   self     The object pointer
+	#  @param   offset   The offset in the source
+	def indexAt(self, offset):
+		return bisect_left(self.starts, offset)
+
+	## Get the text of the given token
+	#  @param   self     The object pointer
+	#  @param   index    The index of the token
+	def getText(self, index):
+		token = self.tokens[index]
+		return self.source[token[1]:token[2]]
+
+	## Get the line the given token ends on
+	#  @param   self     The object pointer
+	#  @param   index    The index of the token
+	def getEndLine(self, index):
+		(kind, start, end, line) = self.tokens[index]
+
+		if kind == 'docblock' or kind == 'string':
+			line = self.getLine(end - 1)
+
+		return line
+
+	## Get the line number (starting at 1) of the given offset
+	#  @param   self     The object pointer
+	#  @param   offset   The offset in the source
+	def getLine(self, offset):
+		return bisect_right(self.lineStarts, offset)
+
+	## Get the offset of a line & column
+	#  @param   self     The object pointer
+	#  @param   lineNr   The line number (starting at 1)
+	#  @param   column   The column (starting at 0)
+	def getOffset(self, lineNr, column = 0):
+
+		lineNr = min(max(lineNr, 1), len(self.lineStarts))
+
+		return min(self.lineStarts[lineNr - 1] + column, len(self.source))
+
+	## Get the column (starting at 0) of the given offset
+	#  @param   self     The object pointer
+	#  @param   offset   The offset in the source
+	def getColumn(self, offset):
+		return offset - self.lineStarts[self.getLine(offset) - 1]
+
+	## Count the newlines between two offsets
+	#  @param   self     The object pointer
+	#  @param   start    The offset to start counting at
+	#  @param   end      The offset to stop counting at (exclusive)
+	def countLines(self, start, end):
+		return self.getLine(end) - self.getLine(start)
+
+	## Get the text of the given line, without the newline
+	#  @param   self     The object pointer
+	#  @param   lineNr   The line number (starting at 1)
+	def getLineText(self, lineNr):
+
+		if lineNr < 1 or lineNr > len(self.lineStarts):
+			return False
+
+		start = self.lineStarts[lineNr - 1]
+
+		if lineNr < len(self.lineStarts):
+			end = self.lineStarts[lineNr] - 1
+		else:
+			end = len(self.source)
+
+		return self.source[start:end]
+
+	## Index the docblocks by the offset of the code token they belong to:
+	#  the first token after them that isn't a comment.
+	#  When more docblocks precede a token, the last one is used
+	#  @param   self     The object pointer
+	def indexDocblocks(self):
+
+		tokens = self.tokens
+		tokenCount = len(tokens)
+		docblocks = {}
+
+		for index in self.docblockIndexes:
+
+			next = index + 1
+
+			while next < tokenCount and (tokens[next][0] == 'comment' or tokens[next][0] == 'docblock'):
+				next += 1
+
+			if next < tokenCount:
+				docblocks[tokens[next][1]] = index
+
+		self.docblocks = docblocks
+
+	## Get the index of the previous token that is not a comment
+	#  @param   self     The object pointer
+	#  @param   index    The index to look before
+	def previousCode(self, index):
+
+		index -= 1
+
+		while index > -1:
+			kind = self.tokens[index][0]
+
+			if kind != 'comment' and kind != 'docblock':
+				break
+
+			index -= 1
+
+		return index
+
+## Get the code/string/comment mask of a text,
+#  without tokenizing all of it
+#  @param   text     The text to get the mask of
+def getMask(text):
+
+	mask = bytearray(len(text))
+
+	for match in reMasked.finditer(text):
+		start, end = match.span()
+
+		if match.lastgroup == 'string':
+			mask[start:end] = stringBytes * (end - start)
+		else:
+			mask[start:end] = commentBytes * (end - start)
+
+	return mask
+
+## Get the offset every line of a text starts at
+#  @param   text     The text to index
+def getLineStarts(text):
+
+	lineStarts = [0]
+
+	id = text.find('\n')
+
+	while id > -1:
+		lineStarts.append(id + 1)
+		id = text.find('\n', id + 1)
+
+	return lineStarts
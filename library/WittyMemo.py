@@ -0,0 +1,81 @@
+import threading
+from collections import OrderedDict
+
+#
+# A WittyMemo remembers the results of a function by their key,
+# keeping only the most recently used ones.
+# It counts its hits & misses, so the hit rate can be reported.
+#
+class WittyMemo:
+
+	## Constructor
+	#  @param   self     The object pointer
+	#  @param   name     The name to report the memo under
+	#  @param   maxSize  The maximum amount of entries
+	def __init__(self, name, maxSize):
+
+		self.name = name
+		self.maxSize = maxSize
+		self.entries = OrderedDict()
+
+		self.hits = 0
+		self.misses = 0
+
+		# Both the parse thread & the main thread use it
+		self.lock = threading.Lock()
+
+	## Get a remembered result
+	#  @param   self     The object pointer
+	#  @param   key      The key of the result
+	#  @return  The result, or None
+	def get(self, key):
+
+		with self.lock:
+			result = self.entries.get(key)
+
+			if result is None:
+				self.misses += 1
+			else:
+				self.hits += 1
+				self.entries.move_to_end(key)
+
+		return result
+
+	## Remember a result, forgetting the least recently used one if it's full
+	#  @param   self     The object pointer
+	#  @param   key      The key of the result
+	#  @param   result   The result (not None)
+	def set(self, key, result):
+
+		with self.lock:
+			self.entries[key] = result
+			self.entries.move_to_end(key)
+
+			if len(self.entries) > self.maxSize:
+				self.entries.popitem(last = False)
+
+	## Forget all results & reset the counters
+	#  @param   self     The object pointer
+	def clear(self):
+
+		with self.lock:
+			self.entries.clear()
+			self.hits = 0
+			self.misses = 0
+
+	## Get the share of lookups that were hits
+	#  @param   self     The object pointer
+	#  @return  A float between 0 and 1
+	def getHitRate(self):
+
+		lookups = self.hits + self.misses
+
+		if not lookups:
+			return 0.0
+
+		return self.hits / lookups
+
+	## Get the counters as a readable line
+	#  @param   self     The object pointer
+	def getReport(self):
+		return '%-20s %8d hits %8d misses %6.1f%% hit rate %6d/%d entries' % (self.name, self.hits, self.misses, self.getHitRate() * 100, len(self.entries), self.maxSize)
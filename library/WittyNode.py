@@ -0,0 +1,314 @@
+#
+# The nodes of the parse tree.
+# They use __slots__ instead of a dict per node,
+# which is what most of the memory of a parsed file went to.
+# Optional parts that weren't found are None.
+# Nodes don't store any source text, only ids (offsets
+# in the source), so text is only sliced when it is read.
+#
+class WittyNode:
+
+	__slots__ = ()
+
+	# The slots that are left out of toDict when they're None
+	optional = ()
+
+	## Get the node as a dict, for logging & debugging
+	#  @param   self           The object pointer
+	def toDict(self):
+
+		result = {}
+
+		for cls in type(self).__mro__:
+			for key in getattr(cls, '__slots__', ()):
+
+				value = getattr(self, key)
+
+				if value is None and key in self.optional:
+					continue
+
+				result[key] = toDict(value)
+
+		return result
+
+	## Move this node (and everything in it) to another place
+	#  @param   self           The object pointer
+	#  @param   delta          The amount of ids to move
+	#  @param   lineDelta      The amount of lines to move
+	#  @param   scopeStart     The first scope id that has to be renumbered
+	#  @param   scopeDelta     The amount to renumber those scope ids by
+	def shift(self, delta, lineDelta, scopeStart = None, scopeDelta = 0):
+		self.beginId += delta
+		self.endId += delta
+
+#
+# A statement or an expression, as returned by splitStatements
+#
+class StatementNode(WittyNode):
+
+	__slots__ = ('openType', 'openName', 'scope', 'scopeLevel', 'line', 'newLines',
+		'beginId', 'endId', 'result', 'docblock', 'functions', 'terminated',
+		'scopeId', 'subscopeId')
+
+	optional = ('scopeLevel', 'docblock', 'functions', 'terminated', 'scopeId', 'subscopeId')
+
+	def __init__(self, openType, openName, scope, line, newLines, beginId, endId, result, functions = None, terminated = None):
+		self.openType = openType
+		self.openName = openName
+		self.scope = scope
+		self.scopeLevel = None
+		self.line = line
+		self.newLines = newLines
+		self.beginId = beginId
+		self.endId = endId
+		self.result = result
+		self.docblock = None
+		self.functions = functions
+		self.terminated = terminated
+		self.scopeId = None
+		self.subscopeId = None
+
+	## Get the results as a list (grouped statements have more than one)
+	#  @param   self           The object pointer
+	def getResults(self):
+
+		if isinstance(self.result, list):
+			return self.result
+
+		return [self.result]
+
+	## Get the blocks directly inside this statement
+	#  @param   self           The object pointer
+	def getBlocks(self):
+
+		blocks = []
+
+		if self.openType == 'expression':
+			for function in self.result.functions:
+				blocks += function.getBlocks()
+		else:
+			for result in self.getResults():
+				if isinstance(result, Extraction):
+					blocks += result.getBlocks()
+
+		return blocks
+
+	def shift(self, delta, lineDelta, scopeStart = None, scopeDelta = 0):
+
+		WittyNode.shift(self, delta, lineDelta)
+
+		if self.line is not None:
+			self.line += lineDelta
+
+		if scopeStart is not None:
+			if self.scopeId is not None and self.scopeId >= scopeStart:
+				self.scopeId += scopeDelta
+
+			if self.subscopeId is not None and self.subscopeId >= scopeStart:
+				self.subscopeId += scopeDelta
+
+		# The functions of an expression are in its result, too
+		if isinstance(self.result, list):
+			for result in self.result:
+				result.shift(delta, lineDelta, scopeStart, scopeDelta)
+		elif isinstance(self.result, WittyNode):
+			self.result.shift(delta, lineDelta, scopeStart, scopeDelta)
+
+#
+# The result of an expression
+#
+class ExpressionResult(WittyNode):
+
+	__slots__ = ('assignment', 'textBegin', 'textEnd', 'functions', 'docblock', 'scope')
+
+	def __init__(self, assignment, textBegin, textEnd, functions, docblock, scope):
+		self.assignment = assignment
+		self.textBegin = textBegin
+		self.textEnd = textEnd
+		self.functions = functions
+		self.docblock = docblock
+		self.scope = scope
+
+	## Get the text of the expression
+	#  @param   self           The object pointer
+	#  @param   source         The source text the expression was parsed from
+	def getText(self, source):
+		return source[self.textBegin:self.textEnd].strip()
+
+	## Does the expression have any text?
+	#  @param   self           The object pointer
+	def hasText(self):
+		return self.textBegin < self.textEnd
+
+	def shift(self, delta, lineDelta, scopeStart = None, scopeDelta = 0):
+
+		self.textBegin += delta
+		self.textEnd += delta
+
+		for function in self.functions:
+			function.shift(delta, lineDelta, scopeStart, scopeDelta)
+
+#
+# Everything a statement extracted: its name, paren, block, ...
+# Function expressions are extractions, too
+#
+class Extraction(WittyNode):
+
+	__slots__ = ('beginId', 'docblock', 'name', 'paren', 'block', 'expression', 'extras', 'line', 'scopeId')
+
+	optional = ('name', 'paren', 'block', 'expression', 'extras', 'line', 'scopeId')
+
+	def __init__(self, beginId):
+		self.beginId = beginId
+		self.docblock = False
+		self.name = None
+		self.paren = None
+		self.block = None
+		self.expression = None
+		self.extras = None
+		self.line = None
+		self.scopeId = None
+
+	## Store an extracted extra char
+	#  @param   self           The object pointer
+	#  @param   char           The char that was found
+	#  @param   piece          The Piece of the char
+	def setExtra(self, char, piece):
+
+		if self.extras is None:
+			self.extras = {}
+
+		self.extras[char] = piece
+
+	## See if the given extra char was found
+	#  @param   self           The object pointer
+	#  @param   char           The char to look for
+	def hasExtra(self, char):
+		return self.extras is not None and char in self.extras
+
+	## Get the blocks directly inside this extraction
+	#  @param   self           The object pointer
+	def getBlocks(self):
+
+		blocks = []
+
+		if self.block is not None:
+			blocks.append(self.block)
+
+		if self.expression is not None:
+			blocks += self.expression.getBlocks()
+
+		return blocks
+
+	def shift(self, delta, lineDelta, scopeStart = None, scopeDelta = 0):
+
+		self.beginId += delta
+
+		if self.line is not None:
+			self.line += lineDelta
+
+		if scopeStart is not None and self.scopeId is not None and self.scopeId >= scopeStart:
+			self.scopeId += scopeDelta
+
+		for piece in (self.name, self.paren, self.block, self.expression):
+			if piece is not None:
+				piece.shift(delta, lineDelta, scopeStart, scopeDelta)
+
+		if self.extras:
+			for piece in self.extras.values():
+				piece.shift(delta, lineDelta, scopeStart, scopeDelta)
+
+#
+# A single extracted piece: a name or an extra char.
+# Its end id is inclusive.
+#
+class Piece(WittyNode):
+
+	__slots__ = ('beginId', 'endId', 'docblock')
+
+	def __init__(self, beginId, endId, docblock):
+		self.beginId = beginId
+		self.endId = endId
+		self.docblock = docblock
+
+	## Get the text of the piece
+	#  @param   self           The object pointer
+	#  @param   source         The source text the piece was parsed from
+	def getText(self, source):
+		return source[self.beginId:self.endId+1]
+
+#
+# A paren, from the opening to the closing paren
+#
+class Paren(Piece):
+
+	__slots__ = ()
+
+	## Get the content of the paren, without the parens
+	#  @param   self           The object pointer
+	#  @param   source         The source text the paren was parsed from
+	def getText(self, source):
+		return source[self.beginId+1:self.endId]
+
+#
+# A block and the statements parsed from it.
+# Its end id is exclusive.
+# The body of a function can be lazy: then only
+# its "this.x = ..." statements have been parsed.
+#
+class Block(WittyNode):
+
+	__slots__ = ('parsed', 'beginId', 'endId', 'lazy')
+
+	optional = ('lazy',)
+
+	def __init__(self, parsed, beginId, endId, lazy = None):
+		self.parsed = parsed
+		self.beginId = beginId
+		self.endId = endId
+		self.lazy = lazy
+
+	## Get the content of the block, without the braces
+	#  @param   self           The object pointer
+	#  @param   source         The source text the block was parsed from
+	def getContent(self, source):
+		return source[self.beginId:self.endId]
+
+	def shift(self, delta, lineDelta, scopeStart = None, scopeDelta = 0):
+
+		WittyNode.shift(self, delta, lineDelta)
+
+		if self.lazy is not None:
+			self.lazy.shift(delta, lineDelta, scopeStart, scopeDelta)
+
+		for statement in self.parsed:
+			statement.shift(delta, lineDelta, scopeStart, scopeDelta)
+
+#
+# What is needed to parse a lazy block later on
+#
+class LazyBody(WittyNode):
+
+	__slots__ = ('scopeLevel', 'scopeId', 'docblock')
+
+	def __init__(self, scopeLevel):
+		self.scopeLevel = scopeLevel
+		self.scopeId = None
+		self.docblock = False
+
+	def shift(self, delta, lineDelta, scopeStart = None, scopeDelta = 0):
+		if scopeStart is not None and self.scopeId is not None and self.scopeId >= scopeStart:
+			self.scopeId += scopeDelta
+
+## Turn nodes (in lists or dicts) into dicts
+#  @param   value          The value to convert
+def toDict(value):
+
+	if isinstance(value, WittyNode):
+		return value.toDict()
+	elif isinstance(value, list):
+		return [toDict(entry) for entry in value]
+	elif isinstance(value, dict):
+		return dict((key, toDict(entry)) for (key, entry) in value.items())
+
+	return value
@@ -1,42 +1,142 @@
 import threading, os, sublime, sublime_plugin
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
 from os.path import basename
 import Witty.library.functions as wf
 from Witty.library.WittyFile import WittyFile
+from Witty.library.WittyWorker import createPool, submitFile
+from Witty.library.WittyCancelToken import WittyCancelToken, ParseCancelled
 
 # Debug wrappers
 def warn(message, showStack = True): wf.warn(message, showStack, 3)
 def info(message, showStack = True): wf.info(message, showStack, 3)
 def pr(message, showStack = True): wf.pr(message, showStack, 3)
 
+# The pool of processes all projects parse files in, and its amount of workers
+parsePool = None
+parsePoolSize = 0
+parsePoolLock = threading.Lock()
+
+## Get the pool of processes to parse files in
+#  @return  A ProcessPoolExecutor, or None to parse in the parser thread
+def getParsePool():
+
+	global parsePool, parsePoolSize
+
+	with parsePoolLock:
+
+		if parsePool is not None and parsePoolSize != wf.parseWorkers:
+			parsePool.shutdown(wait = False)
+			parsePool = None
+
+		if parsePool is None and wf.parseWorkers > 0:
+			parsePool = createPool(wf.parseWorkers)
+			parsePoolSize = wf.parseWorkers
+
+		return parsePool
+
+## Forget a pool that broke down, a new one is made for the next parse
+#  @param   pool      The ProcessPoolExecutor
+def resetParsePool(pool):
+
+	global parsePool
+
+	if pool is None:
+		return
+
+	with parsePoolLock:
+		if parsePool is pool:
+			parsePool = None
+
+	pool.shutdown(wait = False)
+
 #
 # WittyParser has to take the original text files
 # and convert them to something we can use later on
 #
 class WittyParser(threading.Thread):
 
-	def __init__(self, project, originFile):
+	def __init__(self, project, originFile, cancel = None):
 		self.project = project
 		self.originFile = originFile
+
+		# The token that tells this parse a newer one has started
+		self.cancel = cancel or WittyCancelToken(project.generation)
+
+		# The parsed files, only stored in the intel when the parse is complete
+		self.results = {}
+
+		# The pool of processes to parse files in, and the Futures of the files sent to it
+		self.pool = None
+		self.pending = {}
+
 		threading.Thread.__init__(self)
 
 	# Function that begins the thread
 	def run(self):
-		
+
+		try:
+			self.parse()
+		except ParseCancelled:
+			info('Parse generation ' + str(self.cancel.generation) + ' was cancelled')
+
+	## Parse all the files & process them
+	#  @param   self      The object pointer
+	def parse(self):
+
+		self.pool = getParsePool()
+
 		# Loop through every folder in the project
 		for folder, data in self.project.folders.items():
 			# Get all the javascript files in the project
 			jsFiles = self.getJavascriptFiles(folder)
 			for fileName in jsFiles:
+				self.cancel.check()
 				self.startFileParse(fileName)
 
-		sublime.status_message('Witty has finished parsing')
+		self.finishFileParses()
+
+		with self.project.parseLock:
+
+			# Throw the results away if a newer parse has started
+			self.cancel.check()
+
+			if self.cancel.generation != self.project.generation:
+				return
+
+			intelNode = self.project.intelNode
+			intelBrowser = self.project.intelBrowser
 
-		# Fire the postParse function for both languages
-		self.project.intelNode.postParse()
-		self.project.intelBrowser.postParse()
+			# The names of the files that changed, by language
+			changed = {intelNode.language: [], intelBrowser.language: []}
+
+			for fileName, fileResult in self.results.items():
+
+				# The saved file only takes over its previous version now the parse is kept
+				fileResult.commitReparse()
+
+				if fileResult.language == 'nodejs':
+					(intel, other) = (intelNode, intelBrowser)
+				else:
+					(intel, other) = (intelBrowser, intelNode)
 
-		# Store the data on disk
-		self.project.storeOnDisk()
+				intel.files[fileName] = fileResult
+				changed[intel.language].append(fileName)
+
+				# A file that changed language has to be removed from the other intel
+				if fileName in other.files:
+					del other.files[fileName]
+					changed[other.language].append(fileName)
+
+			sublime.status_message('Witty has finished parsing')
+
+			# Fire the postParse function for both languages,
+			# which only rebuilds the changed files
+			intelNode.postParse(self.cancel, changed[intelNode.language])
+			intelBrowser.postParse(self.cancel, changed[intelBrowser.language])
+
+			# Store the data on disk
+			self.project.storeOnDisk()
 
 	# Get all javascript files (ending with .js, not containing .min.)
 	def getJavascriptFiles(self, dir_name, *args):
@@ -74,12 +174,72 @@ class WittyParser(threading.Thread):
 			sublime.status_message('Witty is parsing: ' + fileName)
 			info('Parsing file "' + fileName + '"')
 
-			fileResult = WittyFile(self.project, fileName)
-
-			# If we got a new WittyFile instance, store it in the project
+			# Reuse the unchanged statements of the file we just saved
+			if fileName == self.originFile:
+				previous = self.project.getFileData(fileName)
+			else:
+				previous = None
+
+			# Let a worker process parse it, keeping its place among the results
+			if self.pool is not None and previous is None:
+				try:
+					self.pending[fileName] = submitFile(self.pool, self.project, fileName)
+					self.results[fileName] = None
+					return True
+				except (OSError, RuntimeError) as error:
+					# BrokenProcessPool is a RuntimeError too
+					warn('Unable to start the parse processes: ' + str(error))
+					resetParsePool(self.pool)
+					self.pool = None
+
+			fileResult = WittyFile(self.project, fileName, previous = previous, cancel = self.cancel)
+
+			# If we got a new WittyFile instance, store it when the parse is done
 			if fileResult:
+				self.results[fileName] = fileResult
 
-				if fileResult.language == 'nodejs':
-					self.project.intelNode.files[fileName] = fileResult
+	## Wait for the files that are parsed in worker processes
+	#  & create their WittyFiles
+	#  @param   self      The object pointer
+	def finishFileParses(self):
+
+		try:
+			for fileName, future in self.pending.items():
+
+				result = self.waitForResult(future)
+
+				if result is None:
+					# The worker failed, so try it in this thread
+					fileResult = WittyFile(self.project, fileName, cancel = self.cancel)
 				else:
-					self.project.intelBrowser.files[fileName] = fileResult
+					fileResult = WittyFile(self.project, fileName, result = result)
+
+				self.results[fileName] = fileResult
+		finally:
+			# Don't keep the workers busy with a cancelled parse
+			for future in self.pending.values():
+				future.cancel()
+
+			self.pending = {}
+
+	## Wait for the result of a worker process,
+	#  stopping when the parse is cancelled
+	#  @param   self      The object pointer
+	#  @param   future    The Future of the file
+	#  @return  The result dict, or None if the worker failed
+	def waitForResult(self, future):
+
+		while True:
+			self.cancel.check()
+
+			try:
+				return future.result(0.1)
+			except concurrent.futures.TimeoutError:
+				continue
+			except BrokenProcessPool as error:
+				warn('The parse processes stopped: ' + str(error))
+				resetParsePool(self.pool)
+				return None
+			except Exception as error:
+				warn('Unable to parse in a worker process: ' + str(error))
+				return None
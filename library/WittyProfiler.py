@@ -0,0 +1,286 @@
+import sys, time, json, types, threading
+
+#
+# The WittyProfiler counts, per file, how often every
+# statement type (and expressions) is extracted, how long
+# that takes, how many chars it consumes and how often
+# the extraction had to bail out of an infinite loop.
+#
+# It does nothing until it is enabled: the parser only checks
+# the enabled attribute before timing anything.
+#
+# It also remembers how many bytes every file retained
+# before & after it was compacted.
+#
+class WittyProfiler:
+
+	# The names of the counters, in the order they're stored
+	fields = ('calls', 'seconds', 'selfSeconds', 'chars', 'bailouts')
+
+	## Constructor
+	#  @param   self     The object pointer
+	def __init__(self):
+
+		self.enabled = False
+
+		# The counters as {fileName: {name: [calls, seconds, selfSeconds, chars, bailouts]}}
+		self.files = {}
+
+		# The retained bytes as {fileName: (before, after)}
+		self.memory = {}
+
+		self.lock = threading.Lock()
+
+		# The file & timer stack of every thread
+		self.local = threading.local()
+
+	## Enable or disable profiling
+	#  @param   self     The object pointer
+	#  @param   enabled  True to enable
+	def enable(self, enabled = True):
+		self.enabled = enabled
+
+	## Remove all the counters
+	#  @param   self     The object pointer
+	def reset(self):
+
+		with self.lock:
+			self.files = {}
+			self.memory = {}
+
+	## Set the file the current thread is parsing
+	#  @param   self     The object pointer
+	#  @param   fileName The name of the file, or None
+	def setFile(self, fileName):
+		self.local.fileName = fileName
+
+	## Start timing something
+	#  @param   self     The object pointer
+	#  @return  The start time, to pass to stop()
+	def start(self):
+
+		stack = getattr(self.local, 'stack', None)
+
+		if stack is None:
+			stack = self.local.stack = []
+
+		# The time spent in nested extractions
+		stack.append(0.0)
+
+		return time.perf_counter()
+
+	## Stop timing something & count it
+	#  @param   self      The object pointer
+	#  @param   name      The statement name
+	#  @param   startTime The time start() returned
+	#  @param   chars     The amount of chars that were consumed
+	def stop(self, name, startTime, chars):
+
+		seconds = time.perf_counter() - startTime
+		stack = self.local.stack
+		nestedSeconds = stack.pop()
+
+		if stack:
+			stack[-1] += seconds
+
+		self.add(name, 1, seconds, seconds - nestedSeconds, chars, 0)
+
+	## Count an extraction that bailed out
+	#  @param   self     The object pointer
+	#  @param   name     The statement name
+	def bailout(self, name):
+		self.add(name, 0, 0.0, 0.0, 0, 1)
+
+	## Add to the counters of the current file
+	#  @param   self     The object pointer
+	#  @param   name     The statement name
+	def add(self, name, calls, seconds, selfSeconds, chars, bailouts):
+
+		fileName = getattr(self.local, 'fileName', None) or '(no file)'
+
+		with self.lock:
+			counters = self.files.setdefault(fileName, {})
+			counter = counters.get(name)
+
+			if counter is None:
+				counter = counters[name] = [0, 0.0, 0.0, 0, 0]
+
+			counter[0] += calls
+			counter[1] += seconds
+			counter[2] += selfSeconds
+			counter[3] += chars
+			counter[4] += bailouts
+
+	## Remove the counters of a file & return them,
+	#  so a worker process can send them to the parser thread
+	#  @param   self     The object pointer
+	#  @param   fileName The name of the file
+	#  @return  The counter lists by statement name, or None
+	def takeFile(self, fileName):
+
+		with self.lock:
+			return self.files.pop(fileName, None)
+
+	## Add the counters of a file another process took
+	#  @param   self     The object pointer
+	#  @param   fileName The name of the file
+	#  @param   counters The counter lists by statement name
+	def addFile(self, fileName, counters):
+
+		with self.lock:
+			fileCounters = self.files.setdefault(fileName, {})
+
+			for name, counter in counters.items():
+				total = fileCounters.setdefault(name, [0, 0.0, 0.0, 0, 0])
+
+				for index, value in enumerate(counter):
+					total[index] += value
+
+	## Remember the bytes a file retained before & after compacting it
+	#  @param   self     The object pointer
+	#  @param   fileName The name of the file
+	#  @param   before   The bytes before compacting
+	#  @param   after    The bytes after compacting
+	def addMemory(self, fileName, before, after):
+
+		with self.lock:
+			self.memory[fileName] = (before, after)
+
+	## Get the counters of all files added up
+	#  @param   self     The object pointer
+	#  @return  A dict of counter dicts, by statement name
+	def getTotals(self):
+
+		totals = {}
+
+		with self.lock:
+			for counters in self.files.values():
+				for name, counter in counters.items():
+					total = totals.setdefault(name, [0, 0.0, 0.0, 0, 0])
+
+					for index, value in enumerate(counter):
+						total[index] += value
+
+		return dict((name, self.toCounter(total)) for name, total in totals.items())
+
+	## Turn a counter list into a dict
+	#  @param   self     The object pointer
+	#  @param   counter  The counter list
+	def toCounter(self, counter):
+		return dict(zip(self.fields, counter))
+
+	## Get all the counters as a dict
+	#  @param   self     The object pointer
+	def toDict(self):
+
+		files = {}
+
+		with self.lock:
+			for fileName, counters in self.files.items():
+				files[fileName] = dict((name, self.toCounter(counter)) for name, counter in counters.items())
+
+			memory = dict((fileName, {'before': before, 'after': after}) for fileName, (before, after) in self.memory.items())
+
+		return {'totals': self.getTotals(), 'files': files, 'memory': memory}
+
+	## Write all the counters to a JSON file
+	#  @param   self     The object pointer
+	#  @param   path     The path of the file
+	def dump(self, path):
+
+		dumpFile = open(path, 'w')
+
+		try:
+			json.dump(self.toDict(), dumpFile, indent = 1, sort_keys = True)
+		finally:
+			dumpFile.close()
+
+	## Get the totals as a readable table, slowest first
+	#  @param   self     The object pointer
+	def getReport(self):
+
+		totals = self.getTotals()
+		lines = ['%-12s %8s %10s %10s %12s %9s' % ('statement', 'calls', 'seconds', 'self', 'chars', 'bailouts')]
+
+		for name in sorted(totals, key = lambda name: -totals[name]['selfSeconds']):
+			counter = totals[name]
+			lines.append('%-12s %8d %10.3f %10.3f %12d %9d' % (name, counter['calls'], counter['seconds'], counter['selfSeconds'], counter['chars'], counter['bailouts']))
+
+		lines.append('')
+		lines.append('Profiled files: ' + str(len(self.files)))
+
+		return '\n'.join(lines)
+
+	## Get the retained bytes of every file as a readable table, largest first
+	#  @param   self     The object pointer
+	def getMemoryReport(self):
+
+		with self.lock:
+			memory = dict(self.memory)
+
+		lines = ['%12s %12s %6s  %s' % ('before', 'after', 'freed', 'file')]
+		totalBefore = 0
+		totalAfter = 0
+
+		for fileName in sorted(memory, key = lambda fileName: -memory[fileName][0]):
+			(before, after) = memory[fileName]
+			totalBefore += before
+			totalAfter += after
+			lines.append('%12d %12d %5.1f%%  %s' % (before, after, getShare(before - after, before), fileName))
+
+		lines.append('%12d %12d %5.1f%%  %s' % (totalBefore, totalAfter, getShare(totalBefore - totalAfter, totalBefore), '(total bytes)'))
+
+		return '\n'.join(lines)
+
+## Get a part of a total as a percentage
+#  @param   part     The part
+#  @param   total    The total
+def getShare(part, total):
+
+	if not total:
+		return 0.0
+
+	return part * 100.0 / total
+
+# Objects that are shared by everything, so they're never counted
+sharedTypes = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+## Get the bytes an object & everything it refers to take up
+#  @param   obj      The object to measure
+#  @param   exclude  The ids of objects not to count or look into
+#  @return  The amount of bytes
+def getRetainedSize(obj, exclude = ()):
+
+	seen = set(exclude)
+	stack = [obj]
+	size = 0
+
+	while stack:
+		obj = stack.pop()
+
+		if id(obj) in seen or isinstance(obj, sharedTypes):
+			continue
+
+		seen.add(id(obj))
+		size += sys.getsizeof(obj)
+
+		if isinstance(obj, dict):
+			stack.extend(obj.keys())
+			stack.extend(obj.values())
+		elif isinstance(obj, (list, tuple, set, frozenset)):
+			stack.extend(obj)
+		else:
+			attributes = getattr(obj, '__dict__', None)
+
+			if attributes is not None:
+				stack.append(attributes)
+
+			for cls in type(obj).__mro__:
+				for slot in getattr(cls, '__slots__', ()):
+					if hasattr(obj, slot):
+						stack.append(getattr(obj, slot))
+
+	return size
+
+# The profiler the parser reports to
+profiler = WittyProfiler()
@@ -1,10 +1,10 @@
-import pickle, sublime, sublime_plugin
+import pickle, threading, sublime, sublime_plugin
 import Witty.library.functions as wf
-from Witty.library.WittyScope import WittyScope
-from Witty.library.WittyScope import WittyRoot
 from Witty.library.WittyParser import WittyParser
-from Witty.library.WittyVariable import WittyVariable
 from Witty.library.WittyFile import WittyFile
+from Witty.library.WittyIntel import Intel
+from Witty.library.WittyCache import WittyCache
+from Witty.library.WittyCancelToken import WittyCancelToken
 import os
 
 # Debug wrappers
@@ -52,6 +52,15 @@ class WittyProject:
 		# The pickle filename
 		self.pickleFileName = '/dev/shm/wittypickle-' + self.id
 
+		# The cache of parsed files (its directory is shared by all projects)
+		self.cache = WittyCache(os.path.join(sublime.cache_path(), 'Witty'), wf.cacheSize)
+
+		# The number of the newest parse, older ones are thrown away
+		self.generation = 0
+
+		# Only one parse at a time can change the intel
+		self.parseLock = threading.Lock()
+
 		# The Single Point Of Contact to get data
 		self.intelNode = None
 		self.intelBrowser = None
@@ -59,6 +68,24 @@ class WittyProject:
 		# Init the intel
 		self._initIntel()
 
+	## Get the state to pickle, the intel & files refer to the project.
+	#  Locks can't be pickled, so the parse lock is left out
+	#  @param   self        The object pointer
+	def __getstate__(self):
+
+		state = self.__dict__.copy()
+		del state['parseLock']
+
+		return state
+
+	## Restore a pickled project, with a new parse lock
+	#  @param   self        The object pointer
+	#  @param   state       The state __getstate__ returned
+	def __setstate__(self, state):
+
+		self.__dict__.update(state)
+		self.parseLock = threading.Lock()
+
 	## Get the language type of a file
 	def getFileLanguage(self, filepath):
 
@@ -154,14 +181,17 @@ class WittyProject:
 	# Begin parsing files
 	def parseFiles(self, savedFileName = ''):
 		
-		# If a thread is already running: stop it
+		# If a thread is already running: cancel it,
+		# it stops at the next statement it parses
 		if self.id in parserThreads and parserThreads[self.id]:
-			print('Killing running thread')
-			parserThreads[self.id]._stop()
+			info('Cancelling running parse')
+			parserThreads[self.id].cancel.cancel()
+
+		self.generation += 1
 
 		info('Start parsing "' + savedFileName + '"')
 
-		parserThreads[self.id] = WittyParser(self, savedFileName)
+		parserThreads[self.id] = WittyParser(self, savedFileName, WittyCancelToken(self.generation))
 		parserThreads[self.id].start()
 
 	# Is data already available for this file?
@@ -185,14 +215,48 @@ class WittyProject:
 
 		return False
 
+	# Get the WittyFile of an already parsed file, or None
+	def getFileData(self, fileName):
+
+		for thisIntel in [self.intelNode, self.intelBrowser]:
+			if thisIntel and fileName in thisIntel.files:
+				return thisIntel.files[fileName]
+
+		return None
+
+	## Parse the lazy function bodies at the given position of a file
+	#  @param   self        The object pointer
+	#  @param   fileName    The path to the file
+	#  @param   lineNr      The line number (starting at 1)
+	#  @param   column      The column (starting at 0)
+	def parseBodiesAt(self, fileName, lineNr, column):
+
+		wittyFile = self.getFileData(fileName)
+
+		if not wittyFile or not wittyFile.original:
+			return False
+
+		# While the parser thread is changing the intel, the bodies
+		# stay unparsed for now (the next completion can try again)
+		if not self.parseLock.acquire(False):
+			return False
+
+		try:
+			return wittyFile.parseBodiesAt(wittyFile.getOffset(lineNr, column))
+		finally:
+			self.parseLock.release()
+
 	# Store all the data on disk
 	def storeOnDisk(self):
 
 		if self.pickleFileName and ((self.intelNode and len(self.intelNode.files)) or (self.intelBrowser and len(self.intelBrowser.files))):
 			# Pickle data
 			pickleFile = open(self.pickleFileName, 'wb')
-			pickle.dump({'nodejs': self.intelNode, 'browser': self.intelBrowser}, pickleFile)
-			pickleFile.close()
+
+			try:
+				pickle.dump({'nodejs': self.intelNode, 'browser': self.intelBrowser}, pickleFile)
+			finally:
+				pickleFile.close()
 
 	# Query for completions
 	def queryForCompletions(self, view, prefix, locations):
@@ -211,6 +275,9 @@ class WittyProject:
 		point = region.begin()
 		(row,col) = view.rowcol(point)
 
+		# Parse the function bodies the cursor is in, if they were skipped
+		self.parseBodiesAt(currentFileName, row + 1, col)
+
 		# Get the lines from the beginning of the page until the cursor
 		to_cursor_lines = view.lines(sublime.Region(0, point))
 
@@ -219,42 +286,6 @@ class WittyProject:
 		for l in to_cursor_lines:
 			lines.append(wf.removeComment(view.substr(l).strip()))
 
-		stack = []
-		oBraces = 0
-		cBraces = 0
-		mem = {}
-
-		# Get the last open function line
-		for l in lines:
-			oBraces += l.count('{')
-			cBraces += l.count('}')
-
-			newDif = oBraces-cBraces
-
-			try:
-				if stack[0]['difference'] > newDif:
-					
-					if not oBraces in mem:
-						try:
-							del stack[0]
-						except IndexError:
-							pass
-
-					mem[oBraces] = True
-			except IndexError:
-				pass
-
-			if wf.isFunctionDeclaration(l):
-				body = l.split('function', 1)[1]
-				
-				if body.count('{') > body.count('}'):
-					stack.insert(0, {'line': l, 'open': oBraces, 'closed': cBraces, 'difference': oBraces-cBraces})
-
-		try:
-			function_scope = stack[0]['line']
-		except IndexError:
-			function_scope = current_file
-
 		# Get the current line
 		full_line = view.substr(view.line(region))
 
@@ -277,29 +308,30 @@ class WittyProject:
 		else:
 			lastStat = stats[len(stats)-1]
 
-		scope = self.getScope(current_file, function_scope)
+		# Get the innermost function scope the cursor is in
+		scope = self.getScopeAt(currentFileName, row + 1, col)
 
 		if scope:
 
 			getScopeVars = True
 			normalized = False
 
-			if lastStat and lastStat['openName'] == 'var':
-				lastExpr = lastStat['result'][len(lastStat['result'])-1]
+			if lastStat and lastStat.openName == 'var':
+				lastExpr = lastStat.result[len(lastStat.result)-1]
 				
-				if 'expression' in lastExpr:
-					expr = lastExpr['expression']['result']['text']
+				if lastExpr.expression is not None:
+					expr = lastExpr.expression.result.getText(text)
 
 					# Only get more info if the last expression hasn't been terminated!
-					if not lastExpr['expression']['terminated']:
+					if not lastExpr.expression.terminated:
 						try:
 							normalized = wf.tokenizeExpression(expr)
 							getScopeVars = False
 						except KeyError:
 							pass
 
-			elif lastStat and lastStat['openName'] == 'expression':
-				expr = lastStat['result']['text']
+			elif lastStat and lastStat.openName == 'expression':
+				expr = lastStat.result.getText(text)
 
 				if expr:
 					normalized = wf.tokenizeExpression(expr)
@@ -393,7 +425,7 @@ class WittyProject:
 			return (completions, sublime.INHIBIT_WORD_COMPLETIONS)
 		else:
 
-			info('Scope "' + function_scope + '" in file ' + current_file + ' was not found')
+			info('No scope was found at line ' + str(row + 1) + ' in file ' + current_file)
 
 			wittyOnly = True
 
@@ -460,201 +492,32 @@ class WittyProject:
 
 		return data
 
-	## Get the scope from a specific file
-	def getScope(self, filename, scopename):
-
-		fileLanguage = self.getFileLanguage(filename)
-
-		if fileLanguage == 'nodejs':
-			intel = self.intelNode
-		elif fileLanguage == 'browser':
-			intel = self.intelBrowser
-		else:
-			intel = self.intelNode
-
-		pr('Looking for scope "' + scopename + '" in file ' + filename)
-		return intel.getScope(filename, scopename)
-
-class Intel:
-
-	def __init__(self, project, language):
-
-		# The parent project
-		self.project = project
-
-		# Create the root scope
-		self.root = WittyRoot(self)
-
-		# All the types by name » variable
-		self.types = {}
-
-		# Files
-		self.files = {}
-
-		# The language
-		self.language = language
-
-		self.reset()
-
-	## Reset all the class variables
-	def reset(self):
-
-		# The scopes
-		self.scopes = []
-
-		# The scopes by filename
-		self.scopesByFilename = {}
-
-		# All the variables, no matter the scope
-		self.variables = []
-
-		# Globals
-		self.globals = []
-
-		# Also reset root (it'll add itself to the scopes)
-		self.root.resetIntel()
-
-	# Called after every parse, so every save
-	def postParse(self):
-
-		# Reset everything
-		# @todo: we could make it only reset the currently saved file,
-		# but I haven't noticed any speed problems yet, so I'll do it later
-		self.reset()
-		info('Witty data has been reset, processing data ...')
-
-		# Begin the real work
-		for filename, wittyFile in self.files.items():
-
-			pr('Processing ' + filename)
-
-			# Prepare all the scopes
-			# Here, we assume the file itself is also a scope
-			# That's kind-of true for node.js, but false for javascript
-			fileScope = self.root.addChildScope(wittyFile)
-			fileScope.setName(filename)
-			fileScope.makeFileScope(True)
-
-			# Make a temporary map of the scopes inside this file
-			scopeMap = {1: fileScope}
-
-			# Loop over every scope
-			for scope in wittyFile.scopes:
-
-				# Skip the first 2 scopes
-				if scope['id'] < 2:
-					continue
-
-				# Get this scope's parent scope
-				parentScope = scopeMap[scope['parent']]
-				
-				newScope = parentScope.addChildScope()
-				newScope.setName(scope['name'])
-				newScope.setIdInFile(scope['id'])
-
-				scopeMap[scope['id']] = newScope
-
-			#for statement in wittyFile.statements:
-			#	pr('Adding statement ' + statement.typeName + ' from line ' + str(statement.lineNr) + ' to scope ' + str(statement.scopeId))
-
-			for statement in wittyFile.statements:
-				# Get the statement's scope
-				statementScope = scopeMap[statement.scopeId]
-				statementScope.addVariable(statement)
-
-			for scope in wittyFile.scopes:
-				if scope['id'] == 0:
-					targetScope = self.root
-				else:
-					targetScope = scopeMap[scope['id']]
-
-				for name, varinfo in scope['variables'].items():
-					targetScope.addVariable(False, varinfo)
-
-				wf.log(scope, 'witty-' + self.language + '-simplescopes', True)
-
-			for i, scope in scopeMap.items():
-				wf.log(scope, 'witty-' + self.language + '-WTScopes')
-
-			self.registerTypes()
-
-		# for name, file in self.files.items():
-		# 	wf.log('\n\nFILENAME: "' + name + '"', 'witty-final-variables')
-		# 	wf.log('>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>\n'*3, 'witty-final-variables')
-			
-		for scope in self.scopes:
-			wf.log('\n\n>>\nScope: ' + str(scope.name), 'witty-' + self.language + '-final-variables')
-			wf.log((('>>>'*20) + '\n')*2, 'witty-' + self.language + '-final-variables')
-			wf.log(scope.variables, 'witty-' + self.language + '-final-variables', True)
-
-
-
-	## Register all the types
-	#  @param   self        The object pointer
-	def registerTypes(self):
-
-		# Reset the types
-		self.types = {}
-
-		# Register all the new types
-		for variable in self.variables:
-
-			if variable.statement and variable.statement.hasAttribute('typename'):
-
-				# Register them for every name given
-				for name in variable.statement.name:
-					# Only add not-already-existing types
-					if not name in self.types:
-						# @todo: apparently names like 'age) {' are still captured!
-						# That should be fixed (but not here)
-						self.types[name] = variable
-
-	## Add a WittyVariable to the given scope without making a fuss
+	## Get the innermost scope at a position of a file
 	#  @param   self        The object pointer
-	#  @param   statement   A WittyStatement
-	#  @param   variable    The variable
-	#  
-	#  @returns newVar
-	def createEmptyVariable(self):
-
-		# Create the new variable
-		newVar = WittyVariable()
+	#  @param   fileName    The path to the file
+	#  @param   lineNr      The line number (starting at 1)
+	#  @param   column      The column (starting at 0)
+	#  @return  The WittyScope, or None
+	def getScopeAt(self, fileName, lineNr, column):
 
-		# Set the id
-		newVar.id = len(self.variables)
+		wittyFile = self.getFileData(fileName)
 
-		# Store it among ALL the variables
-		self.variables.append(newVar)
+		if not wittyFile:
+			return None
 
-		return newVar
+		return wittyFile.intel.getScopeAt(fileName, wittyFile.getOffset(lineNr, column))
 
-	## Get the scope from a specific file
+	## Get every definition of a name in the project, in both languages
 	#  @param   self        The object pointer
-	#  @param   filename    The filename the scope should be in
-	#  @param   scopename   The 'name' of the scope (fileline)
-	def getScope(self, filename, scopename):
-		if not filename in self.scopesByFilename:
-			wf.warn('File "' + filename + '" was not found while looking for scope "' + scopename + '"')
-			return False
-		else:
-			pr('Filename scopes:')
-			for scope in self.scopesByFilename[filename]:
-				pr(scope.__dict__)
-				if scope.name == scopename:
-					return scope
-
-	## Register the scope
-	def registerScope(self, scope):
-
-		# Get the new id for this scope
-		scope.id = len(self.scopes)
-
-		# And now add this scope to the project
-		self.scopes.append(scope)
+	#  @param   name        The name of the variable
+	#  @return  A list of symbol entry dicts, with the variable,
+	#           its scope, file name & declaration offset
+	def getDefinitions(self, name):
 
-		# And add it to the scopes by filename
-		if not scope.parentFile.name in self.scopesByFilename:
-			self.scopesByFilename[scope.parentFile.name] = []
+		result = []
 
-		self.scopesByFilename[scope.parentFile.name].append(scope)
+		for thisIntel in [self.intelNode, self.intelBrowser]:
+			if thisIntel:
+				result.extend(thisIntel.getSymbols(name))
 
+		return result
@@ -195,6 +195,42 @@ class WittyScope:
 		# Register it by its name
 		self.variables[variable.name] = variable
 
+		# And in the project-wide index
+		self.intel.registerSymbol(variable, self)
+
+	## Forget the given variables if they're registered inside this scope,
+	#  bringing back the ones they replaced
+	#  @param   self        The object pointer
+	#  @param   variables   The WittyVariables
+	def unregisterVariables(self, variables):
+
+		names = set()
+
+		for variable in variables:
+			if self.variablesById.get(variable.id) is variable:
+				del self.variablesById[variable.id]
+				names.add(variable.name)
+
+		if not names:
+			return
+
+		# The last registered variable of a name is the one that's used
+		latest = {}
+
+		for variable in self.variablesById.values():
+			if variable.name in names:
+				latest[variable.name] = variable
+
+		for name in names:
+			current = self.variables.get(name)
+
+			if current is not None and self.variablesById.get(current.id) is current:
+				continue
+
+			if name in latest:
+				self.variables[name] = latest[name]
+			else:
+				self.variables.pop(name, None)
 
 	## Add variables to this scope
 	#  @param   self        The object pointer
@@ -234,6 +270,7 @@ class WittyScope:
 
 			# If it's an existing var, add an appearance
 			if existingVar:
+				self.intel.useVariable(existingVar)
 				existingVar.addAppearance(statement, self)
 				# Add possible properties
 				existingVar.touchProperties(variable['properties'], statement)
@@ -262,7 +299,7 @@ class WittyScope:
 		# Set the scope
 		newVar.setScope(useScope)
 
-		newVar.setBase(variable)
+		newVar.setBase(variable, statement)
 
 		# Set the options
 		if 'options' in variable:
@@ -276,6 +313,9 @@ class WittyScope:
 		# Add it to the correct scope
 		useScope.registerVariable(newVar)
 
+		# Its statement could name a type
+		self.intel.registerType(newVar)
+
 		# Add possible properties
 		newVar.touchProperties(variable['properties'])
 
@@ -301,12 +341,12 @@ class WittyRoot(WittyScope):
 		# Set the name
 		self.name = '::ROOT::'
 
-		# Init
-		self.init()
-
 		# Reset the project
 		self.resetIntel()
 
 	def resetIntel(self):
-		self.intel.scopes = []
-		self.intel.scopes.append(self)
\ No newline at end of file
+
+		# Forget the variables of the files, they'll be added again
+		self.init()
+
+		self.intel.scopes = {self.id: self}
\ No newline at end of file
@@ -1,5 +1,6 @@
 import Witty.library.functions as wf
-from Witty.library.Docblock import Docblock
+from Witty.library.Docblock import getDocblock
+from Witty.library.WittyNode import StatementNode
 
 # Debug wrappers
 def warn(message, showStack = True): wf.warn(message, showStack, 3)
@@ -16,7 +17,7 @@ class WittyStatement:
 		self.parentfile = parentfile
 
 		# The original line nr
-		self.lineNr = obj['line']
+		self.lineNr = obj.line
 
 		# The parent statement (the block this is a part of)
 		#self.parent = parentStatement
@@ -25,26 +26,20 @@ class WittyStatement:
 		self.filename = parentfile.fileName
 
 		# The docblock of this statement
-		self.docblock = Docblock(obj['docblock'])
+		self.docblock = getDocblock(obj.docblock)
 
 		# The type of this statement (assignment or expression)
-		self.type = obj['openType']
+		self.type = obj.openType
 
 		# The type name
-		self.typeName = obj['openName']
+		self.typeName = obj.openName
 
 		# The scope id
-		self.scopeId = obj['scopeId']
+		self.scopeId = obj.scopeId
 
 		# The scope
 		self.scope = parentfile.scopes[self.scopeId]
 
-		# The possible params (function)
-		self.params = {}
-
-		# The possible properties
-		self.properties = {}
-
 		# Modified variables
 		self.variables = {}
 
@@ -80,6 +75,33 @@ class WittyStatement:
 		#for pName, pValue in self.params.items():
 		#	thisScope['variables'].append(pName)
 
+	## Move this statement over to a reparsed file
+	#  @param   self           The object pointer
+	#  @param   parentfile     The new WittyFile
+	#  @param   lineDelta      The amount of lines the statement moved
+	#  @param   scopeStart     The first scope id that has been renumbered
+	#  @param   scopeDelta     The amount those scope ids were renumbered by
+	def shift(self, parentfile, lineDelta, scopeStart, scopeDelta):
+
+		self.parentfile = parentfile
+		self.lineNr += lineDelta
+
+		if self.scopeId >= scopeStart:
+			self.scopeId += scopeDelta
+
+		self.scope = parentfile.scopes[self.scopeId]
+
+		# Scope statements aren't part of the parsed statements, so move them here
+		if self.type == 'scope':
+			self.statement.line = self.lineNr
+			self.statement.scopeId = self.scopeId
+
+	## Get the text of a node of this statement
+	#  @param   self           The object pointer
+	#  @param   node           A parse tree node with a getText method
+	def getText(self, node):
+		return node.getText(self.parentfile.original)
+
 	## Get a statement docblock attribute
 	def getAttribute(self, attributeName):
 		return self.docblock.getAttribute(attributeName)
@@ -153,11 +175,11 @@ class WittyStatement:
 
 	def processStatement(self):
 
-		result = self.statement['result'][0]
+		result = self.statement.result[0]
 
 		# Recursively go through all the statements in this file
-		if 'block' in result:
-			for stat in result['block']['parsed']:
+		if result.block is not None:
+			for stat in result.block.parsed:
 				WittyStatement(self.parentfile, stat)
 
 		
@@ -168,19 +190,19 @@ class WittyStatement:
 		# they're not assigned to the variable if that is needed!
 
 		# If it's not an assignment, just ignore it
-		if not self.statement['result']['assignment']:
+		if not self.statement.result.assignment:
 
 			# If there are functions assigned ...
 			# @todo: This would still declare the function if it had a name,
 			# which function expressions don't do!
-			if self.statement['result']['functions']:
-				for fnc in self.statement['result']['functions']:
+			if self.statement.result.functions:
+				for fnc in self.statement.result.functions:
 					self.processFunction(fnc)
 
 			return
 
 		# Get the raw expression
-		expression = wf.normalizeExpression(self.statement['result']['text'])
+		expression = wf.normalizeExpression(self.getText(self.statement.result))
 
 		targetVar = False
 		targetVars = []
@@ -204,14 +226,14 @@ class WittyStatement:
 			if prop != targetVar: prop['type'] = 'unknown'
 
 			# If there is a docblock here, set that
-			if self.statement['docblock']:
-				prop['docblock'] = self.statement['docblock']
+			if self.statement.docblock:
+				prop['docblock'] = self.statement.docblock
 
 			targetVars.append(prop)
 
 		# If there are functions assigned ...
-		if self.statement['result']['functions']:
-			for fnc in self.statement['result']['functions']:
+		if self.statement.result.functions:
+			for fnc in self.statement.result.functions:
 				if prop:
 					self.processFunction(fnc, prop)
 
@@ -222,24 +244,28 @@ class WittyStatement:
 	def processVar(self):
 
 		# Go over every assignment
-		for index, entry in enumerate(self.statement['result']):
+		for index, entry in enumerate(self.statement.result):
 
-			newVar = self.touchVar(entry['name']['name'], 'undefined')
+			# An entry that's still being typed has no name yet
+			if entry.name is None:
+				continue
+
+			newVar = self.touchVar(self.getText(entry.name), 'undefined')
 
 			# Since we used the var statement, it's declared
 			newVar['declared'] = True
 
-			if '=' in entry and 'expression' in entry:
+			if entry.hasExtra('=') and entry.expression is not None:
 
-				if entry['expression']['functions']:
-					self.processFunction(entry['expression']['functions'][0], newVar)
+				if entry.expression.functions:
+					self.processFunction(entry.expression.functions[0], newVar)
 				else:
 					# @todo: what goes on in this expression?
-					newVar['value'] = entry['expression']
+					newVar['value'] = entry.expression
 
-			if entry['docblock']:
+			if entry.docblock:
 
-				newVar['docblock'] = Docblock(entry['docblock'])
+				newVar['docblock'] = getDocblock(entry.docblock)
 				dbtype = newVar['docblock'].getType()
 				if dbtype:
 					newVar['type'] = dbtype
@@ -249,34 +275,38 @@ class WittyStatement:
 	def processFunction(self, result = None, newVar = None):
 
 		if not result:
-			result = self.statement['result'][0]
+			result = self.statement.result[0]
 
 		#if not scopeId:
-		#scopeId = self.statement['subscopeId']
-		if 'scopeId' in result:
-			scopeId = result['scopeId']
+		#scopeId = self.statement.subscopeId
+		if result.scopeId is not None:
+			scopeId = result.scopeId
 		else:
-			scopeId = self.statement['subscopeId']
+			scopeId = self.statement.subscopeId
 
 		# Add the function variable to this scope
-		if not newVar and 'name' in result:
-			newVar = self.touchVar(result['name']['name'], 'Function')
+		if not newVar and result.name is not None:
+			newVar = self.touchVar(self.getText(result.name), 'Function')
 			newVar['declared'] = True
 
 		newVar['type'] = 'Function'
 
+		# A function that's still being typed might not have a scope yet
+		if scopeId is None:
+			return
+
 		# Create a new statement for inside the next scope
-		scopeStat = WittyStatement(self.parentfile, {
-			'line': self.lineNr,
-			'docblock': None,
-			'openType': 'scope',
-			'openName': 'scope',
-			'scopeId': scopeId,
-			})
+		scopeNode = StatementNode('scope', 'scope', None, self.lineNr, None, None, None, None)
+		scopeNode.scopeId = scopeId
+
+		scopeStat = WittyStatement(self.parentfile, scopeNode)
 
 		# Process variable in the parens,
 		# Add them to the subscope
-		parenVars = result['paren']['content'].split(',')
+		if result.paren is not None:
+			parenVars = self.getText(result.paren).split(',')
+		else:
+			parenVars = []
 
 		paraminfo = self.docblock.getParams()
 
@@ -294,14 +324,15 @@ class WittyStatement:
 					parVar['description'] = paraminfo[varName]['description']
 
 		# Add the function name as a variable to the current scope
-		if 'name' in result:
-			parVar = scopeStat.touchVar(result['name']['name'])
+		if result.name is not None:
+			parVar = scopeStat.touchVar(self.getText(result.name))
 			parVar['declared'] = True
 			parVar['reference'] = newVar['name']
 
 		# Recursively go through all the statements in this file
-		for stat in result['block']['parsed']:
-			WittyStatement(self.parentfile, stat)
+		if result.block is not None:
+			for stat in result.block.parsed:
+				WittyStatement(self.parentfile, stat)
 
 		
 
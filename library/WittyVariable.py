@@ -1,5 +1,5 @@
 import Witty.library.functions as wf
-from Witty.library.Docblock import Docblock
+from Witty.library.Docblock import Docblock, getDocblock
 
 # Debug wrappers
 def warn(message, showStack = True): wf.warn(message, showStack, 3)
@@ -35,6 +35,15 @@ class WittyVariable:
 	type = None
 	types = None
 
+	# The name of the file that created this variable
+	fileName = None
+
+	# Are the properties shared with another variable?
+	shared = False
+
+	# The type names this variable is registered under
+	typeNames = None
+
 	## Constructor
 	#  @param   self        The object pointer
 	#  @param   statement   The statement of declaration
@@ -53,7 +62,7 @@ class WittyVariable:
 		if isinstance(text, Docblock):
 			self.docblock = text
 		else:
-			self.docblock = Docblock(text)
+			self.docblock = getDocblock(text)
 
 		self.setType(self.docblock.getType())
 
@@ -83,8 +92,11 @@ class WittyVariable:
 			if typeName == self.name:
 				continue
 
-			# Get the variable for the given type
-			typeVar = self.scope.findVariable(typeName)
+			intel = self.scope.intel
+
+			# Get the variable for the given type, the one that named it
+			# with @typename, or one defined by that name anywhere else
+			typeVar = self.scope.findVariable(typeName) or intel.getType(typeName) or intel.getSymbol(typeName)
 
 			# Update the result value with the found prototype properties
 			if typeVar: variables.update(typeVar.getPrototypeProperties())
@@ -133,7 +145,11 @@ class WittyVariable:
 		else:
 			return None
 
-	def setBase(self, variable):
+	## Set the basic info of this variable
+	#  @param   self        The object pointer
+	#  @param   variable    The variable dict
+	#  @param   statement   The WittyStatement the variable dict comes from
+	def setBase(self, variable, statement = None):
 
 		# Store info
 		self.info = variable
@@ -149,24 +165,20 @@ class WittyVariable:
 
 		if not self.type or self.type in ['undefined', 'unknown']:
 
-			valueResult = None
+			value = None
 
-			if variable['value'] and 'result' in variable['value']:
-				valueResult = variable['value']['result']
+			if variable['value'] and variable['value'].result is not None:
+				value = statement.getText(variable['value'].result)
 			elif self.statement:
 				# @todo: This shouldn't really go here, and be solved much earlier!
-				valueResult = self.statement.statement['result']
-				tempTest = valueResult['text'].replace('===', '_EQ_')
+				tempTest = self.statement.getText(self.statement.statement.result).replace('===', '_EQ_')
 				tempTest = tempTest.replace('==', '_EQ_')
 
 				if len(tempTest):
-					valueResult['text'] = tempTest[len(tempTest)-1].strip()
-				else:
-					valueResult = None
+					value = tempTest[len(tempTest)-1].strip()
 
-			if valueResult:
-				# See if there is a value assignment
-				value = valueResult['text']
+			# See if there is a value assignment
+			if value is not None:
 
 				# Remove trailing semicolon
 				if value[-1:] == ';':
@@ -195,6 +207,8 @@ class WittyVariable:
 					existing = self.scope.findVariable(functionName)
 
 					if existing:
+						self.scope.intel.useVariable(existing)
+
 						# Get the type this function returns!
 						returnInfo = existing.getReturn()
 
@@ -207,6 +221,7 @@ class WittyVariable:
 					existing = self.scope.findVariable(value)
 
 					if existing:
+						self.scope.intel.useVariable(existing)
 						self.makeReference(existing)
 
 	## Make a reference to the given variable
@@ -218,6 +233,7 @@ class WittyVariable:
 			self.properties = existing.properties
 			self.propArray = existing.propArray
 			self.options = existing.options
+			self.shared = True
 
 		self.setType(existing.type)
 
@@ -245,6 +261,9 @@ class WittyVariable:
 	def addAppearance(self, scope, statement):
 		self.statements.append(statement)
 
+		if self.scope:
+			self.scope.intel.recordPatch(self, self.statements, None, statement)
+
 	## Look for properties inside this variable
 	def findProperties(self, properties):
 
@@ -281,8 +300,16 @@ class WittyVariable:
 		if name in self.properties:
 			prop = self.properties[name]
 
+			# Another file could have added it
+			if prop.scope:
+				prop.scope.intel.useVariable(prop)
+
 			# If there is a new type set
 			if info['type']:
+
+				if prop.scope:
+					prop.scope.intel.recordPatch(prop, prop, 'type', prop.type)
+
 				prop.type = info['type']
 		else:
 			prop = WittyVariable()
@@ -303,6 +330,15 @@ class WittyVariable:
 			self.properties[name] = prop
 			self.propArray.append(prop)
 
+			if self.scope:
+				intel = self.scope.intel
+
+				# It belongs to the file that is being added
+				prop.fileName = intel.attaching
+
+				intel.recordPatch(self, self.properties, name, prop)
+				intel.recordPatch(self, self.propArray, None, prop)
+
 		# See if there are any sub properties we need to touch
 		if 'properties' in info:
 			# Recursively add deeper properties
@@ -0,0 +1,106 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import Witty.library.functions as wf
+from Witty.library.WittyFile import WittyFile
+from Witty.library.WittyCache import WittyCache
+from Witty.library.WittyProfiler import profiler
+
+#
+# The WittyWorker functions run in other processes,
+# so files can be parsed on more than one core.
+# A worker only reads & parses the file: it sends the
+# statements, scopes & language back to the parser thread,
+# which creates the WittyFile & adds it to the intel.
+# When profiling, the counters of the file are sent along.
+#
+
+# The caches of this process, by their directory
+caches = {}
+
+#
+# The part of a WittyProject a WittyFile uses while it's parsed
+#
+class WorkerProject:
+
+	# Workers don't build any intel
+	intelNode = None
+	intelBrowser = None
+
+	## Constructor
+	#  @param   self        The object pointer
+	#  @param   cache       The WittyCache, or None
+	#  @param   language    The language of the file, if it's known
+	def __init__(self, cache, language):
+		self.cache = cache
+		self.language = language
+
+	def getFileLanguage(self, fileName):
+		return self.language
+
+	def setFileLanguage(self, fileName, language):
+		self.language = language
+
+#
+# A WittyFile that is only parsed, its statements
+# are processed when the parser thread gets it
+#
+class WorkerFile(WittyFile):
+
+	def processStatement(self, stat):
+		pass
+
+## Create a pool of processes to parse files in
+#  @param   workers     The amount of processes
+#  @return  A ProcessPoolExecutor
+def createPool(workers):
+
+	# Forking the parser thread's process isn't safe, so start new ones
+	context = multiprocessing.get_context('spawn')
+
+	if wf.parsePython:
+		context.set_executable(wf.parsePython)
+
+	return ProcessPoolExecutor(max_workers = workers, mp_context = context)
+
+## Start parsing a file in a pool
+#  @param   pool        The ProcessPoolExecutor
+#  @param   project     The WittyProject (or anything with its cache & languages)
+#  @param   fileName    The path to the file
+#  @return  A Future of the result dict
+def submitFile(pool, project, fileName):
+
+	if project.cache:
+		(directory, maxSize) = (project.cache.directory, project.cache.maxSize)
+	else:
+		(directory, maxSize) = (None, 0)
+
+	return pool.submit(parseFile, fileName, project.getFileLanguage(fileName), wf.lazyBodies, directory, maxSize, profiler.enabled)
+
+## Read & parse a file, in a worker process
+#  @param   fileName    The path to the file
+#  @param   language    The language of the file, or None to detect it
+#  @param   lazyBodies  If function bodies are parsed lazily
+#  @param   directory   The directory of the parse cache, or None
+#  @param   maxSize     The maximum size of the parse cache
+#  @param   profiled    If the parse is counted by the profiler
+#  @return  The result dict of WittyFile.getResult()
+def parseFile(fileName, language, lazyBodies, directory, maxSize, profiled = False):
+
+	wf.lazyBodies = lazyBodies
+	profiler.enable(profiled)
+
+	cache = None
+
+	if directory:
+		cache = caches.get(directory)
+
+		if cache is None:
+			cache = caches[directory] = WittyCache(directory, maxSize)
+
+	wittyFile = WorkerFile(WorkerProject(cache, language), fileName)
+	result = wittyFile.getResult()
+
+	if profiled:
+		result['profile'] = profiler.takeFile(fileName)
+
+	return result
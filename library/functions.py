@@ -2,12 +2,32 @@
 # These functions are used throughout the Witty plugin,
 # and are mainly for getting information out of code
 #
-import os, re, threading, pprint, json, pickle, hashlib, inspect, sublime, datetime
+import os, re, threading, pprint, json, pickle, hashlib, inspect, datetime
 from decimal import *
+from Witty.library.WittyLexer import WittyLexer, getMask, punctuators, CODE, COMMENT
+from Witty.library.WittyNode import WittyNode, StatementNode, ExpressionResult, Extraction, Piece, Paren, Block, LazyBody
+from Witty.library.WittyProfiler import profiler
+from Witty.library.WittyMemo import WittyMemo
 
 doDebug = False
 debugLevel = 1
 
+# The maximum size of the parse cache, in bytes
+cacheSize = 64 * 1024 * 1024
+
+# Only parse function bodies when they're needed
+lazyBodies = True
+
+# The amount of processes that parse files, 0 parses them in the parser thread
+parseWorkers = 0
+
+# The python interpreter the parse processes run in, None for the current one
+parsePython = None
+
+# The tokenized & normalized expressions, by their text
+tokenizeMemo = WittyMemo('tokenizeExpression', 4096)
+normalizeMemo = WittyMemo('normalizeExpression', 4096)
+
 # Chars
 whitespace = [' ', '\n', '\t']
 
@@ -31,9 +51,28 @@ operatorTokens = [
 operatorSymbols.sort(key=len, reverse=True)
 operatorTokens.sort(key=len, reverse=True)
 
-# Find strings (even with escaped ' and ")
-# Regex is actually (?<!\\)(?:(')|")(?(1)(\\'|[^'\r])+?'|(\\"|[^\r"])+?")
-reStrings = re.compile(r'''(?<!\\)(?:(')|")(?(1)(\\'|[^'\r])+?'|(\\"|[^\r"])+?")''', re.M|re.X)
+# Tokens starting with one of these are operators (assignments included)
+operatorPrefixes = tuple(operatorSymbols) + ('=',)
+
+# The texts of the lexer tokens that are operators: the punctuators
+# starting with an operator symbol, the single char ones & the words
+operatorTexts = frozenset(
+	[punctuator for punctuator in punctuators if punctuator.startswith(operatorPrefixes)] +
+	[symbol for symbol in operatorPrefixes if len(symbol) == 1] +
+	operatorTokens
+)
+
+assignmentOperators = ['=', '+=', '-=', '*=', '/=', '%=', '<<=', '>>=', '>>>=', '&=', '^=', '|=']
+
+# Opening chars and their closing counterpart
+closers = {'(': ')', '{': '}', '[': ']'}
+
+# Find the opening & closing chars of brackets
+reBrackets = {
+	'(': re.compile(r'[()]'),
+	'{': re.compile(r'[{}]'),
+	'[': re.compile(r'[\[\]]')
+}
 
 # Things that denote expressions
 expressionizers = ['+', '=', '-', '*', '/', '%', '<', '>', '~', '(', ',']
@@ -46,6 +85,23 @@ statWords = ['if', 'do', 'while', 'for', 'var', 'try', 'let', 'else', 'case', 't
 
 literals = ["'", '"', '{', '[']
 
+# Match a name, possibly preceded by whitespace
+reName = re.compile(r'[ \t\n]*((?:[^\W\d]|\$)(?:\w|\$)*)?')
+
+# Match the next token of an expression line, the group name is its type
+reExpressionToken = re.compile(
+	r'(?P<space>[ \t\n]+)'
+	r'|(?P<member>[.\[])'
+	r'|(?P<equality>===?)'
+	r'|(?P<assignment>=)'
+	r'|(?P<docblock>/\*(?P<comment>.*?)(?:\*/|\Z))'
+	r'|(?P<string>"(?:\\.?|[^"\\])*"?|\'(?:\\.?|[^\'\\])*\'?)'
+	r'|(?P<opencurly>\{)'
+	r'|(?P<name>(?:[^\W\d]|\$)(?:\w|\$)*)'
+	r'|(?P<other>.)',
+	re.S
+)
+
 # Is something an array?
 def is_array(object):
 	return isinstance(object, (list, tuple))
@@ -100,6 +156,10 @@ def dictify(data, level=0):
 
 		return tempList
 
+	# Parse tree nodes have slots instead of a dict
+	if isinstance(data, WittyNode):
+		return dictify(data.toDict(), upLevel)
+
 	# If the object does not have a dict, return it
 	try:
 		return dictify(data.__dict__, upLevel)
@@ -245,12 +305,16 @@ def isFunctionDeclaration(text):
 		return False
 
 	# 'function' appears somewhere, but how?
+	mask = getMask(text)
+	id = text.find('function')
 
-	# Replace all strings with this placeholder
-	text = re.sub(reStrings, '"a"', text)
+	# It has to be in the code, not in a string or comment
+	while id > -1:
 
-	if text.count('function') > 0:
-		return True
+		if mask[id] == CODE:
+			return True
+
+		id = text.find('function', id + 1)
 
 	return False
 
@@ -274,100 +338,84 @@ def getSurround(text, id, default = ''):
 
 	return previous, next
 
+## Remove an inline comment from the given line
+#  @param   text   The line of text
 def removeComment(text):
 
-	skipToId = False
-	newLines = 0
-	i = 0
+	id = text.find('//')
 
-	for i, c in enumerate(text):
+	if id < 0:
+		return text
 
-		if skipToId > i:
-			continue
+	mask = getMask(text)
 
-		if c == '\n':
-			newLines += 1
-		elif c == "'" or c == '"':
-			(tempResult, tempId, tempNewLines) = extractString(text, c, i)
-			skipToId = i+tempId+1
-		elif hasCharsNext(text, '//', i):
-			return text[:i]
+	# Only cut at the first // that isn't inside a string
+	while id > -1:
 
-	return text
+		if mask[id] == COMMENT:
+			return text[:id]
 
-def hasWordNext(text, word, id = False):
-	return _hasChars(text, word, id, False, False)
+		id = text.find('//', id + 1)
 
-# Look for chars directly after the given text, spaces first invalidate the result
-def hasCharsNext(text, word, id = False, checkForSpace = False):
-	return _hasChars(text, word, id, False, not checkForSpace)
+	return text
 
-def hasCharsAfter(text, word, id = False, ignoreEndWhitespace = True, returnId = False):
-	return _hasChars(text, word, id, True, ignoreEndWhitespace, returnId)
+def hasWordNext(text, word, id = False, endId = None):
+	return _hasChars(text, word, id, False, False, False, False, endId)
 
-def _hasChars(text, word, id = False, ignoreBeginningWhitespace = True, ignoreEndWhitespace = True, returnId = False, returnWord = False):
+# Look for chars directly after the given text, spaces first invalidate the result
+def hasCharsNext(text, word, id = False, checkForSpace = False, endId = None):
+	return _hasChars(text, word, id, False, not checkForSpace, False, False, endId)
+
+def hasCharsAfter(text, word, id = False, ignoreEndWhitespace = True, returnId = False, endId = None):
+	return _hasChars(text, word, id, True, ignoreEndWhitespace, returnId, False, endId)
+
+## Look for the given word(s) at the given id, without copying the text
+#  @param   text                        The complete text
+#  @param   word                        The word (or list of words) to look for
+#  @param   id                          The id to start looking at
+#  @param   ignoreBeginningWhitespace   Skip whitespace before the word
+#  @param   ignoreEndWhitespace         Don't require a delimiter after the word
+#  @param   returnId                    Return the id of the word (or -1)
+#  @param   returnWord                  Also return the word that was found
+#  @param   endId                       The id to stop looking at
+def _hasChars(text, word, id = False, ignoreBeginningWhitespace = True, ignoreEndWhitespace = True, returnId = False, returnWord = False, endId = None):
 
 	#pr('Looking for ' + str(word) + ' in text ' + text[id:id+5] + '... ignoreBeginningWhitespace: ' + str(ignoreBeginningWhitespace) + ' ignoreEndWhitespace: ' + str(ignoreEndWhitespace))
 
 	result = False
-	originalText = text
 
-	while True:
-	
-		if not len(text):
-			break
-
-		if not isinstance(id, bool):
-			try:
-				text = text[id:]
-			except IndexError:
-				break
-		else:
-			id = 0
-
-		try:
-			# If we should ignore the beginning space, recurse
-			if ignoreBeginningWhitespace and text[0] in whitespace:
-				return _hasChars(originalText, word, id+1, ignoreBeginningWhitespace, ignoreEndWhitespace, returnId, returnWord)
+	if endId is None:
+		endId = len(text)
 
-		except IndexError:
-			break
+	if isinstance(id, bool):
+		id = 0
 
-		if isinstance(word, list):
+	# Skip the beginning whitespace
+	if ignoreBeginningWhitespace:
+		while id < endId and text[id] in whitespace:
+			id += 1
 
-			wordList = word
-			word = False
+	if isinstance(word, list):
+		wordList = word
+		word = False
+	else:
+		wordList = [word]
 
-			for w in wordList:
-				temp = _hasChars(text, w, 0, ignoreBeginningWhitespace, ignoreEndWhitespace, True)
+	if id < endId:
 
-				if temp > -1:
-					word = w
-					result = id + temp
-					break
+		for w in wordList:
 
-			break
+			# If this text doesn't start with this word at all, try the next one
+			if not text.startswith(w, id, endId):
+				continue
 
-		# If this text doesn't start with this word at all, return False
-		if not text.startswith(word):
-			break
-		else:
-			# The text does start with the word
-			wordlength = len(word)
+			wordEnd = id + len(w)
 
-			if ignoreEndWhitespace:
+			# Make sure it's actually a word, not part of something else
+			if ignoreEndWhitespace or (wordEnd < endId and text[wordEnd] in wordDelim):
+				word = w
 				result = id
-			else:
-				# Make sure it's actually a word, not part of something else
-				extraChar = text[wordlength:wordlength+1]
-
-				if extraChar in wordDelim:
-					result = id
-				else:
-					break
-
-
-		break
+				break
 
 	if isinstance(result, bool):
 
@@ -377,265 +425,21 @@ def _hasChars(text, word, id = False, ignoreBeginningWhitespace = True, ignoreEn
 
 		if not returnId:
 			# We want a boolean
-			if result > -1:
-				result = True
-			else:
-				result = False
+			result = True
 
 	if returnWord:
 		return result, word
 	else:
 		return result
 
-def getCharAfterId(text, word, id = False, checkForSpace = False):
-
-	if not checkForSpace:
-		temp = text.strip()
-	else:
-		temp = text
-
-	isPresent = hasCharsNext(temp, word, id, checkForSpace)
-
-	if not isPresent:
-		return False
-	else:
-		for i, c in enumerate(text):
-			if c == word:
-				return i
-
 # Get the id for the next given word
 # Does not care about anything inbetween
-def getNextCharId(text, word, id = False):
-
-	if id > -1:
-		text = text[id:]
-	else:
-		id = 0
-
-	length = len(word)
-
-	for i, c in enumerate(text):
-
-		stack = text[i:i+length]
-
-		if stack == word:
-			return id+i
-
-	return -1
-
-# See if there's an operator somewhere after
-def hasOperatorAfter(text, id = False):
-
-	(text, exists) = shiftString(text, id)
-
-	if exists:
-
-		# See if there are any symbols, which allow spaces after it
-		symbolId = _hasChars(text, operatorSymbols, False, True, True, True)
-
-		if symbolId > -1:
-			return True
-
-		# See if there are any tokens, which don't allow spaces after it
-		tokenId = _hasChars(text, operatorTokens, False, True, False, True)
-
-		if tokenId > -1:
-			return True
-	
-	return False
-
-def hasOperatorNext(text, id = False):
-
-	(text, exists) = shiftString(text, id)
-
-	if exists:
-
-		# See if there are any symbols, which allow spaces after it
-		symbolId = _hasChars(text, operatorSymbols, False, False, True, True)
-
-		if symbolId > -1:
-			return True
-
-		# See if there are any tokens, which don't allow spaces after it
-		tokenId = _hasChars(text, operatorTokens, False, False, False, True)
-
-		if tokenId > -1:
-			return True
-	
-	return False
-
-
-# Get a part of the given string
-def shiftString(text, id):
-
-	if len(text) <= id:
-		return text, False
-
-	if id == 0:
-		return text, True
-	try:
-		text = text[id:]
-		return text, True
-	except IndexError:
-		return text, False
-
-def extractOperatorAfter(text, id = False):
-
-	(text, exists) = shiftString(text, id)
-
-	while exists:
-
-		# See if there are any symbols, which allow spaces after it
-		(beginId, word) = _hasChars(text, operatorSymbols, False, True, True, True, True)
-
-		if beginId > -1:
-			break
-
-		# See if there are any tokens, which don't allow spaces after it
-		(beginId, word) = _hasChars(text, operatorTokens, False, True, False, True, True)
-
-		if beginId > -1:
-			break
-
-		break
-	
-	if beginId > -1:
-		endId = beginId + len(word)
-		newLines = text.count('\n', 0, endId)
-	else:
-		endId = False
-		newLines = False
-		word = False
-
-	return word, endId, newLines
-
-# See if there's a statement after (simple version)
-def hasStatementAfter(text, id = False):
-
-	try:
-		if id > -1:
-			text = text[id:]
-
-		if isWhitespace(text[0]):
-			return hasStatementAfter(text, 1)
-	except IndexError:
-		return False
-
-	for stat in statWords:
-		if _hasChars(text, stat, False, False, False):
-			return True
-
-	return False
-
-def extractStatementAfter(text, id = False):
-
-	(text, exists) = shiftString(text, id)
-
-	(beginId, word) = _hasChars(text, statWords, False, True, False, True, True)
-	
-	if beginId > -1:
-		endId = beginId + len(word)
-		newLines = text.count('\n', 0, endId)
-	else:
-		endId = False
-		newLines = False
-		word = False
-
-	return word, endId, newLines
-
-
-## Find a text before
-#  @param   text   The text
-#  @param   id     The current position
-#  @param   word  The word to find
-def hasWordBefore(text, id, word):
-
-	piece = text[:id].strip()
-
-	if not piece.endswith(word):
-		return False
-	else:
-		# Make sure it's actually a word, not part of something else
-		wordlength = len(word)
-		maxPieceId = len(piece)-1
-
-		# Get the char before the word
-		before = text[maxPieceId-wordlength]
-
-		if before == ' ' or before == '\n' or before == '\t' or before == '=':
-			return True
-		else:
-			return False
-
-def _hasCharsBefore(text, id, word, ignoreBeginningWhitespace = True, ignoreTrailingWhitespace = True):
-
-	if isinstance(id, bool):
-		pass
-	else:
-		text = text[:id]
-
-	# If we can ignore the trailing whitespace, strip the text
-	if ignoreTrailingWhitespace:
-		text = text.strip()
-
-	if isinstance(word, list):
-
-		for w in word:
-			result = _hasCharsBefore(text, False, w, ignoreBeginningWhitespace, False)
-
-			if result:
-				return True
-
-		# If nothing in the list matched, return False
-		return False
-
-	if text.endswith(word):
-		return True
-	else:
-		return False
+def getNextCharId(text, word, id = False, endId = None):
 
-## Look for chars before the id position,
-#  does not care about spaces before or after the word
-#  @param   text   The text to look
-#  @param   id     The id to look before
-#  @param   word   The word(s) to look for
-def hasCharsBefore(text, id, word):
-	return _hasCharsBefore(text, id, word)
+	if endId is None:
+		endId = len(text)
 
-
-## Find a character before
-def hasCharBefore(text, id, char, ignore = [], ignoreWhitespace = True):
-
-	# If a single char is given, turn it into an array
-	if isinstance(char, str):
-		char = [char]
-
-	piece = text[:id]
-
-	# Make sure it's actually a word, not part of something else
-	maxPieceId = len(piece)-1
-
-	# Get the char before the word
-	before = piece[maxPieceId]
-
-	# If the char before is a whitespace...
-	if before in whitespace:
-		return hasCharBefore(piece, id-1, char, ignoreWhitespace)
-	elif before in char:
-		return True
-	else:
-		return False
-
-
-## Check if id is an opening array literal
-def isArrayLiteral(text, id):
-
-	char = text[id]
-
-	if char == '[':
-		return hasCharBefore(text, id, ['+', '=', '-', '*', '/', '%', '<', '>', '~', '(', ',', ';'])
-	else:
-		return False
+	return text.find(word, id or 0, endId)
 
 ## Check if a char is a valid part of a name
 #  @param   char          The char to check
@@ -653,10 +457,14 @@ def isValidName(char, beginOfName = False):
 #  @param    text         The original text to use
 #  @param    literal      The literal to use (' or ")
 #  @param    id           The id position in the text to start from
-def extractString(text, literal, id = False):
+#  @param    endId        The id to stop at
+#  @return   The string, the id of the closing literal and the newlines
+def extractString(text, literal, id = False, endId = None):
 
-	if id > -1:
-		text = text[id:]
+	if endId is None:
+		endId = len(text)
+
+	i = id or 0
 
 	# Count the newlines
 	newLines = 0
@@ -667,7 +475,9 @@ def extractString(text, literal, id = False):
 
 	escaped = False
 
-	for i, c in enumerate(text):
+	while i < endId:
+
+		c = text[i]
 
 		if c == '\n':
 			newLines += 1
@@ -675,6 +485,7 @@ def extractString(text, literal, id = False):
 		if not stringOpen:
 
 			if isWhitespace(c):
+				i += 1
 				continue
 			elif c == literal:
 				stringOpen = True
@@ -686,6 +497,7 @@ def extractString(text, literal, id = False):
 
 			if c == '\\' and not escaped:
 				escaped = True
+				i += 1
 				continue
 
 			if c == literal and not escaped:
@@ -698,236 +510,169 @@ def extractString(text, literal, id = False):
 					result += '\\'
 				result += c
 
-	return result, i, newLines
+			escaped = False
 
-## Extract the next name from the given text
-def extractName(text):
+		i += 1
 
-	# The new lines we've encountered
-	newLines = 0
-	
-	# Result
-	result = ''
+	return result, min(i, endId-1), newLines
 
-	# Has the name begin?
-	hasBegun = False
+## Extract the next name from the given text
+#  @param    text         The original text to use
+#  @param    id           The id position in the text to start from
+#  @param    endId        The id to stop at
+#  @return   The name, the id of its last char and the newlines before it
+def extractName(text, id = 0, endId = None):
 
-	for i, c in enumerate(text):
+	if endId is None:
+		endId = len(text)
 
-		if c == '\n':
-			newLines += 1
+	match = reName.match(text, id, endId)
 
-		# If the name hasn't begun yet
-		if not hasBegun:
+	# The name is optional in the regex, so there always is a match
+	result = match.group(1) or ''
+	nameEnd = match.end() - 1
 
-			# Skip all whitespaces
-			# Even though it isn't always allowed
-			if isWhitespace(c):
-				continue
+	newLines = text.count('\n', id, match.end())
 
-			# See if it's a valid start
-			if isValidName(c, True):
-				hasBegun = True
-				result += c
-			else:
-				name = False
-				break
-		else:
-			# The name has begun!
-
-			if isValidName(c):
-				result += c
-			else:
-				# It's not a valid part of a name, so finish!
-				break
+	return result, nameEnd, newLines
 
-	endId = i - 1
+def extractParen(text, id = 0, endId = None, mask = None, pairs = None):
+	return extractBetween(text, '(', ')', id, endId, mask, pairs)
 
-	return result, endId, newLines
+def extractCurly(text, id = 0, endId = None, mask = None, pairs = None):
+	return extractBetween(text, '{', '}', id, endId, mask, pairs)
 
-def extractParen(text):
-	return extractBetween(text, '(', ')')
+def extractSquare(text, id = 0, endId = None, mask = None, pairs = None):
+	return extractBetween(text, '[', ']', id, endId, mask, pairs)
 
-def extractCurly(text):
-	return extractBetween(text, '{', '}')
-
-def extractSquare(text):
-	return extractBetween(text, '[', ']')
+## Find the closing bracket by jumping from bracket to bracket,
+#  ignoring those in strings & comments
+#  @param    text         The original text to use
+#  @param    open         The opening char
+#  @param    id           The id after the opening char
+#  @param    endId        The id to stop at
+#  @param    mask         The code/string/comment mask of the text
+#  @return   The id of the closer, or the last id if it isn't closed
+def findCloser(text, open, id, endId, mask):
 
-def extractBetween(text, open, close):
+	search = reBrackets[open]
+	betweenOpen = 1
 
-	# The new lines we've encountered
-	newLines = 0
+	while True:
+		match = search.search(text, id, endId)
 
-	# Result
-	result = ''
+		if not match:
+			return endId - 1
 
-	# Counter
-	betweenOpen = 0
+		id = match.start()
 
-	# Stringopen
-	stringOpen = False
+		if mask[id] == CODE:
 
-	# Escape
-	escape = False
+			if text[id] == open:
+				betweenOpen += 1
+			else:
+				betweenOpen -= 1
 
-	# Between is open
-	isOpen = False
+				# If we closed the last one...
+				if betweenOpen == 0:
+					return id
 
-	# Where we started extracting
-	beginId = 0
+		id += 1
 
-	skipToId = False
+## Extract everything between the given open & close chars
+#  @param    text         The original text to use
+#  @param    open         The opening char
+#  @param    close        The closing char
+#  @param    id           The id position in the text to start from
+#  @param    endId        The id to stop at
+#  @param    mask         The code/string/comment mask of the text
+#  @param    pairs        The bracket pairs of the text (WittyLexer.pairs)
+#  @return   The content, the id after the opener, the id of the closer & the newlines
+def extractBetween(text, open, close, id = 0, endId = None, mask = None, pairs = None):
 
-	totalCount = 0
+	(beginId, closeId) = findBetween(text, open, close, id, endId, mask, pairs)
 
-	for i, c in enumerate(text):
+	newLines = text.count('\n', id, closeId)
 
-		# Count newlines
-		if c == '\n':
-			newLines += 1
+	return text[beginId:closeId], beginId, closeId, newLines
 
-		if skipToId > i:
-			continue
+## Find the ids of what is between the given open & close chars,
+#  without copying it out of the text
+#  @param    text         The original text to use
+#  @param    open         The opening char
+#  @param    close        The closing char
+#  @param    id           The id position in the text to start from
+#  @param    endId        The id to stop at
+#  @param    mask         The code/string/comment mask of the text
+#  @param    pairs        The bracket pairs of the text (WittyLexer.pairs)
+#  @return   The id after the opener & the id of the closer
+def findBetween(text, open, close, id = 0, endId = None, mask = None, pairs = None):
 
-		# Skip inline comments
-		if c == '/' and text[i+1] == '/':
-			nextNL = getNextCharId(text[i:], '\n')
+	if endId is None:
+		endId = len(text)
 
-			if nextNL > -1:
-				skipToId = nextNL+i
-			else:
-				skipToId = len(text)-1
+	if mask is None:
+		mask = getMask(text)
 
-		elif c == '/' and text[i+1] == '*':
-			(tempResult, tempEndId, tempNL) = extractGreedy(text[i:], '/*', '*/')
+	i = id
 
-			if tempEndId:
-				skipToId = tempEndId + i
-				continue
+	# Skip whitespaces & comments before the opener
+	while i < endId and (mask[i] == COMMENT or isWhitespace(text[i])):
+		i += 1
 
-		# If c is a escape, invert the escape status
-		if c == "\\":
-			escape = not escape
+	if i < endId and text[i] == open and mask[i] == CODE:
 
-		# If a string is open
-		if stringOpen:
+		beginId = i + 1
 
-			# And the new char is the same literal,
-			# and it wasn't escaped
-			if c == stringOpen and not escape:
-				stringOpen = False
-				
-		elif not isOpen:
+		# If the brackets have been paired, jump straight to the closer
+		if pairs is not None:
+			closeId = pairs.get(i, endId)
 
-			# Skip whitespaces
-			if isWhitespace(c):
-				continue
-			elif c == open:
-				beginId = i
-				isOpen = True
-				betweenOpen = 1
-				totalCount = 1
-			else:
-				# This is not a space and not an opener, so stop!
-				break
-		# We have started!
+			if closeId >= endId:
+				closeId = endId - 1
 		else:
+			closeId = findCloser(text, open, beginId, endId, mask)
 
-			# First do some string checking
-			if c == "'":
-				stringOpen = "'"
-			elif c == '"':
-				stringOpen = '"'
-			else:
-
-				if c == open:
-					betweenOpen += 1
-					totalCount += 1
-				elif c == close:
-					betweenOpen -= 1
-
-					# If we closed the last one...
-					if betweenOpen == 0:
-						break
-
-	endId = i
-	beginId = beginId + 1
+	else:
+		# This is not a space and not an opener, so stop!
+		beginId = id + 1
+		closeId = min(i, endId - 1)
 
-	return text[beginId:endId], beginId, endId, newLines
+	return beginId, closeId
 
 # Extract a greedy statement, one that does not care
 # what comes between begin and end char, like /* */
-def extractGreedy(text, begins, ends, skipBeginSpaces = False):
-
-	if not len(text):
-		return False, False, False
-
-	if skipBeginSpaces:
-		if isWhitespace(text[0]):
-
-			nl = 0
-			if text[0] == '\n':
-				nl =1
-
-			(result, endId, newLines) = extractGreedy(text[1:], begins, ends, True)
-			return result, endId+1, newLines+nl
-
-
-	# The new lines we've encountered
-	newLines = 0
-	
-	# Skip to id
-	skipToId = False
+def extractGreedy(text, begins, ends, skipBeginSpaces = False, id = 0, endId = None):
 
-	# Include to id
-	includeToId = False
+	if endId is None:
+		endId = len(text)
 
-	# Include to and end at this id
-	endAtId = False
-
-	# Have we begun?
-	hasBegun = False
-
-	# Result
-	result = ''
-
-	for i, c in enumerate(text):
+	if id >= endId:
+		return False, False, False
 
-		# Count newlines
-		if c == '\n':
-			newLines += 1
+	startId = id
 
-		if skipToId and i <= skipToId:
-			continue
-		elif includeToId and i <= includeToId:
-			result += c
-			continue
-		elif endAtId and i <= endAtId:
-			result += c
+	if skipBeginSpaces:
+		while id < endId and isWhitespace(text[id]):
+			id += 1
 
-			if endAtId == i:
-				break
+	# If it doesn't begin here, there is nothing to extract
+	if not text.startswith(begins, id, endId):
+		return '', id, text.count('\n', startId, id)
 
-		if i == 0:
-			if text.startswith(begins):
-				includeToId = len(begins) - 1
-				hasBegun = True
-		elif hasBegun:
-			if hasCharsNext(text, ends, i):
-				endAtId = i + (len(ends)-1)
-		else:
-			break
+	contentId = id + len(begins)
+	closeId = text.find(ends, contentId, endId)
 
-		if hasBegun:
-			result += c
-	
-	endId = i
+	if closeId > -1:
+		lastId = closeId + len(ends) - 1
+	else:
+		closeId = endId
+		lastId = endId - 1
 
 	# Only include the content in between
-	result = result[len(begins):len(result)-len(ends)].strip()
+	result = text[contentId:closeId].strip()
 
-	return result, endId, newLines
+	return result, lastId, text.count('\n', startId, lastId+1)
 
 ## See if a char is a space or a tab
 def isSpacing(char):
@@ -940,30 +685,20 @@ def isWhitespace(char):
 	if isSpacing(char) or char == '\n':
 		return True
 
-def willExpressionContinue(text, id, hasBegun, waitingForOperand):
-
-	(text, exists) = shiftString(text, id)
-
-	if exists:
-		if not hasBegun:
-			return True
+def normalizeExpression(text):
 
-		if waitingForOperand:
-			return True
+	expression = normalizeMemo.get(text)
 
-		(tempOperator, newId, tempLines) = extractOperatorAfter(text)
+	if expression is None:
+		expression = _normalizeExpression(text)
+		normalizeMemo.set(text, expression)
 
-		if tempOperator:
-			return True
-		else:
-			return False
+	return copyExpression(expression)
 
-	# If it doesn't exists, the expression has ended
-	return False
+## Normalize an expression, without the memo
+def _normalizeExpression(text):
 
-def normalizeExpression(text):
-	
-	tokens = tokenizeExpression(text)
+	tokens = _tokenizeExpression(text)
 
 	expression = {'type': None, 'target': [], 'value': []}
 	
@@ -1024,89 +759,103 @@ def normalizeExpression(text):
 
 	return expression
 
+## Copy a normalized expression, so the remembered one can't be changed
+#  @param   expression   The normalized expression
+def copyExpression(expression):
+	return {
+		'type': expression['type'],
+		'target': [copyPiece(piece) for piece in expression['target']],
+		'value': [copyPiece(piece) for piece in expression['value']]
+	}
+
+## Copy a piece of a normalized expression
+#  @param   piece        The piece
+def copyPiece(piece):
+
+	piece = dict(piece)
+
+	if 'parts' in piece:
+		piece['parts'] = [dict(part) for part in piece['parts']]
+
+	return piece
 
 ## Tokenize an expression line
 #  @param   text   The raw expression text
+#  @return  A list of token dicts, with a type & text
 def tokenizeExpression(text):
 
+	tokens = tokenizeMemo.get(text)
+
+	if tokens is None:
+		tokens = _tokenizeExpression(text)
+		tokenizeMemo.set(text, tokens)
+
+	return [dict(token) for token in tokens]
+
+## Tokenize an expression line, without the memo
+#  @param   text   The raw expression text
+def _tokenizeExpression(text):
+
 	# Strip the text of extra whitespaces
 	text = text.strip()
 
-	# the length of the text
-	length = len(text)
-
 	# Returnvalues
 	result = []
 
-	# Skip to an id position
-	skipToId = False
+	# The code/string/comment mask, only made when a square bracket needs it
+	mask = None
 
 	isMemberOf = False
 	prev = False
 
-	for i, c in enumerate(text):
+	i = 0
+	length = len(text)
 
-		# Skip any characters we might have already added
-		if i < skipToId:
-			continue
+	while i < length:
 
-		if prev and prev['type'] == 'name' and (c == '.' or c == '['):
-			isMemberOf = True
-			continue
+		match = reExpressionToken.match(text, i)
+		kind = match.lastgroup
+		nextId = match.end()
 
-		if isWhitespace(c):
+		if kind == 'space':
+			i = nextId
 			continue
 
-		token = {'type': None, 'text': None}
-
-		if hasCharsNext(text, '===', i):
-			token['type'] = 'equality'
-			token['text'] = '==='
-			skipToId = i + 3
-		elif hasCharsNext(text, '==', i):
-			token['type'] = 'equality'
-			token['text'] = '=='
-			skipToId = i + 2
-		elif c == '=':
-			token['type'] = 'assignment'
-			token['text'] = '='
-		elif (i+1) < length and c == '/' and text[i+1] == '*':
-			(tresult, tendId, tnewLines) = extractGreedy(text[i:], '/*', '*/')
-			token['type'] = 'docblock'
-			token['text'] = tresult
-			skipToId = i + tendId
-		elif c in literals:
-			if c == "'" or c == '"':
-				(tempResult, tempId, tempNewLines) = extractString(text, c, i)
-
-				token['type'] = 'string'
-				token['text'] = tempResult
-
-				skipToId = i+tempId+1
-			elif c == '{':
-				#(tempResult, tempBeginId, tempEndId, tempNewLines) = extractCurly(text[i:])
-
-				token['type'] = 'opencurly'
-				token['text'] = '{'
-			elif c == '}':
-				token['type'] = 'closecurly'
-				token['text'] = '{'
-			elif c == '[':
-				(tempResult, tempBeginId, tempEndId, tempNewLines) = extractSquare(text[i:])
-
-				token['type'] = 'square'
-				token['text'] = '[' + tempResult + ']'
-
-				skipToId = i+tempEndId+1
-		else:
-			# Get the first name
-			(name, endId, newLines) = extractName(text[i:])
+		# A dot or square bracket after a name makes the next name a member
+		if kind == 'member':
+			if prev and prev['type'] == 'name':
+				isMemberOf = True
+				i = nextId
+				continue
+
+			kind = 'square' if text[i] == '[' else 'other'
+
+		if kind == 'name':
+			token = {'type': 'name', 'text': match.group(), 'member': isMemberOf}
+		elif kind == 'equality' or kind == 'assignment' or kind == 'opencurly':
+			token = {'type': kind, 'text': match.group()}
+		elif kind == 'string':
+			tokenText = match.group()
+
+			# Newlines are left out of strings, and so is an unfinished escape
+			if '\n' in tokenText or (nextId == length and tokenText.endswith('\\')):
+				(tokenText, endId, newLines) = extractString(text, text[i], i)
+				nextId = endId + 1
 
-			if name:
-				token['type'] = 'name'
-				token['text'] = name
-				token['member'] = isMemberOf
-				skipToId = i+len(name)
+			token = {'type': 'string', 'text': tokenText}
+		elif kind == 'docblock':
+			token = {'type': 'docblock', 'text': match.group('comment').strip()}
+		elif kind == 'square':
+
+			if mask is None:
+				mask = getMask(text)
+
+			(beginId, closeId) = findBetween(text, '[', ']', i, length, mask)
+
+			token = {'type': 'square', 'text': '[' + text[beginId:closeId] + ']'}
+			nextId = max(closeId + 1, i + 1)
+		else:
+			token = {'type': None, 'text': None}
 
 		result.append(token)
 		prev = token
@@ -1114,6 +863,8 @@ def tokenizeExpression(text):
 		# Reset certain values
 		isMemberOf = False
 
+		i = nextId
+
 	return result
 
 
@@ -1121,216 +872,164 @@ def tokenizeExpression(text):
 #  @param   text       The text to start from
 #  @param   hasBegun   If we already now this is an expression
 #  @param   waitingForOperand   If we're waiting for an operand
-def extractExpression(text, scopeLevel, lineNr, currentId = 0, startId = 0, hasBegun = False, waitingForOperand = False, sureNoStatement = False):
+#  @param   lexer      The WittyLexer of the text
+#  @param   endId      The id the expression can't go beyond
+def extractExpression(text, scopeLevel, lineNr, currentId = 0, startId = 0, hasBegun = False, waitingForOperand = False, sureNoStatement = False, lexer = None, endId = None):
 
-	maxId = len(text)-1
+	if not profiler.enabled:
+		return _extractExpression(text, scopeLevel, lineNr, currentId, startId, hasBegun, waitingForOperand, sureNoStatement, lexer, endId)
 
-	# The new lines we've encountered
-	newLines = 0
+	startTime = profiler.start()
+	chars = 0
 
-	# Result
-	result = ''
+	try:
+		result = _extractExpression(text, scopeLevel, lineNr, currentId, startId, hasBegun, waitingForOperand, sureNoStatement, lexer, endId)
+		chars = result.endId - result.beginId + 1
+	finally:
+		profiler.stop('expression', startTime, chars)
+
+	return result
+
+## Extract an expression, without profiling it
+def _extractExpression(text, scopeLevel, lineNr, currentId = 0, startId = 0, hasBegun = False, waitingForOperand = False, sureNoStatement = False, lexer = None, endId = None):
+
+	if not lexer:
+		lexer = WittyLexer(text)
+
+	if endId is None:
+		endId = len(text)
+
+	tokens = lexer.tokens
+	tokenCount = len(tokens)
+
+	# The index of the first token
+	index = lexer.indexAt(startId)
 
-	# Skip
-	skipToId = False
+	# The last code token we've seen, even if it's before the expression
+	previous = lexer.previousCode(index)
 
-	# If the expression has already begun ...
-	if hasBegun:
-		xStartId = startId
+	if previous > -1:
+		lastLine = lexer.getEndLine(previous)
 	else:
-		xStartId = -1
+		lastLine = lineNr
+
+	# Where the expression begins, and where it ends (exclusive)
+	beginId = False
+	lastEnd = startId
 
-	operandBusy = False
-	docblockEnd = False
 	currentDocblock = False
 	isAssignment = False
-	justFoundDb = False
 	terminated = False
 
 	# Extra extractions
 	extras = []
 
-	id = startId
-	c = ''
+	# Loop through the tokens
+	while index < tokenCount:
 
-	# Loop through the text
-	while id < maxId:
+		(kind, start, end, line) = tokens[index]
 
-		id += 1
+		if start >= endId:
+			break
 
-		# Skip any characters we might have already added
-		if id < skipToId:
+		# Skip inline comments
+		if kind == 'comment':
+			index += 1
 			continue
 
-		try:
-			c = text[id]
-		except IndexError:
-			die()
+		word = text[start:end]
 
-		if isWhitespace(c):
-			operandBusy = False
+		# A new line only continues the expression if we're still waiting
+		# for an operand, or if there's an operator before or after it
+		if line > lastLine and (hasBegun or beginId is not False) and not waitingForOperand:
+			if not word in operatorTexts and not (previous > -1 and lexer.getText(previous) in operatorTexts):
+				break
 
-		if hasOperatorNext(c):
-			operandBusy = False
-			waitingForOperand = True
+		if kind == 'docblock':
+			currentDocblock = word
+			lastLine = lexer.getEndLine(index)
+			index += 1
+			continue
+
+		if word == ';':
+
+			if beginId is False:
+				beginId = start
 
-		if c == ';':
 			terminated = True
+			lastEnd = end
 			break
 
-		if c == ',':
-			id -= 1
+		if word == ',':
 			break
 
-		if c == '=':
-			isAssignment = True
+		# A statement word was found (that isn't a property name)
+		if kind == 'name' and word in statWords and not (previous > -1 and lexer.getText(previous) == '.'):
 
-		# Count newlines
-		if c == '\n':
-
-			opBefore = hasCharsBefore(text, id, operatorSymbols) or hasCharsBefore(text, id, operatorTokens)
-			opAfter = hasOperatorAfter(text, id)
-
-			if opBefore or opAfter:
-				if xStartId < 0:
-					hasBegun = True
-					xStartId = id
-			else:
-				break
-
-			newLines += 1
-
-		tempWord = False
-
-		if not operandBusy:
-			# Look for a statement
-			(tempWord, tempId, tempNewLines) = extractStatementAfter(text, id)
-
-		# A statement word was found
-		if tempWord:
-
-			if (sureNoStatement or hasBegun) and tempWord == 'function':
-
-				justFoundDb = False
+			if word == 'function':
 
 				# Extract the function
-				tempResult = function.extract(text, scopeLevel, lineNr+newLines, currentId, id)
+				tempResult = function.extract(text, scopeLevel, line, currentId, start, lexer, endId)
 
-				extras.append(tempResult['result'])
+				# A function without its parens or body (like one that's
+				# still being typed) is just another word of the expression
+				if tempResult:
+					extras.append(tempResult.result)
 
-				# This can't be added to the result
-				result += ' '
+					if beginId is False:
+						beginId = start
 
-				# Skip to the id after it
-				skipToId = tempResult['endId']+1
+					# Skip to the token after it
+					lastEnd = tempResult.endId - currentId + 1
+					index = lexer.indexAt(lastEnd)
+					previous = lexer.previousCode(index)
+					lastLine = lexer.getEndLine(previous)
 
-				# Up the newline count
-				newLines += tempResult['newLines']
+					waitingForOperand = False
 
-				waitingForOperand = False
-
-				continue
+					continue
 
-			else:
-				id -= 1
+			# Statements can't be part of an expression that has begun
+			elif beginId is not False:
 				break
-		# If c is a starting paren
-		elif c == '(':
-
-			# Extract everything between the parens
-			(tempResult, tempBeginId, tempEndId, tempNewLines) = extractParen(text[id:])
-
-			result += '(' + tempResult + ')'
-			skipToId = id+tempEndId+1
-			newLines += tempNewLines
-
-			if xStartId < 0:
-				hasBegun = True
-				xStartId = id
 
-			justFoundDb = False
+		if beginId is False:
+			beginId = start
 
-			waitingForOperand = False
-			
-			continue
-		elif hasCharsAfter(text, '/*', id):
+		# Extract everything between parens, curly braces or squares
+		if word in closers:
 
-			docblockOpen = getNextCharId(text, '/*', id)
-			skip = getNextCharId(text, '*/', id)
+			(tempBeginId, tempEndId) = findBetween(text, word, closers[word], start, endId, lexer.mask, lexer.pairs)
 
-			if skip > -1:
-				justFoundDb = True
-				currentDocblock = text[id:skip+1]
-				skipToId = skip + 2
-				docblockEnd = skip + 1
-				continue
-			else:
-				break
-		# Skip inline comments
-		elif hasCharsAfter(text, '//', id):
-			
-			skip = getNextCharId(text, '\n', id)
-
-			if skip > -1:
-				skipToId = skip+1
-				continue
-			else:
-				break
-		# Extract literals
-		elif c in literals:
-
-			if c == "'" or c == '"':
-				(tempResult, tempId, tempNewLines) = extractString(text, c, id)
-
-				result += tempResult
-
-				skipToId = id+tempId+1
-				newLines += tempNewLines
-			elif c == '{':
-				(tempResult, tempBeginId, tempEndId, tempNewLines) = extractCurly(text[id:])
-				result += '{' + tempResult + '}'
-				skipToId = id+tempEndId+1
-				newLines += tempNewLines
-			elif c == '[':
-				(tempResult, tempBeginId, tempEndId, tempNewLines) = extractSquare(text[id:])
-				result += '[' + tempResult + ']'
-				skipToId = id+tempEndId+1
-				newLines += tempNewLines
+			lastEnd = tempEndId + 1
+			index = lexer.indexAt(lastEnd)
+			previous = lexer.previousCode(index)
+			lastLine = lexer.getEndLine(previous)
 
 			waitingForOperand = False
-			justFoundDb = False
-
-			if xStartId < 0:
-				hasBegun = True
-				xStartId = id
 
 			continue
-			
-		else:
-			operandBusy = True
-			justFoundDb = False
-			continue
 
-	# If the parsed text ends with a docblock, rewind the ending id
-	if docblockEnd:
-		tempText = text[:id+1].strip()
+		if word in assignmentOperators:
+			isAssignment = True
 
-		if tempText.endswith('*/'):
-			endId = docblockOpen
-		else:
-			endId = id
-	else:
-		endId = id
+		waitingForOperand = word in operatorTexts
 
-	result = text[startId:endId+1]
+		previous = index
+		lastEnd = end
+		lastLine = lexer.getEndLine(index)
+		index += 1
 
-	endId += currentId +1
+	if beginId is False:
+		beginId = startId
+	else:
+		lineNr = lexer.tokens[lexer.indexAt(beginId)][3]
 
-	result = {'assignment': isAssignment, 'text': result.strip(), 'functions': extras, 'docblock': currentDocblock, 'scope': scopeLevel}
+	newLines = lexer.countLines(beginId, lastEnd)
 
-	resultBeginId = startId+currentId
+	result = ExpressionResult(isAssignment, beginId+currentId, lastEnd+currentId, extras, currentDocblock, scopeLevel)
 
-	return {'scope': scopeLevel, 'line': lineNr, 'newLines': newLines, 'openType': 'expression', 'openName': 'expression', 'result': result, 'beginId': resultBeginId, 'endId': endId, 'functions': extras, 'terminated': terminated}
+	return StatementNode('expression', 'expression', scopeLevel, lineNr, newLines, beginId+currentId, lastEnd+currentId-1, result, extras, terminated)
 
 
 class Statement:
@@ -1344,14 +1043,6 @@ class Statement:
 	# The string that begins this LOC
 	begins = None
 
-	# The string that ends this LOC
-	ends = None
-
-	# If a begin is greedy, it does not
-	# care what comes after it
-	# (If it's a whole word or not)
-	greedy = None
-
 	# Naming things
 	namePosition = None
 	nameRequired = None
@@ -1391,12 +1082,6 @@ class Statement:
 	def setBegin(self, string):
 		self.begins = string
 
-	def setEnd(self, string):
-		self.ends = string
-
-	def setGreedy(self, greedy):
-		self.greedy = greedy
-
 	def setName(self, order, required = False):
 		self.namePosition = order
 		self.nameRequired = required
@@ -1424,8 +1109,39 @@ class Statement:
 			'options': options
 		}
 
+	## Compile the targets into a list, indexed by position
+	#  @param   self       The object pointer
+	def compile(self):
+
+		self.targets = [(False, False, False)]
+		position = 1
+
+		while True:
+			target = self.findTarget(position)
+
+			if not target[0]:
+				break
+
+			self.targets.append(target)
+			position += 1
+
+		self.targets.append((False, False, False))
+
+	## Get the target at the given position
+	#  @param   self       The object pointer
+	#  @param   position   The position after the beginning
 	def getNextTarget(self, position):
 
+		if position < len(self.targets):
+			return self.targets[position]
+
+		return False, False, False
+
+	## Look up the target at the given position in the settings
+	#  @param   self       The object pointer
+	#  @param   position   The position after the beginning
+	def findTarget(self, position):
+
 		if position in self.extras:
 			return self.extras[position]['char'], self.extras[position]['required'], self.extras[position]['options']
 		elif self.namePosition == position:
@@ -1439,23 +1155,53 @@ class Statement:
 
 		return False, False, False
 
+	## Extract this statement from the text
+	#  @param   self         The object pointer
+	#  @param   text         The complete text
+	#  @param   scopeLevel   The scope level we're in
+	#  @param   lineNr       The line number we're on
+	#  @param   currentId    The id we're actually at, but is removed from the text
+	#  @param   startId      The id where this statement begins
+	#  @param   lexer        The WittyLexer of the text
+	#  @param   endId        The id the statement can't go beyond
+	#  @return  The StatementNode, or False when a required paren or block is missing
+	def extract(self, text, scopeLevel, lineNr, currentId = 0, startId = 0, lexer = None, endId = None):
 
-	def extract(self, text, scopeLevel, lineNr, currentId = 0, startId = 0):
+		if not profiler.enabled:
+			return self.extractStatement(text, scopeLevel, lineNr, currentId, startId, lexer, endId)
 
-		# The actual id where this statement starts
-		beginId = currentId + startId
+		startTime = profiler.start()
+		chars = 0
+
+		try:
+			result = self.extractStatement(text, scopeLevel, lineNr, currentId, startId, lexer, endId)
+
+			if result:
+				chars = result.endId - result.beginId + 1
+		finally:
+			profiler.stop(self.name, startTime, chars)
 
-		#(text, exists) = shiftString(originalText, startId)
+		return result
 
-		if text[startId] in [' ', '\t', '\n']:
-			
-			if text[startId] == '\n':
-				lineNr += 1
+	## Extract this statement, without profiling it
+	#  (the parameters are the same as extract's)
+	def extractStatement(self, text, scopeLevel, lineNr, currentId = 0, startId = 0, lexer = None, endId = None):
 
-			return self.extract(text, scopeLevel, lineNr, currentId, startId+1)
+		if not lexer:
+			lexer = WittyLexer(text)
 
-		# Default newlines
-		newLines = 0
+		if endId is None:
+			endId = len(text)
+
+		tokens = lexer.tokens
+		tokenCount = len(tokens)
+
+		# Get the token this statement begins with
+		index = lexer.indexAt(startId)
+		(kind, start, end, lineNr) = tokens[index]
+
+		# The actual id where this statement starts
+		beginId = currentId + start
 
 		startScope = scopeLevel
 
@@ -1463,323 +1209,310 @@ class Statement:
 		if self.scope:
 			scopeLevel += 1
 
-		if self.greedy:
-			# Extract greedy pieces, like /* */ docblocks
-			(result, endId, newLines) = extractGreedy(text[startId:], self.begins, self.ends)
+		# Get the new current id
+		id = end
 
-			# Return the result
-			return {'scope': scopeLevel, 'line': lineNr, 'newLines': newLines, 'openType': 'statement', 'openName': self.name, 'result': result, 'beginId': beginId, 'endId': beginId+endId}
-		else:
+		# Position
+		position = 0
 
-			# Get the beginning
-			begin = self.begins
+		extractions = Extraction(id+currentId)
 
-			# Get the new current id
-			id = startId + len(begin)
+		groupResult = []
 
-			# Text length
-			textLength = len(text)
+		# Has an expression already begun?
+		expressionHasBegun = False
+		waitingForOperand = False
 
-			# Position
-			position = 0
+		# Have we found a docblock in the mean time?
+		foundDocblock = False
 
-			# Start a new group?
-			startNewGroup = False
+		# The docblocks by the offset of the token after them
+		docblocks = lexer.docblocks
 
-			extractions = {'beginId': id+currentId, 'docblock': False}
+		# The index of the first comment we skipped before the current token
+		skippedIndex = None
 
-			groupResult = {'group': []}
+		# Last target end
+		lastTargetEnd = id
 
-			# Has an expression already begun?
-			expressionHasBegun = False
-			waitingForOperand = False
+		antiInfinityCounter = 0
 
-			# Have we found a docblock in the mean time?
-			foundDocblock = False
+		# See what we have to do next
+		while True:
 
-			# Last target end
-			lastTargetEnd = 0
+			index = lexer.indexAt(id)
 
-			dbFoundNow = False
-			dbSetNow = False
-			dbPrevEnd = 0
-			dbPrevLines = 0
+			# Have we reached the end of the text?
+			if index >= tokenCount or tokens[index][1] >= endId:
+				break
 
-			tempResult = None
+			if antiInfinityCounter > 100:
+				pr({'antiInfinityCounter': antiInfinityCounter})
+				pr('=============================')
+				pr('Infinite Loop Detected in ' + self.name + ' extraction')
+				pr('=============================')
 
-			antiInfinityCounter = 0
-			groupCount = 0
+				if profiler.enabled:
+					profiler.bailout(self.name)
 
-			# See what we have to do next
-			while True:
+				break
 
-				# Have we reached the end of the string?
-				if id >= textLength:
-					break
+			antiInfinityCounter += 1
 
-				if antiInfinityCounter > 100:
-					pr({'antiInfinityCounter': antiInfinityCounter})
-					pr('=============================')
-					pr('Infinite Loop Detected in ' + self.name + ' extraction')
-					pr('=============================')
-					break
+			(kind, start, end, line) = tokens[index]
 
-				antiInfinityCounter += 1
+			# Skip inline comments & docblocks
+			if kind == 'comment' or kind == 'docblock':
+				if skippedIndex is None:
+					skippedIndex = index
 
-				# Extract any docblocks in here
-				(dbResult, dbEndId, dbNewLines) = extractGreedy(text[id:], '/*', '*/', True)
+				id = end
+				continue
 
-				if dbResult:
-					dbFoundNow = True
-					dbPrevEnd = dbEndId
-					dbPrevLines = dbNewLines
+			# Remember the docblock before this token for the next target,
+			# unless an earlier target jumped over it
+			if skippedIndex is not None:
+				found = docblocks.get(start)
 
-					foundDocblock = dbResult
-					id += dbEndId+1
-					newLines += dbNewLines
-					if not extractions['docblock']:
-						dbSetNow = True
-						extractions['docblock'] = foundDocblock
-					continue
+				if found is not None and found >= skippedIndex:
+					foundDocblock = getDocblockContent(lexer.getText(found))
 
-				# Remove inline comments
-				inlineComment = hasCharsAfter(text, '//', id, True, True)
-				if inlineComment > -1:
-					nextNL = getNextCharId(text, '\n', inlineComment)
+				skippedIndex = None
 
-					# If we found a newline, skip to it
-					if nextNL > -1:
-						id = nextNL
-					else:
-						# If we did not find a newline, skip to the end
-						id = len(text) - 1
+			word = text[start:end]
 
+			position += 1
 
-					if position == 0:
-						extractions['beginId'] = nextNL + currentId
+			if self.grouping and word == self.grouping:
 
-						if groupCount == 0:
-							beginId = nextNL + currentId
+				# Add the previous extractions to the group
+				groupResult.append(extractions)
 
-					continue
+				# Increase the id
+				id = end
 
-				position += 1
+				# Create a new extraction
+				extractions = Extraction(id+currentId)
 
-				if self.grouping and text[id] == self.grouping:
+				# Reset the position
+				position = 0
+				continue
 
-					groupCount += 1
+			(targetName, targetRequired, extraOptions) = self.getNextTarget(position)
 
-					# Add the previous extractions to the group
-					groupResult['group'].append(extractions)
+			# If there is no target left, the statement is done
+			if not targetName:
+				break
 
-					# Increase the id
-					id += 1
+			# Only attach docblocks to found targets
+			if foundDocblock and not extractions.docblock:
+				extractions.docblock = foundDocblock
 
-					# Create a new extraction
-					extractions = {'beginId': id+currentId, 'docblock': False}
+			if targetName == 'name':
 
-					# Reset the position
-					position = 0
-					continue
+				# Without a name, the piece is empty
+				if kind != 'name':
+					end = start
 
-				(targetName, targetRequired, extraOptions) = self.getNextTarget(position)
+				# Store the result in the extractions
+				extractions.name = Piece(start+currentId, end+currentId-1, foundDocblock)
 
-				# If we did find a target, we don't need to worry about the db
-				if targetName:
-					dbFoundNow = False
-					dbSetNow = False
+				# Set the next Id
+				id = end
+				lastTargetEnd = id
 
-				if targetName == 'name':
+			elif targetName == 'expression':
 
-					(result, endId, tempLines) = extractName(text[id:])
+				if self.name == 'return':
+					expressionHasBegun = True
 
-					# Store the result in the extractions
-					extractions['name'] = {
-						'name': result,
-						'beginId': id+currentId,
-						'endId': id+currentId+endId,
-						'docblock': foundDocblock
-					}
+				result = extractExpression(text, scopeLevel, line, currentId, start, expressionHasBegun, waitingForOperand, False, lexer, endId)
 
-					# Set the next Id
-					id = id+endId+1
+				# If the extracted expression is an empty string...
+				# Well then we didn't extract anything and we should discard it
+				if result.result.functions or result.result.hasText():
+
+					result.docblock = foundDocblock
+
+					extractions.expression = result
+
+					id = result.endId - currentId + 1
 					lastTargetEnd = id
 
-					# Increase the newlines
-					newLines += tempLines
+					expressionHasBegun = False
+					waitingForOperand = False
 
-				elif targetName == 'expression':
+			elif targetName == 'paren':
 
-					if self.name == 'return':
-						expressionHasBegun = True
+				if word != '(':
+					if targetRequired:
+						break
+					else:
+						continue
 
-					#(result, endId, newLines) = extractExpression(text, scopeLevel, lineNr+newLines, id, expressionHasBegun, waitingForOperand)
-					result = extractExpression(text, scopeLevel, lineNr, currentId, id, expressionHasBegun, waitingForOperand)
+				(tempBeginId, tempEndId) = findBetween(text, '(', ')', start, endId, lexer.mask, lexer.pairs)
 
-					# If the extracted expression is an empty string... 
-					# Well then we didn't extract anything and we should discard it
-					if result['result']['functions'] or result['result']['text']:
+				# Store the result in the extractions
+				extractions.paren = Paren(start+currentId, tempEndId+currentId, foundDocblock)
 
-						# Increase the newlines
-						newLines += result['newLines']
+				# Set the next Id
+				id = tempEndId+1
+				lastTargetEnd = id
 
-						result['docblock'] = foundDocblock
+			elif targetName == 'block':
 
-						extractions['expression'] = result
+				lazy = None
 
-						id = result['endId'] + 1
-						lastTargetEnd = id
+				if word == '{':
 
-						expressionHasBegun = False
-						waitingForOperand = False
+					(tempBeginId, closeId) = findBetween(text, '{', '}', start, endId, lexer.mask, lexer.pairs)
 
+					if self.scope and lexer.skeleton:
+						# Function bodies are parsed when they're needed
+						parsedResults = skeletonStatements(text, scopeLevel, start+1, currentId, lexer, closeId)
+						lazy = LazyBody(scopeLevel)
 					else:
-						id += 1
-						lastTargetEnd = id
+						# Now parse these results, too!
+						parsedResults = splitStatements(text, scopeLevel, line, start+1, currentId, lexer, closeId)
+
+					blockBeginId = start+1
+					blockEndId = closeId
+					id = closeId+1
+
+				else:
+
+					# If there is no block, get the first statement
+					tempResult = determineOpen(text, scopeLevel, line, start, currentId, lexer, endId)
+
+					if not tempResult:
+						break
+
+					tempResult.docblock = False
+					tempResult.scopeLevel = scopeLevel
 
-				elif targetName == 'paren':
+					parsedResults = [tempResult]
 
-					(result, tempBeginId, endId, tempLines) = extractParen(text[id:])
+					blockBeginId = tempResult.beginId - currentId
+					blockEndId = tempResult.endId - currentId + 1
+					id = blockEndId
 
-					# Store the result in the extractions
-					extractions['paren'] = {
-						'content': result,
-						'beginId': id+currentId,
-						'endId': id+currentId+endId,
-						'docblock': foundDocblock
-					}
+				# Store the result in the extractions
+				extractions.block = Block(parsedResults, blockBeginId+currentId, blockEndId+currentId, lazy)
+
+				lastTargetEnd = id
+
+			else:
+
+				if extraOptions == 'expressionHasBegun':
+					expressionHasBegun = True
+					waitingForOperand = True
+
+				if word == targetName:
+					extractions.setExtra(targetName, Piece(start+currentId, end+currentId-1, foundDocblock))
 
 					# Set the next Id
-					id = id+endId+1
+					id = end
 					lastTargetEnd = id
 
-					# Increase the newlines
-					newLines += tempLines
+				elif targetRequired:
+					break
 
-				elif targetName == 'block':
+			foundDocblock = False
 
-					(result, tempBeginId, endId, tempLines) = extractCurly(text[id:])
+		# Without its required paren or block this isn't a complete statement,
+		# so let the caller try it as an expression instead
+		if not self.grouping and ((self.parenRequired and extractions.paren is None) or (self.blockRequired and extractions.block is None)):
+			return False
 
-					parsedResults = False
+		# The same goes for a group without any name, like a 'var' at the end of the text
+		if self.grouping and extractions.name is None and not groupResult:
+			return False
 
-					# If the result is empty, make sure it was because
-					# the block was empty
-					if not result:
-						# If there is no block, get the first expression
-						if not hasCharsAfter(text[id:], '{'):
+		# A semicolon directly after the statement belongs to it
+		index = lexer.indexAt(lastTargetEnd)
 
-							tempResult = determineOpen(text, scopeLevel, lineNr, id, currentId, True)
+		if index < tokenCount and tokens[index][1] < endId and lexer.getText(index) == ';':
+			lastTargetEnd = tokens[index][2]
 
-							tempBeginId = tempResult['beginId']
-							endId = tempResult['endId']+currentId
-							tempLines = tempResult['newLines']
+		newLines = lexer.countLines(beginId-currentId, lastTargetEnd)
 
-							if tempResult['openType'] == 'statement':
-								parsedResults = [tempResult]
-							else:
-								result = tempResult['result']['text']
+		if self.grouping:
+			# Add the last result to the group, if it got a name
+			if extractions.name is not None:
+				groupResult.append(extractions)
 
-						pass
-					else:
-						endId += id + currentId
+			result = groupResult
+		else:
+			result = extractions
 
-					tempBeginId += id
+		return StatementNode('statement', self.name, startScope, lineNr, newLines, beginId, lastTargetEnd+currentId-1, result)
 
-					# Now parse these results, too!
-					if not parsedResults:
-						parsedResults = splitStatements(text[:endId], scopeLevel, lineNr, tempBeginId+1, currentId)
+# Get the next statement/expression
+def determineOpen(originalText, scopeLevel, lineNr, id = 0, currentId = 0, lexer = None, endId = None):
 
-					# Store the result in the extractions
-					extractions['block'] = {
-						'content': result,
-						'parsed': parsedResults,
-						'beginId': tempBeginId+currentId,
-						'endId': id+endId+currentId
-					}
+	if not lexer:
+		lexer = WittyLexer(originalText)
 
-					# Set the next Id
-					id = endId+1
-					lastTargetEnd = id
+	if endId is None:
+		endId = len(originalText)
 
-					# Increase the newlines
-					newLines += tempLines
+	tokens = lexer.tokens
+	tokenCount = len(tokens)
 
-				elif targetName:
+	# Get the first token that isn't an inline comment
+	index = lexer.indexAt(id)
 
-					if extraOptions == 'expressionHasBegun':
-						expressionHasBegun = True
-						waitingForOperand = True
+	while index < tokenCount and tokens[index][0] == 'comment':
+		index += 1
 
-					# Get extra stuff
-					endId = getCharAfterId(text[id:], targetName)
+	if index >= tokenCount or tokens[index][1] >= endId:
+		return False
 
-					if endId or endId > -1:
-						extractions[targetName] = {
-							'content': targetName,
-							'beginId': id+currentId,
-							'endId': id+currentId+endId,
-							'docblock': foundDocblock
-						}
-						
-						# Set the next Id
-						id = id+endId+1
-						lastTargetEnd = id
+	(kind, start, end, line) = tokens[index]
+	word = originalText[start:end]
 
-					else:
-						
-						if targetRequired:
-							break
-						else:
-							continue
+	stat = getStatement(kind, word)
 
-				else:
-					# If we found a db this iteration,
-					# but need to break, we have to discard it
-					if dbFoundNow:
-						id -= dbPrevEnd + 1
-						newLines -= dbPrevLines
-						if dbSetNow:
-							extractions['docblock'] = False
+	# Is it a statement?
+	if stat:
+		result = stat.extract(originalText, scopeLevel, line, currentId, start, lexer, endId)
 
-					break
+		if result:
+			return result
 
-				foundDocblock = False
+	# It wasn't a (complete) statement, so try getting the expression
+	return extractExpression(originalText, scopeLevel, line, currentId, start, False, False, True, lexer, endId)
 
-			if self.grouping:
-				# Add the last result to the group
-				groupResult['group'].append(extractions)
-				result = groupResult['group']
-			else:
-				result = extractions
+## Get the statement the given token begins
+#  (docblocks aren't statements, they're looked up in lexer.docblocks)
+#  @param   kind   The kind of token
+#  @param   word   The text of the token
+def getStatement(kind, word):
 
-		return {'scope': startScope, 'line': lineNr, 'newLines': newLines, 'openType': 'statement', 'openName': self.name, 'result': result, 'beginId': beginId, 'endId': lastTargetEnd+currentId-1}
+	if kind == 'name':
+		return statementWords.get(word)
 
-# Get the next statement/expression
-def determineOpen(originalText, scopeLevel, lineNr, id = 0, currentId = 0, skipBeginSpaces = False):
+	return None
 
-	if skipBeginSpaces and originalText[id] in whitespace:
-		return determineOpen(originalText, scopeLevel, lineNr, id+1, currentId, True)
+## Get the content of a docblock, without its /* & */
+#  @param   word   The complete text of the docblock
+def getDocblockContent(word):
 
-	rest = originalText[id:]
+	result = word[2:]
 
-	result = False
+	if result.endswith('*/'):
+		result = result[:-2]
 
-	# Is it a statement?
-	for name, stat in statements.items():
+	return result.strip()
 
-		# Strict means we don't care what comes after the opening tag
-		if stat.greedy:
-			if rest.startswith(stat.begins):
-				result = stat.extract(originalText, scopeLevel, lineNr, currentId, id)
-		else:
-			if hasWordNext(rest, stat.begins):
-				result = stat.extract(originalText, scopeLevel, lineNr, currentId, id)
+## Compile all the statements into the dispatch table
+def compileStatements():
 
-	# It wasn't a statement, so try getting the expression
-	if not result:
-		result = extractExpression(originalText, scopeLevel, lineNr, currentId, id, False, False, True)
+	statementWords.clear()
 
-	return result
+	for name, stat in statements.items():
+		stat.compile()
+		statementWords[stat.begins] = stat
 
 
 ## Parsing starts here
@@ -1788,83 +1521,264 @@ def determineOpen(originalText, scopeLevel, lineNr, id = 0, currentId = 0, skipB
 #  @param   lineNr         The line number we're on
 #  @param   id             The id we should skip to in the text
 #  @param   currentId      The id we're actually at, but is removed from the text
-def splitStatements(text, scopeLevel, lineNr = 1, id = 0, currentId = 0):
+#  @param   lexer          The WittyLexer of the text (created when not given)
+#  @param   endId          The id to stop parsing at
+#  @param   stopAt         Stop after a statement ending at one of these ids
+#  @param   cancel         The WittyCancelToken, checked before every statement
+def splitStatements(text, scopeLevel, lineNr = 1, id = 0, currentId = 0, lexer = None, endId = None, stopAt = None, cancel = None):
+	return list(iterStatements(text, scopeLevel, lineNr, id, currentId, lexer, endId, stopAt, cancel))
 
-	maxId = len(text)-1
+## Yield the statements one by one, as soon as they're parsed,
+#  so the caller can process them before the rest of the text is done.
+#  Takes the same parameters as splitStatements
+def iterStatements(text, scopeLevel, lineNr = 1, id = 0, currentId = 0, lexer = None, endId = None, stopAt = None, cancel = None):
 
-	# The current open type
-	openType = False
-	openName = False
+	if not lexer:
+		lexer = WittyLexer(text)
 
-	# The list of resulting statements
-	results = []
+	if endId is None:
+		endId = len(text)
 
-	# Go over every letter
-	while id <= maxId:
+	tokens = lexer.tokens
+	tokenCount = len(tokens)
 
-		# Get the current char
-		currentChar = text[id]
+	# The docblock for the next statement
+	dbnow = False
 
-		if not isWhitespace(currentChar):
+	# The docblocks by the offset of the token after them
+	docblocks = lexer.docblocks
 
-			# If this is an inline comment, skip it
-			if hasCharsAfter(text, '//', id):
-			
-				skip = getNextCharId(text, '\n', id)
+	# Start at the first token after the id
+	index = lexer.indexAt(id)
 
-				if skip > -1:
-					id = skip+1
-					continue
-				else:
-					break
+	# The index of the first comment we skipped before the current token
+	skippedIndex = None
 
-			result = determineOpen(text, scopeLevel, lineNr, id, currentId)
+	# Go over every token
+	while index < tokenCount:
 
-			if result:
+		(kind, start, end, lineNr) = tokens[index]
 
-				endId = result['endId']
+		if start >= endId:
+			break
 
-				results.append(result)
+		# Stop when a newer parse has started
+		if cancel is not None:
+			cancel.check()
 
-				# Increase the line nr
-				lineNr += result['newLines']
+		# Skip inline comments & docblocks, docblocks are looked up by offset
+		if kind == 'comment' or kind == 'docblock':
+			if skippedIndex is None:
+				skippedIndex = index
 
-				# If the endId is smaller than the id we risk an infinite loop
-				if endId < id:
-					warn('====================================')
-					warn('endId is smaller than current id, infinite loop!')
-					warn('====================================')
-					break
+			index += 1
+			continue
 
-				id = endId
+		# Keep the docblock before this statement,
+		# unless the previous statement contains it
+		if skippedIndex is not None:
+			found = docblocks.get(start)
 
-		if currentChar == '\n':
-			lineNr += 1
+			if found is not None and found >= skippedIndex:
+				dbnow = getDocblockContent(lexer.getText(found))
 
-		id += 1
+			skippedIndex = None
+
+		result = determineOpen(text, scopeLevel, lineNr, start, currentId, lexer, endId)
+
+		if not result:
+			break
+
+		nextIndex = lexer.indexAt(result.endId - currentId + 1)
+
+		# If the next index isn't after the current one we risk an infinite loop
+		if nextIndex <= index:
+			nextIndex = index + 1
+
+		index = nextIndex
+
+		# Don't keep empty expressions (like stray commas)
+		if result.openType != 'expression' or result.result.hasText() or result.functions:
+
+			# Set the docblock
+			result.docblock = dbnow
+			dbnow = False
+
+			# Set the scope id
+			result.scopeLevel = scopeLevel
+
+			yield result
+
+		# Stop when the statement ends where we were asked to
+		if stopAt and result.endId in stopAt:
+			break
+
+## Get only the "this.x = ..." statements of a function body,
+#  without parsing anything else in it.
+#  They are only taken where a full parse would begin a statement,
+#  so they're the same as the ones splitStatements returns.
+#  @param   text           The complete file text
+#  @param   scopeLevel     The scope level of the body
+#  @param   id             The id the body begins at
+#  @param   currentId      The id we're actually at, but is removed from the text
+#  @param   lexer          The WittyLexer of the text
+#  @param   endId          The id the body ends at
+def skeletonStatements(text, scopeLevel, id, currentId, lexer, endId):
+
+	tokens = lexer.tokens
+	tokenCount = len(tokens)
+	pairs = lexer.pairs
 
-	returnResults = []
+	results = []
 	dbnow = False
 
-	# Move docblocks
-	for wstat in results:
+	# The docblocks by the offset of the token after them
+	docblocks = lexer.docblocks
+
+	# The index of the first comment we skipped before the current token
+	skippedIndex = None
+
+	# The beginning of the body is the beginning of a statement
+	statementBegins = True
+
+	index = lexer.indexAt(id)
+
+	while index < tokenCount:
+
+		(kind, start, end, line) = tokens[index]
+
+		if start >= endId:
+			break
+
+		if kind == 'comment' or kind == 'docblock':
+			if skippedIndex is None:
+				skippedIndex = index
+
+			index += 1
+			continue
+
+		if skippedIndex is not None:
+			found = docblocks.get(start)
+
+			if found is not None and found >= skippedIndex:
+				dbnow = getDocblockContent(lexer.getText(found))
 
-		# If it's a docblock, keep it for the next statement!
-		if wstat['openName'] == 'docblock':
-			dbnow = wstat['result']
+			skippedIndex = None
+
+		if statementBegins and kind == 'name' and end - start == 4 and text[start:end] == 'this' \
+			and index + 1 < tokenCount and text[tokens[index+1][1]:tokens[index+1][2]] == '.':
+
+			result = extractExpression(text, scopeLevel, line, currentId, start, False, False, True, lexer, endId)
+
+			if result.result.assignment:
+				result.docblock = dbnow
+				result.scopeLevel = scopeLevel
+				results.append(result)
+
+			dbnow = False
+
+			# The next statement begins right after this one
+			nextIndex = lexer.indexAt(result.endId - currentId + 1)
+			index = max(nextIndex, index + 1)
 			continue
 
-		# Set the docblock
-		wstat['docblock'] = dbnow
-		dbnow = False
+		word = text[start:end]
+
+		if word != ';':
+			dbnow = False
+
+		# Skip everything inside brackets
+		if start in pairs:
+			index = lexer.indexAt(pairs[start])
+			(kind, start, end, line) = tokens[index]
+			word = text[start:end]
+
+		statementBegins = word == ';' or word == '}'
+		index += 1
+
+	return results
+
+
+## Get the range of the text that changed between two versions,
+#  as the id the change begins at & the ids it ends at in both texts
+#  @param   old            The old text
+#  @param   new            The new text
+def getChangedRange(old, new):
+
+	oldLength = len(old)
+	newLength = len(new)
+	length = min(oldLength, newLength)
+
+	# Bisect the length of the unchanged beginning,
+	# only comparing the part we're not sure of yet
+	low = 0
+	high = length
+
+	while low < high:
+		mid = (low + high + 1) // 2
 
-		# Set the scope id
-		wstat['scopeLevel'] = scopeLevel
+		if old.startswith(new[low:mid], low):
+			low = mid
+		else:
+			high = mid - 1
+
+	head = low
+
+	# Do the same for the unchanged ending, without overlapping the beginning
+	low = 0
+	high = length - head
+
+	while low < high:
+		mid = (low + high + 1) // 2
+
+		if old.endswith(new[newLength-mid:newLength-low], 0, oldLength-low):
+			low = mid
+		else:
+			high = mid - 1
+
+	return (head, oldLength - low, newLength - low)
+
+## Index the offset ranges of nested scopes,
+#  so the innermost scope of an offset can be found by bisecting
+#  @param   scopes         The scope dicts of a file, with their begin & end offsets
+#  @return  A tuple of the offsets every range starts at & the id of its innermost scope
+def getScopeIndex(scopes):
 
-		returnResults.append(wstat)
+	# Everything outside of a function is in the file scope
+	starts = [0]
+	scopeIds = [1]
 
-	return returnResults
+	# The end & id of the scopes the current offset is in, innermost last
+	stack = [(None, 1)]
 
+	for scope in sorted(scopes[2:], key = lambda scope: (scope['begin'], -scope['end'])):
+
+		# Leave the scopes that end before this one begins
+		while stack[-1][0] is not None and stack[-1][0] < scope['begin']:
+			end = stack.pop()[0]
+			addScopeRange(starts, scopeIds, end + 1, stack[-1][1])
+
+		stack.append((scope['end'], scope['id']))
+		addScopeRange(starts, scopeIds, scope['begin'], scope['id'])
+
+	while len(stack) > 1:
+		end = stack.pop()[0]
+		addScopeRange(starts, scopeIds, end + 1, stack[-1][1])
+
+	return (starts, scopeIds)
+
+## Add a range to a scope index, replacing the last one if it doesn't start before it
+#  @param   starts         The offsets the ranges start at
+#  @param   scopeIds       The scope ids of the ranges
+#  @param   start          The offset the new range starts at
+#  @param   scopeId        The id of its innermost scope
+def addScopeRange(starts, scopeIds, start, scopeId):
+
+	if start <= starts[-1]:
+		scopeIds[-1] = scopeId
+	else:
+		starts.append(start)
+		scopeIds.append(scopeId)
 
 ## Does this line declare something by using var?
 def hasDeclaration(text):
@@ -1882,10 +1796,8 @@ def getAssignmentVariables(text):
 # Place to store all the type of statements in
 statements = {}
 
-docblock = Statement('docblock')
-docblock.setBegin('/*')
-docblock.setEnd('*/')
-docblock.setGreedy(True)
+# The compiled dispatch table: statements by their beginning word
+statementWords = {}
 
 var = Statement('var')
 var.setBegin('var')
@@ -1958,3 +1870,4 @@ finallyStat = Statement('finally')
 finallyStat.setBegin('finally')
 finallyStat.setBlock(1, True)
 
+compileStatements()
@@ -0,0 +1,87 @@
+#
+# Parse files that are saved while they're still being typed,
+# outside of Sublime Text:
+#
+#   python3 -m unittest discover tests
+#
+import os, sys, types, tempfile, unittest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Make the package importable under the name Sublime gives it
+if not 'Witty' in sys.modules:
+	package = types.ModuleType('Witty')
+	package.__path__ = [root]
+	sys.modules['Witty'] = package
+
+from Witty.library.WittyIntel import Intel
+from Witty.library.WittyFile import WittyFile
+
+#
+# The part of a WittyProject that WittyFile & Intel use
+#
+class PartialProject:
+
+	def __init__(self):
+		self.cache = None
+		self.intelNode = Intel(self, 'nodejs')
+		self.intelBrowser = Intel(self, 'browser')
+
+	def getFileLanguage(self, fileName):
+		return 'nodejs'
+
+	def setFileLanguage(self, fileName, language):
+		pass
+
+class TestPartial(unittest.TestCase):
+
+	## Parse the text as a file & build the intel of it
+	#  @param   self      The object pointer
+	#  @param   text      The contents of the file
+	#  @return  The WittyFile
+	def parse(self, text):
+
+		(handle, fileName) = tempfile.mkstemp(suffix = '.js')
+
+		try:
+			sourceFile = os.fdopen(handle, 'w')
+
+			try:
+				sourceFile.write(text)
+			finally:
+				sourceFile.close()
+
+			project = PartialProject()
+			wittyFile = WittyFile(project, fileName)
+
+			project.intelNode.files[fileName] = wittyFile
+			project.intelNode.postParse()
+		finally:
+			os.remove(fileName)
+
+		return wittyFile
+
+	def testVarAtEnd(self):
+
+		for text in ['var', 'if (a) var']:
+			wittyFile = self.parse(text)
+			self.assertNotIn('var', [statement.typeName for statement in wittyFile.statements], text)
+
+		wittyFile = self.parse('var a = 1;\nvar')
+		self.assertEqual(['var', 'expression'], [statement.typeName for statement in wittyFile.statements])
+		self.assertIn('a', wittyFile.statements[0].variables)
+
+	def testFunctionAtEnd(self):
+
+		for text in ['var x = function', 'x = function(){}; function', 'if (a) function', 'function f(a)']:
+			wittyFile = self.parse(text)
+			self.assertNotIn('function', [statement.typeName for statement in wittyFile.statements], text)
+
+	def testUnfinishedBlocks(self):
+
+		for text in ['try', 'catch (e)', 'switch (a)', 'do']:
+			wittyFile = self.parse(text)
+			self.assertEqual(['expression'], [statement.typeName for statement in wittyFile.statements], text)
+
+if __name__ == '__main__':
+	unittest.main()